@@ -0,0 +1,286 @@
+"""
+Offline benchmark of download-create-playback cycle.
+
+Runs `SimpleMediaPlayer.run` against local mockup images server using stubs
+of dvd-slideshow, ffmpeg, ffprobe, convert and mpv binaries, and measures
+time spent in each stage of the cycle (playlist retrieving, images
+downloading, pre-processing, slide show config building, encoding, probing
+and player start) for several playlist and image sizes. External utilities
+are stubbed, so measured times show overhead of media player itself.
+
+Results are written as JSON, so they can be compared between versions:
+
+    python3 -m benchmarks.cycle -o baseline.json
+    python3 -m benchmarks.cycle -o current.json --compare baseline.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import tempfile
+import threading
+import subprocess
+import statistics
+from datetime import datetime
+
+from simple_media_player.__main__ import SimpleMediaPlayer
+from simple_media_player.constants import DefaultParams
+from simple_media_player.mockup.imageserver import \
+    ImagesRequestHandler, ThreadingHTTPServer
+from simple_media_player.mockup.stubs import stub_binaries
+
+
+RESULTS_VERSION = 1
+
+SAMPLE_IMAGES = 10
+
+STAGES = ['playlist', 'download', 'preprocess', 'build', 'encode', 'probe',
+          'player_start']
+
+
+# stubs of external utilities doing the minimal work expected by the player
+STUBS = {
+    'dvd-slideshow': """
+import os, sys
+args = sys.argv[1:]
+name, folder = args[args.index('-n') + 1], args[args.index('-o') + 1]
+with open(os.path.join(folder, name + '.mp4'), 'w') as fp:
+    fp.write(open(args[args.index('-f') + 1]).read())
+""",
+    'ffmpeg': """
+import sys
+args = sys.argv[1:]
+paths = [line.split("'")[1] for line in open(args[args.index('-i') + 1])]
+with open(args[-1], 'w') as fp:
+    fp.write(''.join(open(p).read() for p in paths))
+""",
+    'ffprobe': """
+import json
+print(json.dumps({'format': {'duration': '30.0', 'format_name': 'mp4'},
+                  'streams': []}))
+""",
+    'convert': """
+import sys, shutil
+shutil.copy(sys.argv[1][:-len('[0]')], sys.argv[-1])
+""",
+    'mpv': """
+""",
+}
+
+
+def write_config(path: str, workspace: str, api: str, overrides: dict):
+    """Writes player configuration using default parameters, workspace
+    folders and specified overrides.
+    """
+    params = {param.name.lower(): str(param.default)
+              for param in DefaultParams}
+    params.update({
+        'downloaded_images_path': os.path.join(workspace, 'images'),
+        'created_slide_shows_path': os.path.join(workspace, 'videos'),
+        'background_music_path': os.path.join(workspace, 'music'),
+        'cache_path': os.path.join(workspace, 'cache'),
+        'images_api': api,
+        'image_display_duration': '1',
+        'image_cache_size': '0',
+        'render_cache_size': '0',
+        'prerender_slots': '0',
+        'warm_player': 'False'})
+    params.update(overrides)
+
+    for key in ('created_slide_shows_path', 'background_music_path'):
+        os.makedirs(params[key], exist_ok=True)
+
+    with open(os.path.join(params['background_music_path'], 'track.mp3'),
+              'wb') as fp:
+        fp.write(b'music')
+
+    with open(path, 'w') as fp:
+        fp.write('[simple_media_player]\n')
+        for name, value in params.items():
+            fp.write('%s=%s\n' % (name, value))
+
+
+def run_case(playlist_size: int, image_size: int, repeats: int=3,
+             overrides: dict=None):
+    """Measures cycle stages for specified playlist and image sizes.
+
+    Each run uses empty workspace, so nothing is reused from caches.
+
+    Returns:
+        dictionary with case parameters, stage durations of each run and
+        their medians
+    """
+    root = tempfile.mkdtemp(prefix='smp-bench-')
+    samples = os.path.join(root, 'samples')
+    os.makedirs(samples)
+    for i in range(SAMPLE_IMAGES):
+        with open(os.path.join(samples, '%02d.png' % i), 'wb') as fp:
+            fp.write(os.urandom(image_size))
+
+    handler = type('BenchmarkHandler', (ImagesRequestHandler,), {
+        'SAMPLE_IMAGES_FOLDER': samples,
+        'PLAYLIST_SIZE': playlist_size,
+        'log_message': lambda self, format, *args: None})
+    server = ThreadingHTTPServer(('localhost', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api = 'http://localhost:%d/playlist' % server.server_port
+
+    runs = []
+    try:
+        with stub_binaries(STUBS):
+            for i in range(repeats):
+                workspace = os.path.join(root, 'run%d' % i)
+                config_path = os.path.join(workspace, 'parameters.cfg')
+                os.makedirs(workspace)
+                write_config(config_path, workspace, api, overrides or {})
+
+                player = SimpleMediaPlayer()
+                player.config_path = config_path
+                started = time.monotonic()
+                player.run(no_wait=True)
+                total = time.monotonic() - started
+
+                if not player.created_slide_show_path:
+                    raise RuntimeError('slide show has not been created')
+                runs.append({'total': total,
+                             'stages': dict(player.timings.durations)})
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(root, ignore_errors=True)
+
+    median = {'total': statistics.median(run['total'] for run in runs)}
+    for stage in STAGES:
+        values = [run['stages'][stage] for run in runs
+                  if stage in run['stages']]
+        if values:
+            median[stage] = statistics.median(values)
+
+    return {'playlist_size': playlist_size, 'image_size': image_size,
+            'runs': runs, 'median': median}
+
+
+def git_revision():
+    """Returns commit of benchmarked sources or None if it is unknown."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(playlist_sizes: list, image_sizes: list, repeats: int=3,
+                  overrides: dict=None):
+    """Runs benchmark cases for each combination of playlist and image sizes.
+
+    Returns:
+        JSON serializable benchmark results
+    """
+    cases = [run_case(playlist_size, image_size, repeats, overrides)
+             for playlist_size in playlist_sizes
+             for image_size in image_sizes]
+
+    return {'version': RESULTS_VERSION,
+            'created': datetime.now().isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parameters': overrides or {},
+            'cases': cases}
+
+
+def compare(baseline: dict, results: dict, tolerance: float=1.2,
+            min_duration: float=0.01):
+    """Compares median stage durations with baseline results.
+
+    Arguments:
+        baseline(dict): results of previous version
+        results(dict): results of current version
+        tolerance(float): allowed ratio of current and baseline durations
+        min_duration(float): stages faster than that (in seconds) in both
+            versions are too noisy to be compared
+
+    Returns:
+        list of tuples (playlist size, image size, stage, baseline duration,
+        current duration) of stages which became slower than allowed
+    """
+    previous = {(case['playlist_size'], case['image_size']): case['median']
+                for case in baseline['cases']}
+    regressions = []
+
+    for case in results['cases']:
+        key = case['playlist_size'], case['image_size']
+        if key not in previous:
+            continue
+        for stage, duration in case['median'].items():
+            old = previous[key].get(stage)
+            if old is None or max(old, duration) < min_duration:
+                continue
+            if duration > old * tolerance:
+                regressions.append(key + (stage, old, duration))
+
+    return regressions
+
+
+def format_results(results: dict):
+    """Returns table of median stage durations in milliseconds."""
+    columns = ['total'] + STAGES
+    lines = ['%8s %10s ' % ('images', 'size') +
+             ' '.join('%12s' % column for column in columns)]
+    for case in results['cases']:
+        lines.append('%8d %10d ' % (case['playlist_size'], case['image_size']) +
+                     ' '.join('%12.1f' % (case['median'][column] * 1000)
+                              if column in case['median'] else '%12s' % '-'
+                              for column in columns))
+    return '\n'.join(lines)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Benchmark of download-create-playback cycle stages')
+    parser.add_argument('--playlist-sizes', type=int, nargs='+',
+                        default=[5, 20, 50])
+    parser.add_argument('--image-sizes', type=int, nargs='+',
+                        default=[100 * 2**10, 2**20],
+                        help='sizes of sample images in bytes')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--set', action='append', default=[],
+                        metavar='NAME=VALUE',
+                        help='override player configuration parameter')
+    parser.add_argument('-o', '--output', help='path to results JSON file')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='fail if stages are slower than in baseline')
+    parser.add_argument('--tolerance', type=float, default=1.2)
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger('simple_media_player').setLevel(logging.WARNING)
+
+    overrides = dict(item.split('=', 1) for item in args.set)
+    results = run_benchmark(
+        args.playlist_sizes, args.image_sizes, args.repeats, overrides)
+    print(format_results(results))
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+        regressions = compare(baseline, results, args.tolerance)
+        for playlist_size, image_size, stage, old, new in regressions:
+            print('regression: %d images of %d bytes, %s: %.1f -> %.1f ms'
+                  % (playlist_size, image_size, stage, old * 1000, new * 1000))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
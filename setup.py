@@ -57,7 +57,7 @@ except FileExistsError:
 with open(PLAYER_CONFIG_PATH, 'w') as fp:
     fp.write("[simple_media_player]\n")
     for param in DefaultParams:
-        fp.write(param.name.lower() + "=" + str(param.value) + '\n')
+        fp.write(param.name.lower() + "=" + str(param.default) + '\n')
 
 
 classifiers = [
@@ -1,28 +1,40 @@
 """Simple Media Player entry point."""
 
 import os
-import glob
 import time
 import uuid
 import random
 import logging
 import urllib3
-import tempfile
+import threading
 import subprocess
 import configparser
-from itertools import chain
+from collections import namedtuple
 from datetime import datetime, timedelta
-
-import schedule
+from concurrent.futures import ThreadPoolExecutor
 
 from .slideshow.builder import SlideShowBuilder
-from .wrapper import SlideShowPlayer, avprobe
+from .slideshow.cache import RenderCache
+from .slideshow.preprocess import ImagePreprocessor
+from .wrapper import SlideShowPlayer, ProbeCache, RENDER_BACKENDS
+from .music import MusicLibrary
+from .history import CycleHistory
+from .metrics import Metrics, serve_metrics
+from .render import SegmentRenderer, parse_profiles, profile_cost, \
+    select_profile
+from .process import wait_process
+from .timing import sleep_until, StageTimer, SYSTEM_CLOCK
 from .api.images import RemoteImagesReceiver
-from .constants import SCHEDULE_PATH, PLAYER_CONFIG_PATH
+from .api import async_images
+from .api.async_images import AsyncRemoteImagesReceiver
+from .api.video import RemoteVideoReceiver
+from .api.retry import RetryPolicy, CircuitBreaker
+from .api.cache import ImageCache, file_digest
+from .constants import SCHEDULE_PATH, PLAYER_CONFIG_PATH, DefaultParams
 
 
-# logging functionality
-log = logging.getLogger(__name__)
+# logging functionality (package logger also collects records of submodules)
+log = logging.getLogger(__package__)
 log.setLevel(logging.DEBUG)
 
 sh = logging.StreamHandler()
@@ -35,26 +47,83 @@ fh.setLevel(logging.DEBUG)
 log.addHandler(fh)
 
 
-def pick_random_music(path: str):
-    """Picks random audio file from provided folder.
+# the least time in seconds given to images retrieving however late it is
+MIN_DOWNLOAD_TIME = 5.0
+
+
+# the most attempts to retrieve slide show from render service before it is
+# rendered locally
+RENDER_SERVICE_ATTEMPTS = 3
+
+
+# slide show ready to be played back together with durations of stages of
+# its preparation (playback stages are added to the same timer)
+PreparedShow = namedtuple(
+    'PreparedShow',
+    ['path', 'estimated_duration', 'actual_duration', 'timings'])
+
+
+def next_slot(entry: str, now: datetime):
+    """Returns the nearest time point after `now` matching schedule entry.
 
     Arguments:
-        path(str): path to folder with music
+        entry(str): schedule entry in HH:MM format
+        now(datetime): current time
     """
-    patterns = ('*.mp3', '*.mid', '*.wav', '*.ogg', '*.aac')
-    seq = list(chain.from_iterable(glob.glob1(path, p) for p in patterns))
-    return os.path.join(path, seq[random.randint(0, len(seq) - 1)])
+    tp = datetime.strptime(str(now.date()) + ' ' + entry, '%Y-%m-%d %H:%M')
+    if tp <= now:
+        tp += timedelta(days=1)
+    return tp
 
 
 class SimpleMediaPlayer:
 
     def __init__(self):
+        self.config_path = PLAYER_CONFIG_PATH
         self.cfg = None
         self.player = None
         self.created_slide_show_path = ''
         self.estimated_slide_show_duration = 0
         self.actual_slide_show_duration = 0
         self.video_encoding_timeout = 900
+        self.encoding_time = None
+        self.encoding_rate = None
+        self._cycle = threading.local()
+        self.metrics = Metrics()
+        self.metrics_server = None
+        self.start_drift = None
+        self.end_drift = None
+        self.controller = None
+        self.render_cache = None
+        self.probe_cache = None
+        self.music_library = None
+        self.cycle_history = None
+        self.preprocessor = None
+        self.circuit_breaker = None
+        self.render_service_breaker = None
+        self.time_table = []
+        self.clock = SYSTEM_CLOCK
+        self._prepare_lock = threading.Lock()
+        self._prerender_lock = threading.Lock()
+        self._prerender_executor = None
+        self._prerendered = {}
+
+    @property
+    def timings(self):
+        """Stage timer of the cycle processed by current thread.
+
+        Slide show of the next slot can be prepared in background while the
+        current one is played back, so each thread records stages into its
+        own timer.
+        """
+        timings = getattr(self._cycle, 'timings', None)
+        if timings is None:
+            timings = self._cycle.timings = StageTimer()
+        return timings
+
+    @timings.setter
+    def timings(self, timings: StageTimer):
+        self._cycle.timings = timings
 
     def read_config(self, path):
         """Reads media player configuration.
@@ -69,93 +138,875 @@ class SimpleMediaPlayer:
         config.read(path)
         self.cfg = config['simple_media_player']
 
-    def download_images(self):
-        """Downloads images from server specified in configuration."""
-        receiver = RemoteImagesReceiver(
+    def param(self, name: str, cast=str):
+        """Returns configuration parameter or its default value if parameter
+        is missing in configuration file (e.g. created by older version).
+
+        Arguments:
+            name(str): parameter name
+            cast(callable): function converting parameter into required type
+        """
+        default = DefaultParams[name.upper()].default
+        if cast is bool:
+            return self.cfg.getboolean(name, fallback=default)
+        return cast(self.cfg.get(name, str(default)))
+
+    def setup_metrics(self):
+        """Configures trace events file and starts metrics endpoint if they
+        are enabled in configuration.
+        """
+        events_path = os.path.expandvars(self.param('metrics_events_path'))
+        if events_path:
+            os.makedirs(os.path.dirname(events_path) or '.', exist_ok=True)
+        self.metrics.events_path = events_path or None
+
+        port = self.param('metrics_port', int)
+        if port > 0 and self.metrics_server is None:
+            try:
+                self.metrics_server = serve_metrics(self.metrics, port)
+                log.debug('[smp][+] Metrics are served on port %d' % port)
+            except OSError as e:
+                log.warning('[smp][!] Cannot serve metrics: %s' % str(e))
+
+    def probe(self, path: str):
+        """Probes media file using persistent probing results cache.
+
+        Returns:
+            wrapper.MediaInfo
+        """
+        if self.probe_cache is None:
+            self.probe_cache = ProbeCache(os.path.join(
+                os.path.expandvars(self.param('cache_path')), 'probe.json'))
+
+        started = time.monotonic()
+        with self.metrics.span('probe', path=path):
+            info = self.probe_cache.probe(path)
+        self.metrics.observe(
+            'smp_probe_duration_seconds', time.monotonic() - started)
+        return info
+
+    def create_images_cache(self):
+        """Creates downloaded images cache or returns None if it is disabled
+        in configuration.
+        """
+        cache_size = self.param('image_cache_size', int)
+        if cache_size <= 0:
+            return None
+
+        return ImageCache(
+            os.path.join(os.path.expandvars(self.param('cache_path')),
+                         'images'),
+            max_size=cache_size * 2**20,
+            max_age=self.param('image_cache_max_age', int) * 3600)
+
+    def download_time(self, end_playback: datetime=None):
+        """Returns time in seconds given to images retrieving.
+
+        Configured download deadline is shortened if slide show could not be
+        encoded and played back before `end_playback` otherwise. Duration of
+        the previous slide show and the last measured encoding time are used
+        as estimates.
+        """
+        deadline = self.param('download_deadline', float)
+        if end_playback is None:
+            return deadline
+
+        encoding_time = self.encoding_time
+        if encoding_time is None:
+            encoding_time = self.param('expected_encoding_time', float)
+
+        left = (end_playback - self.clock.now()).total_seconds()
+        left -= self.estimated_slide_show_duration + encoding_time
+        return max(MIN_DOWNLOAD_TIME, min(deadline, left))
+
+    def download_images(self, on_image=None, end_playback: datetime=None):
+        """Downloads images from server specified in configuration.
+
+        Requests are retried with exponential backoff until download deadline
+        expires. If images cannot be retrieved in time (or server is known to
+        be unavailable), images of the last received playlist are used.
+
+        Arguments:
+            on_image(callable): function called with playlist index and path
+                of each downloaded image as soon as it is downloaded
+            end_playback(datetime): time point when playback should be ended
+
+        Returns:
+            list of images paths or None if there are no images to show
+        """
+        if self.circuit_breaker is None:
+            self.circuit_breaker = CircuitBreaker(
+                self.param('circuit_failure_threshold', int),
+                self.param('circuit_reset_timeout', float))
+
+        retry = RetryPolicy(
+            max_attempts=self.param('retry_max_attempts', int) or None,
+            base_delay=self.param('retry_base_delay', float),
+            max_delay=self.param('retry_max_delay', float),
+            total_timeout=self.download_time(end_playback))
+
+        options = dict(
+            workers=self.param('download_workers', int),
+            cache=self.create_images_cache(),
+            buffer_size=self.param('download_buffer_size', int) * 2**10,
+            retry=retry,
+            breaker=self.circuit_breaker)
+
+        receiver_name = self.param('images_receiver')
+        if receiver_name == 'async' and async_images.aiohttp is None:
+            log.warning('[smp][!] aiohttp is not installed, '
+                        'use synchronous images receiver')
+            receiver_name = 'sync'
+
+        if receiver_name == 'async':
+            receiver_class = AsyncRemoteImagesReceiver
+        else:
+            receiver_class = RemoteImagesReceiver
+            options['max_in_flight'] = \
+                self.param('download_max_in_flight', int) * 2**20
+
+        receiver = receiver_class(
             self.cfg['images_api'],
-            os.path.expandvars(self.cfg['downloaded_images_path']))
+            os.path.expandvars(self.cfg['downloaded_images_path']),
+            **options)
 
-        while True:
+        with self.metrics.span('download', receiver=receiver_name) as trace:
             try:
-                images = receiver.receive_images()
-                return images
+                with self.timings.stage('download'):
+                    images = receiver.receive_images(on_image=on_image)
+                self.timings.add('playlist', receiver.stats['playlist_time'])
 
             except urllib3.exceptions.HTTPError as e:
-                log.warn('[smp][!] Images retrieving error: %s' % str(e))
-                log.warn('[smp][!] Trying again...')
+                log.warning('[smp][!] Images retrieving error: %s' % str(e))
+                images = None
+
+            stats = receiver.stats or {}
+            trace.update(stats)
+            trace['failed'] = images is None
+            self.metrics.inc('smp_downloaded_images_total',
+                             stats.get('images', 0))
+            self.metrics.inc('smp_downloaded_bytes_total',
+                             stats.get('bytes', 0))
+            self.metrics.inc('smp_download_retries_total',
+                             stats.get('retries', 0))
+
+        if images is not None:
+            return images
+
+        self.metrics.inc('smp_download_failures_total')
+        images = receiver.last_playlist()
+        if not images:
+            return None
 
-    def create_slide_show(self, image_paths: list):
-        """Creates slide show with from provided images and random audio track.
+        log.warning('[smp][!] Use images of the last received playlist')
+        if on_image is not None:
+            for index, path in enumerate(images):
+                on_image(index, path)
+        return images
+
+    def download_slide_show(self, end_playback: datetime=None):
+        """Downloads slide show rendered by render service specified in
+        configuration.
+
+        Arguments:
+            end_playback(datetime): time point when playback should be ended
+
+        Returns:
+            tuple of estimated duration and path of slide show or None if
+            service is not configured or unavailable
         """
-        self.player = SlideShowPlayer(
-            os.path.expandvars(self.cfg['created_slide_shows_path']))
+        api = self.param('render_service_api')
+        if not api:
+            return None
 
-        single_image_duration = int(self.cfg['image_display_duration'])
+        if self.render_service_breaker is None:
+            self.render_service_breaker = CircuitBreaker(
+                self.param('circuit_failure_threshold', int),
+                self.param('circuit_reset_timeout', float))
+
+        max_attempts = self.param('retry_max_attempts', int)
+        retry = RetryPolicy(
+            max_attempts=min(max_attempts or RENDER_SERVICE_ATTEMPTS,
+                             RENDER_SERVICE_ATTEMPTS),
+            base_delay=self.param('retry_base_delay', float),
+            max_delay=self.param('retry_max_delay', float),
+            total_timeout=self.download_time(end_playback))
+
+        receiver = RemoteVideoReceiver(
+            api,
+            os.path.join(os.path.expandvars(self.param('cache_path')),
+                         'videos'),
+            buffer_size=self.param('download_buffer_size', int) * 2**10,
+            retry=retry,
+            breaker=self.render_service_breaker)
+
+        with self.metrics.span('download', receiver='render_service') \
+                as trace:
+            try:
+                with self.timings.stage('download'):
+                    path, duration = receiver.receive_video()
+            except (urllib3.exceptions.HTTPError, OSError) as e:
+                log.warning('[smp][!] Render service is unavailable: %s'
+                            % str(e))
+                path = None
+
+            stats = receiver.stats or {}
+            trace.update(stats)
+            trace['failed'] = path is None
+            self.metrics.inc('smp_downloaded_bytes_total',
+                             stats.get('bytes', 0))
+            self.metrics.inc('smp_download_retries_total',
+                             stats.get('retries', 0))
+
+        if path is None:
+            self.metrics.inc('smp_render_service_failures_total')
+            return None
 
-        slide_show_params = tempfile.mktemp()
-        with open(slide_show_params, 'w') as fp:
-            slide_show_config = SlideShowBuilder.create_slide_show(
-                image_paths, single_image_duration)
-            fp.write(slide_show_config)
+        log.debug('[smp][+] Slide show is retrieved from render service: %s'
+                  % path)
+        return duration, path
 
-        video_file_name = str(uuid.uuid4())
+    def load_music_library(self):
+        """Returns background music library with up to date index."""
+        if self.music_library is None:
+            self.music_library = MusicLibrary(
+                os.path.expandvars(self.cfg['background_music_path']),
+                os.path.join(os.path.expandvars(self.param('cache_path')),
+                             'music.json'),
+                self.probe)
+        self.music_library.refresh()
+        return self.music_library
+
+    def pick_music(self, seed, duration: float):
+        """Picks background music tracks from indexed music library.
+
+        Arguments:
+            seed: seed of random generator used to pick tracks
+            duration(float): estimated duration of slide show
 
+        Returns:
+            tuple of music paths list and their total duration or (None, None)
+            if there is no music available
+        """
         try:
-            audio = pick_random_music(
-                os.path.expandvars(self.cfg['background_music_path']))
-            log.debug('[smp][.] Picked music: %s' % audio)
-            log.debug('[smp][.] Start video creation...\n')
+            tracks, total = self.load_music_library().select(
+                duration, random.Random(seed))
+            if not tracks:
+                raise ValueError('no music found in "%s"' %
+                                 self.cfg['background_music_path'])
+
+            log.debug('[smp][.] Picked music: %s' % ', '.join(tracks))
+            return tracks, total
 
         except Exception as e:
-            audio = None
-            log.warn('[smp][!] Cannot pick music: ' + str(e))
-            log.warn('[smp][!] Slide show will be padded with silence')
+            log.warning('[smp][!] Cannot pick music: ' + str(e))
+            log.warning('[smp][!] Slide show will be padded with silence')
+            return None, None
+
+    def estimated_encoding_time(self, profile, video_duration: float):
+        """Returns expected time in seconds of slide show encoding using
+        specified profile.
+
+        Encoding throughput measured by the last encoding is used. Until it
+        is measured, the first configured profile is expected to be encoded
+        in `expected_encoding_time` seconds.
+        """
+        if self.encoding_rate is not None:
+            return self.encoding_rate * profile_cost(profile) * video_duration
+
+        reference = parse_profiles(self.param('encoding_profiles'))[0]
+        return self.param('expected_encoding_time', float) * \
+            profile_cost(profile) / profile_cost(reference)
+
+    def encoding_profile(self, video_duration: float,
+                         end_playback: datetime=None):
+        """Returns encoding profile selected in configuration.
 
-        self.player.mp4()
-        self.player.resolution = self.cfg['slide_show_resolution']
+        In automatic mode the best quality profile which is expected to be
+        encoded before slide show should start is selected (the fastest one
+        if there is not enough time for any of them).
 
-        video_duration = single_image_duration * len(image_paths)
-        proc = self.player.create_slide_show(
-            video_file_name, slide_show_params, audio, video_duration)
+        Arguments:
+            video_duration(float): duration of slide show in seconds
+            end_playback(datetime): time point when playback should be ended
+
+        Raises:
+            ValueError: unknown encoding profile is specified
+        """
+        profiles = parse_profiles(self.param('encoding_profiles'))
+        name = self.param('encoding_profile')
+
+        if name != 'auto':
+            for profile in profiles:
+                if profile.name == name:
+                    return profile
+            raise ValueError('unknown encoding profile: %s' % name)
+
+        if end_playback is None:
+            return profiles[0]
+
+        left = (end_playback - self.clock.now()).total_seconds()
+        left -= video_duration
+        profile = select_profile(
+            profiles, left,
+            lambda p: self.estimated_encoding_time(p, video_duration))
+        log.debug('[smp][.] Selected encoding profile: %s (%.1f s left)'
+                  % (profile.name, left))
+        return profile
+
+    def load_cycle_history(self):
+        """Returns history of played cycles loading it on the first call."""
+        if self.cycle_history is None:
+            self.cycle_history = CycleHistory(os.path.join(
+                os.path.expandvars(self.param('cache_path')),
+                'cycle_history.json'))
+        return self.cycle_history
+
+    def launch_offset(self, entry: str=None):
+        """Returns how long before time slot its cycle should be started.
+
+        Preparation time and slide show duration are predicted from history
+        of previous cycles (of the same slot if possible) and extended by
+        configured margin. Configured static offset is used until history
+        is collected or if adaptive offset is disabled.
+
+        Arguments:
+            entry(str): time table entry in HH:MM format
+        """
+        static = timedelta(minutes=self.param('launch_time_offset', int))
+        if not self.param('adaptive_launch_offset', bool):
+            return static
+
+        prediction = self.load_cycle_history().predict(entry)
+        if prediction is None:
+            return static
+
+        preparation, duration = prediction
+        return timedelta(seconds=preparation + duration +
+                         self.param('launch_time_margin', float))
+
+    def next_launch(self, now: datetime):
+        """Returns the nearest time slot after `now` and time point when its
+        cycle should be started (`now` if it is already late).
+
+        Returns:
+            tuple of slot and launch time points
+        """
+        slot = min(next_slot(entry, now) for entry in self.time_table)
+        start = slot - self.launch_offset(slot.strftime('%H:%M'))
+        return slot, max(now, start)
+
+    def check_schedule(self, now: datetime=None):
+        """Warns about time slots which cannot be prepared in time because
+        cycle of the previous slot ends too close to them.
+
+        Returns:
+            list of infeasible time table entries in HH:MM format
+        """
+        now = now or self.clock.now()
+        slots = sorted(set(next_slot(entry, now) for entry in self.time_table))
+        infeasible = []
+
+        for i, slot in enumerate(slots):
+            previous = slots[i - 1] if i else slots[-1] - timedelta(days=1)
+            entry = slot.strftime('%H:%M')
+            required = self.launch_offset(entry)
+            if previous == slot or slot - previous >= required:
+                continue
+
+            log.warning('[smp][!] Slot %s is infeasible: its cycle takes '
+                        '%d s but previous slot ends %d s before it'
+                        % (entry, required.total_seconds(),
+                           (slot - previous).total_seconds()))
+            infeasible.append(entry)
+
+        return infeasible
+
+    def create_backend(self, output_folder: str, profile=None):
+        """Creates render backend selected in configuration.
+
+        Arguments:
+            output_folder(str): folder where encoded videos are written
+            profile(EncodingProfile): encoding profile (configured one is
+                used if not specified)
+
+        Raises:
+            ValueError: unknown render backend is specified
+        """
+        name = self.param('render_backend')
+        if name not in RENDER_BACKENDS:
+            raise ValueError('unknown render backend: %s' % name)
+        return RENDER_BACKENDS[name](
+            output_folder, self.cfg['slide_show_resolution'],
+            profile or self.encoding_profile(0))
+
+    def create_renderer(self, profile=None):
+        """Creates segment renderer if segment-based render mode is selected
+        in configuration, otherwise returns None.
+
+        Arguments:
+            profile(EncodingProfile): encoding profile of segments
+        """
+        render_mode = self.param('render_mode')
+        if render_mode not in ('segments', 'parallel'):
+            return None
+
+        workers = 1
+        if render_mode == 'parallel':
+            workers = self.param('encoding_workers', int) or os.cpu_count() or 1
+
+        folder = os.path.join(
+            os.path.expandvars(self.param('cache_path')), 'segments')
+        return SegmentRenderer(
+            folder,
+            self.cfg['slide_show_resolution'],
+            self.param('segment_cache_size', int),
+            self.video_encoding_timeout,
+            workers,
+            self.create_backend(folder, profile))
+
+    def load_preprocessor(self):
+        """Returns images pre-processor or None if pre-processing is disabled
+        in configuration.
+        """
+        if not self.param('preprocess_images', bool):
+            return None
+
+        if self.preprocessor is None:
+            self.preprocessor = ImagePreprocessor(
+                os.path.join(os.path.expandvars(self.param('cache_path')),
+                             'preprocessed'),
+                self.cfg['slide_show_resolution'],
+                self.param('preprocessed_cache_size', int),
+                self.param('preprocess_workers', int) or os.cpu_count() or 1)
+
+        return self.preprocessor
+
+    def preprocess_images(self, image_paths: list):
+        """Orients and resizes images to slide show resolution.
+
+        Returns:
+            paths to normalized images in the same order
+        """
+        preprocessor = self.load_preprocessor()
+        if preprocessor is None:
+            return image_paths
+        return preprocessor.process_all(image_paths)
+
+    def create_slide_show(self, image_paths: list, music=None, renderer=None,
+                          end_playback: datetime=None):
+        """Creates slide show with from provided images and random audio track.
+
+        Transitions and audio track are picked using generator seeded with
+        content of the first image, so the same playlist gives the same slide
+        show which is reused from render cache instead of being encoded again.
+
+        Arguments:
+            image_paths(list): paths to slide show images
+            music(tuple): music paths and duration returned by pick_music
+            renderer(SegmentRenderer): renderer with already submitted
+                segments of slide show
+            end_playback(datetime): time point when playback should be
+                ended used to select encoding profile
+        """
+        output_folder = os.path.expandvars(self.cfg['created_slide_shows_path'])
+
+        cache_size = self.param('render_cache_size', int)
+        if cache_size > 0 and self.render_cache is None:
+            self.render_cache = RenderCache(output_folder, cache_size)
+        elif cache_size <= 0:
+            self.render_cache = None
+
+        single_image_duration = int(self.cfg['image_display_duration'])
+        with self.timings.stage('preprocess'):
+            image_paths = self.preprocess_images(image_paths)
+
+        with self.timings.stage('build'):
+            seed = file_digest(image_paths[0])
+            builder = SlideShowBuilder.from_images(
+                image_paths, single_image_duration, seed)
+            slide_show_config = builder.build()
+
+            video_duration = single_image_duration * len(image_paths)
+            audio, audio_duration = \
+                music or self.pick_music(seed, video_duration)
+
+        if renderer is not None:
+            profile = renderer.profile
+        else:
+            profile = self.encoding_profile(video_duration, end_playback)
+        backend = self.create_backend(output_folder, profile)
+
+        if self.render_cache is None:
+            video_file_name = str(uuid.uuid4())
+            result_path = os.path.join(output_folder, video_file_name + '.mp4')
+
+        else:
+            key = self.render_cache.fingerprint(
+                slide_show_config, image_paths, audio or [],
+                *backend.options)
+            result_path = self.render_cache.lookup(key)
+
+            if result_path is not None:
+                log.debug('[smp][+] Reuse previously created slide show')
+                return video_duration, result_path
+
+            # video is encoded under temporary name and renamed on success
+            # so interrupted encoding never leaves broken cache entry
+            video_file_name = key + '.part'
+            result_path = self.render_cache.path(key)
+
+        encoded_path = backend.output_path(video_file_name)
+        log.debug('[smp][.] Start video creation...\n')
+        succeeded = False
+        started = time.monotonic()
 
         try:
-            bin_name = "[dvd-slideshow]"
-            for line in proc.stdout:
-                line = line.decode().strip()
-                line = line.replace(bin_name, "")
-                line = bin_name + " " + line
-                log.debug(line)
-            proc.stdout.close()
-            proc.wait(timeout=self.video_encoding_timeout)
+            if renderer is None:
+                renderer = self.create_renderer(profile)
+
+            if renderer is not None:
+                succeeded = renderer.render(
+                    builder, encoded_path, audio) is not None
+
+            else:
+                proc = backend.encode(
+                    video_file_name, builder, audio,
+                    video_duration, audio_duration)
+                try:
+                    status = wait_process(
+                        proc, backend.encoder_bin,
+                        started + self.video_encoding_timeout,
+                        self.encoding_progress)
+                finally:
+                    backend.finish(video_file_name)
+                succeeded = status == 0
 
         except subprocess.TimeoutExpired:
             log.error('[smp][-] Slide show creation timeout expired!')
+
+        finally:
+            if renderer is not None:
+                renderer.close()
+
+        encoding_time = time.monotonic() - started
+        self.timings.add('encode', encoding_time)
+        self.metrics.event('encode', duration=encoding_time,
+                           images=len(image_paths), succeeded=succeeded,
+                           render_mode=self.param('render_mode'),
+                           render_backend=backend.NAME,
+                           profile=profile.name)
+        if succeeded:
+            self.metrics.observe('smp_encode_seconds_per_image',
+                                 encoding_time / len(image_paths))
+        else:
+            self.metrics.inc('smp_encode_failures_total')
+
+        # partially encoded video should never be played back or cached
+        if not succeeded or not os.path.exists(encoded_path):
+            log.error('[smp][-] Slide show has not been created!')
+            if os.path.exists(encoded_path):
+                os.remove(encoded_path)
             return None
 
-        result_path = os.path.join(
-            os.path.expandvars(self.cfg['created_slide_shows_path']),
-            video_file_name + '.mp4')
+        self.encoding_time = encoding_time
+        if video_duration > 0:
+            self.encoding_rate = encoding_time / (
+                profile_cost(profile) * video_duration)
+
+        if self.render_cache is not None:
+            os.replace(encoded_path, result_path)
+            self.render_cache.evict()
 
         return video_duration, result_path
 
+    def encoding_progress(self, progress):
+        """Publishes progress of slide show encoding reported by encoder."""
+        if progress.total:
+            self.metrics.set('smp_encoding_progress_ratio',
+                             progress.done / progress.total)
+
+    def download_and_create_slide_show(self, end_playback: datetime=None):
+        """Downloads images and creates slide show overlapping both stages.
+
+        Background music library is re-indexed as soon as the first image is
+        downloaded, each image is normalized as soon as it is downloaded and
+        in segment-based render modes each segment is submitted for encoding
+        as soon as its images are normalized.
+
+        Arguments:
+            end_playback(datetime): time point when playback should be ended
+
+        Returns:
+            the same result as create_slide_show method or None if images
+            cannot be retrieved
+        """
+        # slide show length is not known yet, so profile of segments is
+        # selected for slide show as long as the previous one
+        renderer = self.create_renderer(self.encoding_profile(
+            self.estimated_slide_show_duration, end_playback))
+        preprocessor = self.load_preprocessor()
+        single_image_duration = int(self.cfg['image_display_duration'])
+        downloaded = {}
+        condition = threading.Condition()
+
+        def on_ready(index, path):
+            with condition:
+                downloaded[index] = path
+                condition.notify()
+
+        def on_image(index, path):
+            if preprocessor is None:
+                on_ready(index, path)
+            else:
+                future = preprocessor.submit(path)
+                future.add_done_callback(
+                    lambda f: on_ready(index, f.result()))
+
+        timings = self.timings
+
+        def download_images():
+            # downloading stages belong to the cycle being prepared
+            self.timings = timings
+            return self.download_images(on_image, end_playback)
+
+        executor = ThreadPoolExecutor(max_workers=2)
+        download = executor.submit(download_images)
+        download.add_done_callback(lambda _: on_ready(-1, None))
+        music, seen, submitted = None, 0, 0
+
+        try:
+            while True:
+                with condition:
+                    condition.wait_for(lambda: len(downloaded) > seen)
+                    seen = len(downloaded)
+                    finished = -1 in downloaded
+                    landed = []
+                    while len(landed) in downloaded:
+                        landed.append(downloaded[len(landed)])
+
+                if landed and music is None:
+                    seed = file_digest(landed[0])
+                    music = executor.submit(self.load_music_library)
+
+                # all segments except the last one are final since later
+                # images cannot change transitions preceding them
+                if renderer is not None and len(landed) - 1 > submitted:
+                    builder = SlideShowBuilder.from_images(
+                        landed, single_image_duration, seed)
+                    for segment in builder.segments()[submitted:-1]:
+                        renderer.submit(segment)
+                    submitted = len(landed) - 1
+
+                if finished:
+                    break
+
+            image_paths = download.result()
+            if not image_paths:
+                log.error('[smp][-] Cannot retrieve images')
+                return None
+
+            # tracks fitting slide show are selected once its length is known
+            if music is not None:
+                music.exception()
+
+            return self.create_slide_show(
+                image_paths, None, renderer, end_playback)
+
+        finally:
+            executor.shutdown(wait=False)
+            if renderer is not None:
+                renderer.close()
+
     def playback_with_delay(self, path, duration, end_playback):
-        """Tries to guarantee accurate timing using kind of spin waiting."""
-        while True:
+        """Starts playback `duration` seconds before end of playback.
 
-            now = datetime.fromtimestamp(time.time())
-            if now < (end_playback - timedelta(seconds=duration)):
-                log.debug("[smp][.] Current time: %s" % now)
-                time.sleep(1)
-                continue
+        Instead of polling clock, sleeps on monotonic clock up to the start
+        time point. Measured start drift is saved into `start_drift`. Player
+        is stopped at end of playback.
+
+        Raises:
+            subprocess.TimeoutExpired: player has been stopped at end of
+                playback
+        """
+        start = end_playback - timedelta(seconds=duration)
+        log.debug("[smp][.] Wait for playback start at: %s" % start)
+
+        self.start_drift = sleep_until(start, self.clock)
+        log.debug("[smp][.] Start playback! (drift: %.3f s)" % self.start_drift)
 
-            log.debug("[smp][.] Start playback!")
+        with self.timings.stage('player_start'):
             proc = self.player.playback(path)
-            for line in proc.stdout:
-                line = line.decode().strip()
-                line = "[%s] %s" % (self.player.player_bin, line)
-                log.debug(line)
-            proc.wait(duration)
-            break
+        left = (end_playback - self.clock.now()).total_seconds()
+        wait_process(proc, self.player.player_bin,
+                     self.clock.monotonic() + left, clock=self.clock)
+
+    def create_player(self):
+        """Creates player used for slide show playback."""
+        player = SlideShowPlayer(
+            os.path.expandvars(self.cfg['created_slide_shows_path']))
+        player.fullscreen()
+        player.mpv()
+        # player.vlc()
+        return player
+
+    def warm_up_player(self):
+        """Starts idle player controlled via its control socket if warm
+        player is enabled in configuration.
+        """
+        if not self.param('warm_player', bool):
+            return
+
+        if self.controller is not None and self.controller.running:
+            return
+
+        try:
+            self.controller = self.create_player().controller()
+            self.controller.start()
+            log.debug('[smp][+] Warm player started')
+
+        except (KeyError, OSError) as e:
+            log.warning('[smp][!] Cannot start warm player: %s' % str(e))
+            self.controller = None
+
+    def playback_warm(self, path, duration, end_playback):
+        """Plays slide show using warm player.
+
+        File is loaded paused shortly before playback start, then playback
+        is started and stopped by commands at exact time points. Falls back
+        to playback by newly spawned player if warm player fails.
+        """
+        start = end_playback - timedelta(seconds=duration)
+        preload = timedelta(seconds=self.param('warm_player_preload', float))
+
+        try:
+            sleep_until(start - preload, self.clock)
+            self.controller.load(path)
+
+            self.start_drift = sleep_until(start, self.clock)
+            with self.timings.stage('player_start'):
+                self.controller.play()
+            log.debug("[smp][.] Start playback! (drift: %.3f s)"
+                      % self.start_drift)
+
+            sleep_until(end_playback, self.clock)
+            self.controller.stop()
+            log.debug("[smp][.] Playback stop...")
+
+        except (OSError, RuntimeError) as e:
+            log.warning('[smp][!] Warm player failed: %s' % str(e))
+            self.controller.close()
+            self.controller = None
+            self.playback_with_delay(path, duration, end_playback)
+
+    def prepare(self, end_playback: datetime=None):
+        """Downloads images, creates slide show and probes its duration.
+
+        Slide show rendered by render service is downloaded instead if the
+        service is configured and available. Durations of preparation
+        stages are collected by new `timings`.
+
+        Arguments:
+            end_playback(datetime): time point when playback should be ended
+
+        Returns:
+            PreparedShow or None if slide show cannot be created
+        """
+        with self._prepare_lock:
+            self.timings = StageTimer()
+            result = self.download_slide_show(end_playback)
+
+            if result is None:
+                log.debug("[smp][.] Try to retrieve images from %s"
+                          % self.cfg['images_api'])
+
+                if self.param('pipelined_cycle', bool):
+                    result = self.download_and_create_slide_show(
+                        end_playback)
+
+                else:
+                    image_paths = self.download_images(
+                        end_playback=end_playback)
+
+                    if image_paths is None:
+                        log.error('[smp][-] Cannot retrieve images. '
+                                  'Terminating...')
+                        return None
+
+                    result = self.create_slide_show(
+                        image_paths, end_playback=end_playback)
+
+            if result is None:
+                log.error('[smp][-] Cannot create slide show. Terminating...')
+                return None
+
+            estimated_duration, slide_show_path = result
+            with self.timings.stage('probe'):
+                actual_duration = self.probe(slide_show_path).duration
+
+            return PreparedShow(
+                slide_show_path, estimated_duration, actual_duration,
+                self.timings)
+
+    def prerender(self, end_playback: datetime):
+        """Starts slide show preparation for specified time slot in background.
+
+        Arguments:
+            end_playback(datetime): time point when playback should be ended
+        """
+        with self._prerender_lock:
+            if end_playback in self._prerendered:
+                return
+
+            if self._prerender_executor is None:
+                self._prerender_executor = ThreadPoolExecutor(max_workers=1)
+
+            log.debug('[smp][.] Pre-render slide show to be ended at %s'
+                      % end_playback)
+            self._prerendered[end_playback] = \
+                self._prerender_executor.submit(self.prepare, end_playback)
+
+    def prerender_upcoming(self, now: datetime=None):
+        """Starts background preparation of slide shows for the nearest time
+        slots of time table (number of slots is specified in configuration).
+        """
+        slots = self.param('prerender_slots', int)
+        if slots <= 0 or not self.time_table:
+            return
+
+        now = now or self.clock.now()
+        upcoming = sorted(next_slot(entry, now) for entry in self.time_table)
+
+        with self._prerender_lock:
+            for tp in list(self._prerendered):
+                if tp <= now:
+                    del self._prerendered[tp]
+
+        for tp in upcoming[:slots]:
+            self.prerender(tp)
+
+    def take_prerendered(self, end_playback: datetime):
+        """Returns slide show prepared for specified time slot or None if it
+        was not prepared or preparation failed.
+        """
+        with self._prerender_lock:
+            future = self._prerendered.pop(end_playback, None)
+
+        if future is None:
+            return None
+
+        try:
+            show = future.result()
+        except Exception as e:
+            log.warning('[smp][!] Pre-rendering failed: %s' % str(e))
+            return None
+
+        if show is None or not os.path.exists(show.path):
+            log.warning('[smp][!] Pre-rendered slide show is not available')
+            return None
+
+        log.debug('[smp][+] Use pre-rendered slide show')
+        return show
 
     def run(self, end_playback=None, no_wait: bool=False):
         """Starts download-create-playback cycle.
@@ -164,25 +1015,27 @@ class SimpleMediaPlayer:
             end_playback(datetime): time point when playback should be ended
             no_wait(bool): start playback immediately (without spin-waiting)
         """
-        log.debug("[smp][.] Read configuration file: '%s'" % PLAYER_CONFIG_PATH)
-        self.read_config(PLAYER_CONFIG_PATH)
+        # time slot is resolved before end of playback may be adjusted
+        slot = end_playback.strftime('%H:%M') if end_playback else None
 
-        log.debug("[smp][.] Try to retrieve images from %s" % self.cfg['images_api'])
-        image_paths = self.download_images()
+        log.debug("[smp][.] Read configuration file: '%s'" % self.config_path)
+        self.read_config(self.config_path)
+        self.setup_metrics()
+        self.start_drift = self.end_drift = None
 
-        if image_paths is None:
-            log.error('[smp][-] Cannot retrieve images. Terminating...')
-            return
+        self.warm_up_player()
 
-        result = self.create_slide_show(image_paths)
+        show = self.take_prerendered(end_playback)
+        if show is None:
+            show = self.prepare(end_playback)
 
-        if result is None:
-            log.error('[smp][-] Cannot create slide show. Terminating...')
+        if show is None:
+            self.metrics.inc('smp_cycles_total', result='failed')
             return
 
-        estimated_duration, slide_show_path = result
-        actual_duration = avprobe(slide_show_path)
-
+        # playback stages are recorded together with preparation of the show
+        self.timings = show.timings
+        slide_show_path, estimated_duration, actual_duration, _ = show
         self.created_slide_show_path = slide_show_path
         self.estimated_slide_show_duration = estimated_duration
         self.actual_slide_show_duration = actual_duration
@@ -197,28 +1050,32 @@ class SimpleMediaPlayer:
         else:
             duration = estimated_duration
 
-        self.player.fullscreen()
-        self.player.mpv()
-        # self.player.vlc()
+        self.player = self.create_player()
+        playback_started = self.clock.monotonic()
 
         try:
-            now = datetime.now()
+            now = self.clock.now()
 
             if end_playback is not None:
                 if now + timedelta(seconds=duration) > end_playback:
-                    log.warn("[smp][!] Attention: created slide show is too "
-                             "long to be finished on time and will be "
-                             "terminated earlier. It seems that created "
-                             "schedule is to dense.")
+                    log.warning("[smp][!] Attention: created slide show is "
+                                "too long to be finished on time and will be "
+                                "terminated earlier. It seems that created "
+                                "schedule is to dense.")
                     adjusted_wait_time = end_playback - now
                     duration = adjusted_wait_time.total_seconds()
 
-            if no_wait:
-                proc = self.player.playback(slide_show_path)
-                for line in proc.stdout:
-                    log.debug(line.decode().strip())
-                proc.stdout.close()
-                proc.wait(duration)
+            if self.controller is not None and self.controller.running:
+                if no_wait:
+                    end_playback = now + timedelta(seconds=duration)
+                self.playback_warm(slide_show_path, duration, end_playback)
+
+            elif no_wait:
+                with self.timings.stage('player_start'):
+                    proc = self.player.playback(slide_show_path)
+                wait_process(proc, self.player.player_bin,
+                             self.clock.monotonic() + duration,
+                             clock=self.clock)
 
             else:
                 log.debug('[smp][.] Playback should end at: %s'
@@ -230,52 +1087,115 @@ class SimpleMediaPlayer:
             log.debug("[smp][.] Playback stop...")
 
         finally:
-            now = datetime.now()
+            now = self.clock.now()
 
             if end_playback is not None:
-                if (end_playback.hour != now.hour or
-                    end_playback.minute != now.minute or
-                        end_playback.second != now.second):
+                self.end_drift = (now - end_playback).total_seconds()
+                log.debug('[smp][.] Playback end drift: %.3f s'
+                          % self.end_drift)
 
-                    log.warn("[smp][!] Playback has not been "
-                             "ended at specified time!")
+                if abs(self.end_drift) >= 1:
+                    log.warning("[smp][!] Playback has not been "
+                                "ended at specified time!")
 
             log.debug('[smp][.] Ended at: %s' % str(now))
 
         log.debug('[smp][+] Download-create-playback cycle ended!')
+        self.record_cycle(show, self.clock.monotonic() - playback_started)
+        self.record_history(slot, show)
+        self.prerender_upcoming()
 
+    def record_cycle(self, show: PreparedShow, playback_time: float):
+        """Publishes stage durations and playback timing accuracy of finished
+        cycle as metrics and trace event.
 
-def sched():
-    """Makes scheduling of download-create-playback cycles."""
-    log.debug("[smp][.] Read schedule file: %s" % SCHEDULE_PATH)
+        Arguments:
+            show(PreparedShow): played slide show
+            playback_time(float): seconds spent waiting and playing back
+        """
+        durations = show.timings.durations
+        for stage, seconds in durations.items():
+            self.metrics.observe(
+                'smp_stage_duration_seconds', seconds, stage=stage)
 
-    with open(SCHEDULE_PATH) as fp:
-        time_table = fp.read().split()
+        for name, drift in (('start', self.start_drift),
+                            ('end', self.end_drift)):
+            if drift is not None:
+                self.metrics.observe('smp_%s_drift_seconds' % name, drift)
+                self.metrics.set('smp_last_%s_drift_seconds' % name, drift)
 
-    config = configparser.ConfigParser()
-    config.read(PLAYER_CONFIG_PATH)
+        self.metrics.inc('smp_cycles_total', result='played')
+        self.metrics.event(
+            'playback', duration=playback_time, path=show.path,
+            start_drift=self.start_drift, end_drift=self.end_drift,
+            stages=durations)
 
-    minutes_offset = int(config['simple_media_player']['launch_time_offset'])
+    def serve(self, until: datetime=None):
+        """Runs cycles of time table slots one after another.
 
-    now = str(datetime.now().date())
+        Each cycle is started before its slot by predicted launch offset
+        (immediately if it is already late).
 
-    smp = SimpleMediaPlayer()
+        Arguments:
+            until(datetime): time point after which no cycles are started
+                (None means run forever)
+        """
+        log.debug("[smp][.] Start scheduling loop...")
+        last_slot = None
+        while True:
+            # cycle may end slightly before its slot which should not be
+            # played back again
+            now = self.clock.now()
+            if last_slot is not None:
+                now = max(now, last_slot)
 
-    for entry in time_table:
-        tp = datetime.strptime(now + ' ' + entry, '%Y-%m-%d %H:%M')
-        shifted_time = tp - timedelta(minutes=minutes_offset)
+            slot, start = self.next_launch(now)
+            if until is not None and start >= until:
+                return
 
-        # start earlier to have time create video and handle issues
-        actual_start = ':'.join(str(shifted_time.time()).split(':')[:2])
+            log.debug("[smp][.] Job scheduled on %s to be ended at %s"
+                      % (start.strftime('%H:%M:%S'), slot.strftime('%H:%M')))
 
-        schedule.every().day.at(actual_start).do(smp.run, tp)
-        log.debug("[smp][.] Job scheduled on %s to be ended at %s"
-                  % (actual_start, entry))
+            sleep_until(start, self.clock)
+            self.run(slot)
+            last_slot = slot
 
-    log.debug("[smp][.] Start scheduling loop...")
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    def record_history(self, slot: str, show: PreparedShow):
+        """Adds stage durations of finished cycle into cycle history used to
+        predict launch offsets.
+
+        Arguments:
+            slot(str): time table entry in HH:MM format
+            show(PreparedShow): played slide show
+        """
+        # each image is shown for the same time
+        images = round(show.estimated_duration /
+                       int(self.cfg['image_display_duration']))
+        try:
+            self.load_cycle_history().record(
+                slot, images, show.actual_duration, show.timings.durations)
+        except OSError as e:
+            log.warning('[smp][!] Cannot save cycle history: %s' % e)
+
+
+def sched():
+    """Makes scheduling of download-create-playback cycles.
+
+    Cycles are run one after another, each of them is started before its
+    time slot by launch offset predicted from previous cycles.
+    """
+    log.debug("[smp][.] Read schedule file: %s" % SCHEDULE_PATH)
+
+    with open(SCHEDULE_PATH) as fp:
+        time_table = fp.read().split()
+
+    smp = SimpleMediaPlayer()
+    smp.time_table = time_table
+    smp.read_config(PLAYER_CONFIG_PATH)
+    smp.setup_metrics()
+    smp.check_schedule()
+    smp.prerender_upcoming()
+    smp.serve()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,245 @@
+"""
+Images receiver built on top of asyncio and aiohttp (optional dependency).
+"""
+import os
+import json
+import time
+import asyncio
+from datetime import datetime
+
+from urllib3.exceptions import HTTPError
+
+from .images import ImagesReceiver
+from .retry import RetryPolicy, CircuitOpenError, RETRYABLE_STATUSES
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncRemoteImagesReceiver(ImagesReceiver):
+    """Asynchronous counterpart of RemoteImagesReceiver.
+
+    Playlist, entries metadata and images are fetched by coroutines sharing
+    single keep-alive connection pool, so the whole playlist is downloaded
+    by one thread. Number of concurrently downloaded entries is limited by
+    `workers`. Images cache, retry policy and circuit breaker are used the same
+    way as by synchronous receiver.
+
+    `receive_images` runs its own event loop; event loop driven code should
+    await `receive_images_async` coroutine instead.
+    """
+
+    def __init__(self, api, storing_folder, workers=4, cache=None,
+                 buffer_size=2**16, retry=None, breaker=None):
+        if aiohttp is None:
+            raise ImportError('aiohttp is required by asynchronous receiver '
+                              '(see requirements-async.txt)')
+
+        self._api = api
+        self._downloads = storing_folder
+        self._workers = max(1, workers)
+        self._cache = cache
+        self._buffer_size = buffer_size
+        self._retry = retry or RetryPolicy()
+        self._breaker = breaker
+
+    @property
+    def path(self):
+        return self._downloads
+
+    async def _fetch(self, session, url, deadline, timeout,
+                     headers=None, output_path=None, method='GET', body=None,
+                     retry=None):
+        """Sends HTTP request retrying failed ones.
+
+        Arguments:
+            output_path(str): if specified, body of successful response is
+                streamed into this file instead of being returned
+            retry(RetryPolicy): policy overriding receiver retry policy
+
+        Returns:
+            tuple of status, headers and body (None if response was saved into
+            file or has no content) or None if all attempts failed
+
+        Raises:
+            CircuitOpenError: requests are blocked by circuit breaker
+        """
+        async for attempt in (retry or self._retry).async_attempts(deadline):
+            if attempt:
+                self._add_stat('retries', 1)
+            if self._breaker is not None and not self._breaker.allow():
+                raise CircuitOpenError("server is unavailable: %s" % url)
+
+            request_timeout = aiohttp.ClientTimeout(
+                total=max(0.1, self._retry.timeout(deadline, timeout)))
+            try:
+                async with session.request(
+                        method, url, headers=headers, data=body,
+                        timeout=request_timeout) as r:
+                    if r.status >= 500 or r.status in RETRYABLE_STATUSES:
+                        raise aiohttp.ClientResponseError(
+                            r.request_info, r.history, status=r.status)
+
+                    content = None
+                    if output_path is not None and r.status == 200:
+                        with open(output_path, 'wb') as fp:
+                            async for chunk in r.content.iter_chunked(
+                                    self._buffer_size):
+                                fp.write(chunk)
+                                self._add_stat('bytes', len(chunk))
+                    elif r.status < 300:
+                        content = await r.read()
+
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if self._breaker is not None:
+                    self._breaker.record_failure()
+                continue
+
+            if self._breaker is not None:
+                self._breaker.record_success()
+            return r.status, r.headers, content
+
+        return None
+
+    async def _resolve_playlist(self, session, response, deadline, timeout):
+        """Resolves playlist entries into image URLs using batch resolve
+        endpoint if server provides it.
+
+        Returns:
+            tuple of entries metadata URLs and image URLs (None for entries
+            which should be resolved one by one)
+        """
+        entries, urls = self._parse_playlist(response)
+        pending = [i for i, url in enumerate(urls) if url is None]
+        resolve_url = response.get('resolve')
+
+        if pending and resolve_url:
+            body = json.dumps({'playlist': [entries[i] for i in pending]})
+            result = await self._fetch(
+                session, resolve_url, deadline, timeout,
+                {'Content-Type': 'application/json'},
+                method='POST', body=body.encode('utf8'),
+                retry=RetryPolicy(max_attempts=1))
+            if result is not None and result[0] == 200:
+                self._apply_resolved(urls, pending, result[2])
+
+        return entries, urls
+
+    async def _download_image(self, session, index, url, images_folder,
+                              since, deadline, timeout, image_url=None):
+        """Resolves playlist entry into image URL (unless it is already
+        resolved) and downloads it.
+
+        Returns local path of downloaded image or None if all attempts failed.
+        """
+        if image_url is None:
+            if url is None:
+                return None
+            result = await self._fetch(session, url, deadline, timeout)
+            if result is None or result[0] != 200:
+                return None
+            image_url = json.loads(result[2].decode('utf8'))['url']
+
+        cache = self._cache
+        if cache is None:
+            image_name = '%03d_%s' % (index, image_url.split('/')[-1])
+            local_path = os.path.join(images_folder, image_name)
+            part_path = local_path + '.part'
+            headers = None
+        else:
+            entry = cache.lookup(image_url)
+            if entry is not None and cache.is_fresh(entry, since):
+                return cache.touch(image_url)
+            part_path = cache.temp_file(image_url)
+            headers = cache.conditional_headers(image_url)
+
+        result = await self._fetch(
+            session, image_url, deadline, timeout, headers, part_path)
+
+        if result is None or result[0] != 200:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            if result is not None and result[0] == 304:
+                return cache.touch(image_url, result[1])
+            return None
+
+        if cache is not None:
+            return cache.store(image_url, part_path, result[1])
+
+        os.replace(part_path, local_path)
+        return local_path
+
+    async def receive_images_async(self, timeout=None, on_image=None):
+        """Coroutine downloading images via provided API.
+
+        Arguments and result are the same as of `receive_images` method.
+        """
+        timeout = timeout or self._retry.request_timeout
+        deadline = self._retry.deadline()
+        started = time.time()
+
+        if self._cache is None:
+            timestamp = datetime.today().strftime("%Y-%m%d-%H%M-%S")
+            images_folder = os.path.join(self._downloads, timestamp)
+            os.makedirs(images_folder, exist_ok=True)
+        else:
+            images_folder = self._cache.path
+
+        semaphore = asyncio.Semaphore(self._workers)
+        connector = aiohttp.TCPConnector(limit=self._workers)
+
+        self.stats = {'bytes': 0, 'retries': 0}
+        async with aiohttp.ClientSession(connector=connector) as session:
+            fetched = time.monotonic()
+            result = await self._fetch(session, self._api, deadline, timeout)
+            if result is None or result[0] != 200:
+                raise HTTPError("cannot retrieve url: %s" % self._api)
+            entries, urls = await self._resolve_playlist(
+                session, json.loads(result[2].decode('utf8')),
+                deadline, timeout)
+            self.stats['playlist_time'] = time.monotonic() - fetched
+
+            async def download(index):
+                async with semaphore:
+                    path = await self._download_image(
+                        session, index, entries[index], images_folder,
+                        started, deadline, timeout, urls[index])
+                if on_image is not None and path is not None:
+                    on_image(index, path)
+                return path
+
+            results = await asyncio.gather(
+                *[download(index) for index in range(len(entries))])
+
+        downloaded_images = [path for path in results if path is not None]
+        self.stats['images'] = len(downloaded_images)
+
+        if not downloaded_images:
+            if self._cache is None:
+                import shutil
+                shutil.rmtree(images_folder, ignore_errors=True)
+            raise HTTPError("cannot retrieve images from url: %s" % self._api)
+
+        if self._cache is not None:
+            self._cache.evict(keep=downloaded_images)
+            self._cache.save()
+
+        self._save_last_playlist(downloaded_images)
+        return downloaded_images
+
+    def receive_images(self, timeout=None, on_image=None):
+        """Downloads images via provided API.
+
+        Arguments:
+            timeout(float): timeout of single request (retry policy request
+                timeout is used if not specified)
+            on_image(callable): function called from event loop with playlist
+                index and local path of each downloaded image
+
+        Raises:
+            urllib3.exceptions.HTTPError: no images retrieved before retry
+                policy gave up
+        """
+        return asyncio.run(self.receive_images_async(timeout, on_image))
@@ -0,0 +1,196 @@
+"""
+Persistent on-disk cache for downloaded images.
+"""
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+from ..storage import atomic_write_json
+
+
+def file_digest(path: str, chunk_size: int=2**16):
+    """Returns SHA-1 hex digest of file content."""
+    sha = hashlib.sha1()
+    with open(path, 'rb') as fp:
+        while True:
+            data = fp.read(chunk_size)
+            if not data:
+                break
+            sha.update(data)
+    return sha.hexdigest()
+
+
+def _max_age(headers):
+    """Extracts max-age value (in seconds) from Cache-Control header."""
+    cache_control = headers.get('Cache-Control', '') if headers else ''
+    for directive in cache_control.split(','):
+        name, _, value = directive.strip().partition('=')
+        if name.lower() == 'no-cache':
+            return 0
+        if name.lower() == 'max-age' and value.isdigit():
+            return int(value)
+    return 0
+
+
+class ImageCache:
+    """Content-addressed cache of downloaded images.
+
+    Each URL is mapped onto a file named after SHA-1 digest of its content, so
+    identical images served from different URLs are stored once. Validators
+    (ETag and Last-Modified) returned by server are kept to revalidate entries
+    using conditional GET requests, and entries allowed to be cached by server
+    (Cache-Control: max-age) are served without any request at all.
+
+    Entries not used for more than `max_age` seconds are removed, and least
+    recently used ones are evicted when total size exceeds `max_size` bytes.
+    """
+
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, folder: str, max_size: int=512*2**20,
+                 max_age: int=7*24*3600):
+        self._folder = folder
+        self._max_size = max_size
+        self._max_age = max_age
+        self._lock = threading.RLock()
+        os.makedirs(folder, exist_ok=True)
+        self._entries = self._load_index()
+
+    @property
+    def path(self):
+        return self._folder
+
+    def _index_path(self):
+        return os.path.join(self._folder, self.INDEX_FILE)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path()) as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """Atomically writes cache index onto disk."""
+        with self._lock:
+            atomic_write_json(self._index_path(), self._entries)
+
+    def lookup(self, url: str):
+        """Returns cache entry for specified URL or None if it is missing."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            if not os.path.exists(os.path.join(self._folder, entry['file'])):
+                del self._entries[url]
+                return None
+            return dict(entry)
+
+    def is_fresh(self, entry: dict, since: float=None):
+        """Checks if entry can be used without revalidation.
+
+        Arguments:
+            entry(dict): cache entry returned by lookup method
+            since(float): entries validated after this time point are fresh
+        """
+        if since is not None and entry['validated'] >= since:
+            return True
+        return entry['expires'] > time.time()
+
+    def conditional_headers(self, url: str):
+        """Returns headers for conditional GET request of cached URL."""
+        entry = self.lookup(url)
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def touch(self, url: str, headers=None):
+        """Marks entry as used (and revalidated if server headers provided).
+
+        Returns path to cached file.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries[url]
+            entry['accessed'] = now
+            if headers is not None:
+                entry['validated'] = now
+                entry['expires'] = now + _max_age(headers)
+                entry['etag'] = headers.get('ETag', entry.get('etag'))
+                entry['last_modified'] = headers.get(
+                    'Last-Modified', entry.get('last_modified'))
+            return os.path.join(self._folder, entry['file'])
+
+    def temp_file(self, url: str):
+        """Creates temporary file in cache folder to download URL content."""
+        _, ext = os.path.splitext(url.split('/')[-1])
+        fd, tmp = tempfile.mkstemp(dir=self._folder, suffix=ext + '.part')
+        os.close(fd)
+        return tmp
+
+    def store(self, url: str, downloaded_path: str, headers=None):
+        """Moves downloaded file into cache and returns its new path.
+
+        Arguments:
+            url(str): source URL of downloaded file
+            downloaded_path(str): path to downloaded file
+            headers(dict): response headers containing cache validators
+        """
+        _, ext = os.path.splitext(url.split('/')[-1])
+        name = file_digest(downloaded_path) + ext
+        path = os.path.join(self._folder, name)
+        os.replace(downloaded_path, path)
+
+        now = time.time()
+        headers = headers or {}
+        with self._lock:
+            self._entries[url] = {
+                'file': name,
+                'size': os.path.getsize(path),
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'expires': now + _max_age(headers),
+                'validated': now,
+                'accessed': now
+            }
+        return path
+
+    def evict(self, keep=()):
+        """Removes outdated and least recently used entries.
+
+        Arguments:
+            keep(iterable): paths of files that should not be removed
+        """
+        keep = {os.path.basename(path) for path in keep}
+        now = time.time()
+
+        with self._lock:
+            by_access = sorted(self._entries.items(),
+                               key=lambda item: item[1]['accessed'])
+            # entries of identical content share file counted only once
+            sizes = {e['file']: e['size'] for e in self._entries.values()}
+            total = sum(sizes.values())
+
+            for url, entry in by_access:
+                if entry['file'] in keep:
+                    continue
+                outdated = now - entry['accessed'] > self._max_age
+                if not outdated and total <= self._max_size:
+                    break
+                del self._entries[url]
+                shared = any(e['file'] == entry['file']
+                             for e in self._entries.values())
+                if not shared:
+                    total -= sizes.pop(entry['file'])
+                    try:
+                        os.remove(os.path.join(self._folder, entry['file']))
+                    except OSError:
+                        pass
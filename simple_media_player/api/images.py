@@ -1,18 +1,41 @@
 import os
 import abc
 import json
+import time
 import urllib3
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from urllib3.exceptions import MaxRetryError, RequestError, HTTPError
 
+from ..storage import atomic_write_json
+from .retry import RetryPolicy, CircuitOpenError, RETRYABLE_STATUSES
+
 
 class ImagesReceiver(metaclass=abc.ABCMeta):
     """Abstract image receiver.
 
     Each receiver should specify path that will be used to store downloaded
-    files and a method for images receiving.
+    files and a method for images receiving. Paths of the last successfully
+    received playlist are kept, so it can be shown again while server is
+    unavailable.
+
+    Statistics of the last `receive_images` call are available via `stats`
+    dictionary: `playlist_time` - seconds spent retrieving playlist and
+    resolving its entries, `images` - number of received images, `bytes` -
+    size of downloaded images content and `retries` - number of retried
+    requests.
     """
 
+    LAST_PLAYLIST_FILE = 'last_playlist.json'
+
+    stats = None
+
+    def _add_stat(self, name: str, value):
+        stats = self.stats
+        if stats is not None:
+            stats[name] = stats.get(name, 0) + value
+
     @abc.abstractproperty
     def path(self):
         pass
@@ -21,93 +44,417 @@ class ImagesReceiver(metaclass=abc.ABCMeta):
     def receive_images(self):
         pass
 
+    def last_playlist(self):
+        """Returns paths of the last successfully received images which are
+        still available on disk.
+        """
+        try:
+            with open(os.path.join(self.path, self.LAST_PLAYLIST_FILE)) as fp:
+                paths = json.load(fp)
+        except (OSError, ValueError):
+            return []
+        return [path for path in paths if os.path.exists(path)]
+
+    @staticmethod
+    def _parse_playlist(response: dict):
+        """Splits playlist response into entries and their image URLs.
+
+        Legacy entries are URLs of metadata resolved into image URL one by
+        one. Servers supporting batch resolution return entries as objects
+        with already resolved image `url` (and optional metadata URL under
+        `entry` key), or provide `resolve` endpoint resolving all entries
+        by single request.
+
+        Returns:
+            tuple of entries metadata URLs and image URLs (None for entries
+            which are not resolved yet)
+        """
+        entries, urls = [], []
+        for entry in response['playlist']:
+            if isinstance(entry, dict):
+                entries.append(entry.get('entry'))
+                urls.append(entry.get('url'))
+            else:
+                entries.append(entry)
+                urls.append(None)
+        return entries, urls
+
+    @staticmethod
+    def _apply_resolved(urls: list, pending: list, data: bytes):
+        """Fills image URLs of pending entries using response of batch
+        resolve endpoint. Malformed response is ignored, so entries are
+        resolved one by one.
+        """
+        try:
+            resolved = json.loads(data.decode('utf8'))['urls']
+        except (ValueError, KeyError, TypeError):
+            return
+        if not isinstance(resolved, list) or len(resolved) != len(pending):
+            return
+        for index, url in zip(pending, resolved):
+            if isinstance(url, str):
+                urls[index] = url
+
+    def _save_last_playlist(self, paths):
+        atomic_write_json(
+            os.path.join(self.path, self.LAST_PLAYLIST_FILE), paths)
+
+
+class InFlightLimit:
+    """Limits total number of bytes being transferred concurrently.
+
+    Downloads reserve their expected size before streaming; downloads larger
+    than the limit reserve the whole limit, so they run exclusively.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size: int):
+        """Blocks until `size` bytes can be transferred. Returns reserved
+        number of bytes which should be passed to `release` method.
+        """
+        size = min(size, self._max_bytes)
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._in_flight + size <= self._max_bytes)
+            self._in_flight += size
+        return size
+
+    def release(self, size: int):
+        with self._condition:
+            self._in_flight -= size
+            self._condition.notify_all()
+
 
 class RemoteImagesReceiver(ImagesReceiver):
     """Implements remote images receiver.
 
-    Class instances download using API call images into local folder.
+    Class instances download using API call images into local folder. If
+    images cache is provided, images are stored in cache instead and repeated
+    images are revalidated instead of being downloaded again.
+
+    Images are streamed into temporary files through reused buffer of
+    `buffer_size` bytes and renamed when complete. Interrupted transfers are
+    resumed using HTTP Range requests. Total size of concurrently transferred
+    images is limited by `max_in_flight` bytes.
+
+    Failed requests are retried according to `retry` policy (by default it is
+    built from `download_attempts` and `infinite_retry` arguments). Optional
+    circuit breaker shared between receivers stops requests to failing server.
     """
 
     def __init__(self, api, storing_folder,
-                 download_attempts=10, infinite_retry=True):
+                 download_attempts=10, infinite_retry=True, workers=1,
+                 cache=None, buffer_size=2**16, max_in_flight=32*2**20,
+                 retry=None, breaker=None):
         self._api = api
         self._downloads = storing_folder
-        self._infinite_retry = infinite_retry
-        self._download_attempts = download_attempts
+        self._retry = retry or RetryPolicy(
+            max_attempts=None if infinite_retry else download_attempts)
+        self._breaker = breaker
+        self._deadline = None
+        self._timeout = self._retry.request_timeout
+        self._workers = max(1, workers)
+        self._cache = cache
+        self._buffer_size = buffer_size
+        self._in_flight = InFlightLimit(max_in_flight)
+        self._buffers = threading.local()
+        self._stats_lock = threading.Lock()
 
     @property
     def path(self):
         return self._downloads
 
+    def _add_stat(self, name: str, value):
+        with self._stats_lock:
+            super()._add_stat(name, value)
+
     def _create_attempts_gen(self):
-        attempt = 0
-        while self._infinite_retry:
+        for attempt in self._retry.attempts(self._deadline):
+            if attempt:
+                self._add_stat('retries', 1)
             yield attempt
-            attempt += 1
-        for i in range(self._download_attempts):
-            yield i
 
-    def _get_request(self, http, url, preload=True):
-        """Helper function for HTTP requests."""
+    def _request(self, http, url, preload=True, headers=None,
+                 method='GET', body=None):
+        """Sends single HTTP request.
 
-        def make_request():
-            try:
-                return http.request('GET', url, preload_content=preload)
-            except HTTPError:
-                return None
+        Returns:
+            response or None if request failed or server error occurred
+
+        Raises:
+            CircuitOpenError: requests are blocked by circuit breaker
+        """
+        if self._breaker is not None and not self._breaker.allow():
+            raise CircuitOpenError("server is unavailable: %s" % url)
+
+        try:
+            r = http.request(
+                method, url, headers=headers, body=body,
+                preload_content=preload,
+                timeout=self._retry.timeout(self._deadline, self._timeout))
+        except HTTPError:
+            r = None
 
-        gen = self._create_attempts_gen()
+        failed = r is None or r.status >= 500
+        if self._breaker is not None:
+            if failed:
+                self._breaker.record_failure()
+            else:
+                self._breaker.record_success()
 
-        for _ in gen:
-            r = make_request()
+        if failed:
+            if r is not None:
+                r.release_conn()
+            return None
+
+        return r
+
+    def _get_request(self, http, url, preload=True, headers=None):
+        """Helper function for HTTP requests."""
+        for _ in self._create_attempts_gen():
+            r = self._request(http, url, preload, headers)
             if r is not None:
                 return r
 
         raise HTTPError("cannot retrieve url: %s" % url)
 
-    def receive_images(self, timeout=20.0):
-        """Downloads images via provided API."""
-        http = urllib3.PoolManager(timeout=timeout)
-        chunk_size = 4096
-        downloaded_images = []
+    def _copy_response(self, r, fp):
+        """Copies response body into file using per-thread reused buffer."""
+        buffer = getattr(self._buffers, 'buffer', None)
+        if buffer is None or len(buffer) != self._buffer_size:
+            buffer = self._buffers.buffer = bytearray(self._buffer_size)
+        view = memoryview(buffer)
+        copied = 0
 
-        timestamp = datetime.today().strftime("%Y-%m%d-%H%M-%S")
-        images_folder = os.path.join(self._downloads, timestamp)
-        os.makedirs(images_folder, exist_ok=True)
+        try:
+            while True:
+                n = r.readinto(buffer)
+                if not n:
+                    break
+                fp.write(view[:n])
+                copied += n
+        finally:
+            self._add_stat('bytes', copied)
 
-        r = self._get_request(http, self._api)
-        decoded = r.data.decode('utf8')
-        playlist = json.loads(decoded)['playlist']
+    def _stream_to_file(self, http, url, part_path, headers=None):
+        """Downloads URL content into file resuming interrupted transfers.
+
+        Transfer broken by network error is continued from the end of
+        partially downloaded file if server supports range requests and
+        resource has not changed, otherwise it is started from scratch.
+
+        Client errors are permanent and are not retried, except of timeouts,
+        rate limiting and rejected range of resumed transfer.
+
+        Returns:
+            completed response (with 200, 206 or 304 status) or None if all
+            attempts failed or resource cannot be retrieved
+        """
+        validator = None
 
-        for url in playlist:
+        for _ in self._create_attempts_gen():
+            offset = 0
+            request_headers = dict(headers or {})
+            if validator is not None and os.path.exists(part_path):
+                offset = os.path.getsize(part_path)
+            if offset:
+                request_headers['Range'] = 'bytes=%d-' % offset
+                request_headers['If-Range'] = validator
+
+            r = self._request(
+                http, url, preload=False, headers=request_headers)
+
+            if r is None:
+                continue
+
+            if r.status == 304:
+                r.release_conn()
+                return r
+
+            if r.status >= 400:
+                r.release_conn()
+                if r.status == 416 and offset:
+                    validator = None
+                    continue
+                if r.status in RETRYABLE_STATUSES:
+                    continue
+                return None
+
+            content_range = r.headers.get('Content-Range', '')
+            resumed = (r.status == 206 and
+                       content_range.startswith('bytes %d-' % offset))
+            if not resumed:
+                offset = 0
+
+            # weak entity tags cannot be used to resume transfers
+            etag = r.headers.get('ETag')
+            if etag and etag.startswith('W/'):
+                etag = None
+            validator = etag or r.headers.get('Last-Modified')
+
+            length = r.headers.get('Content-Length')
+            length = int(length) if length and length.isdigit() else None
+            reserved = self._in_flight.acquire(length or self._buffer_size)
+            try:
+                with open(part_path, 'ab' if resumed else 'wb') as fp:
+                    self._copy_response(r, fp)
+            except (HTTPError, OSError):
+                continue
+            finally:
+                self._in_flight.release(reserved)
+                r.release_conn()
+
+            if length is not None and \
+                    os.path.getsize(part_path) != offset + length:
+                continue
+
+            return r
+
+        return None
+
+    def _download_cached(self, http, image_url, since):
+        """Retrieves image using cache.
+
+        Fresh cache entries are returned without any request, stale ones are
+        revalidated using conditional GET request.
+        """
+        cache = self._cache
+
+        entry = cache.lookup(image_url)
+        if entry is not None and cache.is_fresh(entry, since):
+            return cache.touch(image_url)
+
+        local_path = cache.temp_file(image_url)
+        r = self._stream_to_file(
+            http, image_url, local_path,
+            headers=cache.conditional_headers(image_url))
+
+        if r is None or r.status == 304:
+            os.remove(local_path)
+            return None if r is None else cache.touch(image_url, r.headers)
+
+        return cache.store(image_url, local_path, r.headers)
+
+    def _resolve_playlist(self, http, response: dict):
+        """Resolves playlist entries into image URLs using batch resolve
+        endpoint if server provides it.
+
+        Returns:
+            tuple of entries metadata URLs and image URLs (None for entries
+            which should be resolved one by one)
+        """
+        entries, urls = self._parse_playlist(response)
+        pending = [i for i, url in enumerate(urls) if url is None]
+        resolve_url = response.get('resolve')
+
+        if pending and resolve_url:
+            body = json.dumps({'playlist': [entries[i] for i in pending]})
+            r = self._request(
+                http, resolve_url, method='POST', body=body.encode('utf8'),
+                headers={'Content-Type': 'application/json'})
+            if r is not None and r.status == 200:
+                self._apply_resolved(urls, pending, r.data)
+
+        return entries, urls
+
+    def _download_image(self, http, index, url, images_folder, since=None,
+                        image_url=None):
+        """Resolves playlist entry into image URL (unless it is already
+        resolved) and downloads it.
+
+        Returns local path of downloaded image or None if all attempts failed.
+        """
+        if image_url is None:
+            if url is None:
+                return None
             r = self._get_request(http, url)
             decoded = r.data.decode('utf8')
             image_url = json.loads(decoded)['url']
 
-            # actual image retrieving
-            for _ in self._create_attempts_gen():
-                r = self._get_request(http, image_url, preload=False)
+        if self._cache is not None:
+            return self._download_cached(http, image_url, since)
 
-                if not r:
-                    continue
+        # playlist index prefix keeps names unique when the same image
+        # is downloaded concurrently by several workers
+        image_name = '%03d_%s' % (index, image_url.split('/')[-1])
+        local_path = os.path.join(images_folder, image_name)
+        part_path = local_path + '.part'
 
-                image_name = image_url.split('/')[-1]
-                local_path = os.path.join(images_folder, image_name)
+        r = self._stream_to_file(http, image_url, part_path)
+        if r is None:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            return None
 
-                with open(local_path, 'wb') as img:
-                    while True:
-                        data = r.read(chunk_size)
-                        if not data:
-                            break
-                        img.write(data)
+        os.replace(part_path, local_path)
+        return local_path
 
-                downloaded_images.append(local_path)
-                r.release_conn()
-                break
+    def receive_images(self, timeout=None, on_image=None):
+        """Downloads images via provided API.
+
+        Playlist entries are resolved and downloaded concurrently using up to
+        `workers` threads. Returned paths follow the playlist order.
+
+        Arguments:
+            timeout(float): timeout of single request (retry policy request
+                timeout is used if not specified)
+            on_image(callable): function called from download thread with
+                playlist index and local path of each downloaded image
+
+        Raises:
+            urllib3.exceptions.HTTPError: no images retrieved before retry
+                policy gave up
+        """
+        self._timeout = timeout or self._retry.request_timeout
+        self._deadline = self._retry.deadline()
+
+        # retries are done by receiver itself according to its policy
+        http = urllib3.PoolManager(
+            timeout=self._timeout, maxsize=self._workers,
+            retries=urllib3.Retry(connect=0, read=0, other=0, redirect=5))
+        started = time.time()
+
+        if self._cache is None:
+            timestamp = datetime.today().strftime("%Y-%m%d-%H%M-%S")
+            images_folder = os.path.join(self._downloads, timestamp)
+            os.makedirs(images_folder, exist_ok=True)
+        else:
+            images_folder = self._cache.path
+
+        self.stats = {'bytes': 0, 'retries': 0}
+        fetched = time.monotonic()
+        r = self._get_request(http, self._api)
+        decoded = r.data.decode('utf8')
+        entries, urls = self._resolve_playlist(http, json.loads(decoded))
+        self.stats['playlist_time'] = time.monotonic() - fetched
+
+        def download(index):
+            path = self._download_image(
+                http, index, entries[index], images_folder, started,
+                urls[index])
+            if on_image is not None and path is not None:
+                on_image(index, path)
+            return path
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            results = executor.map(download, range(len(entries)))
+            downloaded_images = [path for path in results if path is not None]
+
+        self.stats['images'] = len(downloaded_images)
 
         if not downloaded_images:
-            import shutil
-            shutil.rmtree(images_folder, ignore_errors=True)
+            if self._cache is None:
+                import shutil
+                shutil.rmtree(images_folder, ignore_errors=True)
             raise HTTPError("cannot retrieve images from url: %s" % self._api)
 
+        if self._cache is not None:
+            self._cache.evict(keep=downloaded_images)
+            self._cache.save()
+
+        self._save_last_playlist(downloaded_images)
         return downloaded_images
@@ -0,0 +1,163 @@
+"""
+Retry policy and circuit breaker protecting images API from request storms.
+"""
+import time
+import random
+import asyncio
+import threading
+
+from urllib3.exceptions import HTTPError
+
+from ..timing import sleep_for
+
+
+# client errors which are worth retrying, all other 4xx responses are permanent
+RETRYABLE_STATUSES = frozenset([408, 429])
+
+
+class CircuitOpenError(HTTPError):
+    """Raised when requests are not allowed by circuit breaker."""
+
+
+class RetryPolicy:
+    """Bounded retrying with exponential backoff.
+
+    Delay before n-th retry is `base_delay * 2**(n - 1)` seconds (but not more
+    than `max_delay`) reduced by random fraction up to `jitter`, so kiosks do
+    not retry in lockstep. Retrying is stopped after `max_attempts` attempts
+    (None means no limit) or when the next attempt would start after deadline.
+
+    Arguments:
+        max_attempts(int): maximal number of attempts
+        base_delay(float): delay in seconds before the first retry
+        max_delay(float): upper bound of delay in seconds
+        jitter(float): maximal fraction of delay randomly subtracted from it
+        request_timeout(float): timeout of single request in seconds
+        total_timeout(float): time in seconds given to all attempts of
+            the whole operation (None means no limit)
+    """
+
+    def __init__(self, max_attempts: int=None, base_delay: float=0.5,
+                 max_delay: float=30.0, jitter: float=0.5,
+                 request_timeout: float=20.0, total_timeout: float=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.request_timeout = request_timeout
+        self.total_timeout = total_timeout
+
+    def deadline(self):
+        """Returns monotonic deadline of operation starting now or None."""
+        if self.total_timeout is None:
+            return None
+        return time.monotonic() + self.total_timeout
+
+    def delay(self, retry: int):
+        """Returns delay in seconds before specified retry (starting from 1).
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (retry - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def timeout(self, deadline: float=None, request_timeout: float=None):
+        """Returns timeout of single request not exceeding deadline."""
+        request_timeout = request_timeout or self.request_timeout
+        if deadline is None:
+            return request_timeout
+        return max(0.0, min(request_timeout, deadline - time.monotonic()))
+
+    def next_delay(self, attempt: int, deadline: float=None):
+        """Returns delay before attempt (starting from 0) or None if it
+        should not be made.
+        """
+        if self.max_attempts is not None and attempt >= self.max_attempts:
+            return None
+        delay = self.delay(attempt) if attempt else 0
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def attempts(self, deadline: float=None):
+        """Yields attempt numbers sleeping between them.
+
+        Arguments:
+            deadline(float): monotonic time point after which no attempts are
+                started
+        """
+        attempt = 0
+        while True:
+            delay = self.next_delay(attempt, deadline)
+            if delay is None:
+                return
+            if delay:
+                sleep_for(delay)
+            yield attempt
+            attempt += 1
+
+    async def async_attempts(self, deadline: float=None):
+        """The same as `attempts` but waits without blocking event loop."""
+        attempt = 0
+        while True:
+            delay = self.next_delay(attempt, deadline)
+            if delay is None:
+                return
+            if delay:
+                await asyncio.sleep(delay)
+            yield attempt
+            attempt += 1
+
+
+class CircuitBreaker:
+    """Stops requests to server which keeps failing.
+
+    After `failure_threshold` consecutive failures circuit is opened and
+    requests are rejected without touching network. After `reset_timeout`
+    seconds a single trial request is allowed: its success closes circuit,
+    failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, failure_threshold: int=5, reset_timeout: float=60.0):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self._reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """Checks if request can be sent."""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self._failure_threshold:
+                self._opened_at = time.monotonic()
+                self._trial = False
@@ -0,0 +1,98 @@
+"""
+Receiver of slide shows rendered by central render service.
+"""
+import os
+import json
+import urllib3
+from urllib.parse import urljoin
+from urllib3.exceptions import HTTPError
+
+from .images import RemoteImagesReceiver
+
+
+class RemoteVideoReceiver(RemoteImagesReceiver):
+    """Downloads slide show video already rendered by render service.
+
+    Service describes its current slide show by JSON object with `version`
+    (unique name of rendered video), `url` (absolute or relative to API URL)
+    and `duration` (seconds) keys. Each version is downloaded once and kept
+    in storing folder together with `keep` - 1 previous versions.
+
+    Requests are retried, resumed and guarded by circuit breaker the same way
+    as requests of images receiver.
+    """
+
+    VIDEO_EXTENSION = '.mp4'
+
+    def __init__(self, api, storing_folder, buffer_size=2**16, retry=None,
+                 breaker=None, keep=2):
+        super().__init__(api, storing_folder, buffer_size=buffer_size,
+                         retry=retry, breaker=breaker)
+        self._keep = max(1, keep)
+
+    def _evict(self, keep: str):
+        """Removes old versions of slide show except of the `keep` one."""
+        videos = sorted(
+            (entry for entry in os.scandir(self._downloads)
+             if entry.name.endswith(self.VIDEO_EXTENSION) and
+             entry.path != keep),
+            key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in videos[self._keep - 1:]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def receive_video(self, timeout=None):
+        """Downloads current slide show of render service unless it has been
+        already downloaded.
+
+        Arguments:
+            timeout(float): timeout of single request (retry policy request
+                timeout is used if not specified)
+
+        Returns:
+            tuple of local path of slide show and its duration in seconds
+
+        Raises:
+            urllib3.exceptions.HTTPError: slide show is not retrieved before
+                retry policy gave up
+        """
+        self._timeout = timeout or self._retry.request_timeout
+        self._deadline = self._retry.deadline()
+
+        # retries are done by receiver itself according to its policy
+        http = urllib3.PoolManager(
+            timeout=self._timeout, maxsize=1,
+            retries=urllib3.Retry(connect=0, read=0, other=0, redirect=5))
+
+        self.stats = {'bytes': 0, 'retries': 0}
+        r = self._get_request(http, self._api)
+        if r.status != 200:
+            raise HTTPError("cannot retrieve slide show from url: %s (%d)"
+                            % (self._api, r.status))
+        try:
+            show = json.loads(r.data.decode('utf8'))
+            version = os.path.basename(str(show['version']))
+            url = urljoin(self._api, show['url'])
+            duration = float(show['duration'])
+        except (ValueError, KeyError, TypeError) as e:
+            raise HTTPError("malformed slide show description: %s" % e)
+        if not version:
+            raise HTTPError("malformed slide show description: no version")
+
+        os.makedirs(self._downloads, exist_ok=True)
+        local_path = os.path.join(
+            self._downloads, version + self.VIDEO_EXTENSION)
+
+        if not os.path.exists(local_path):
+            part_path = local_path + '.part'
+            r = self._stream_to_file(http, url, part_path)
+            if r is None or r.status == 304:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                raise HTTPError("cannot retrieve slide show video: %s" % url)
+            os.replace(part_path, local_path)
+
+        self._evict(keep=local_path)
+        return local_path, duration
@@ -13,7 +13,18 @@ HOME = os.environ['HOME']
 
 
 class DefaultParams(Enum):
-    """Simple Media Player Software parameters."""
+    """Simple Media Player Software parameters.
+
+    Parameter default value is available via `default` attribute. Members
+    values are their ordinal numbers, otherwise parameters with equal
+    defaults (e.g. 0 and False) would become aliases of each other.
+    """
+
+    def __new__(cls, default):
+        member = object.__new__(cls)
+        member._value_ = len(cls.__members__)
+        member.default = default
+        return member
 
     # paths to directories with content for slide-show
     DOWNLOADED_IMAGES_PATH = \
@@ -25,12 +36,128 @@ class DefaultParams(Enum):
     BACKGROUND_MUSIC_PATH = \
         os.path.join(HOME, "Music/media_player_music")
 
+    # path to directory with persistent caches
+    CACHE_PATH = os.path.join(HOME, ".cache/simple_media_player")
+
     # URL for images retrieving
     IMAGES_API = "http://localhost:8000/playlist"
 
-    # offset in minutes before time point specified in schedule file
+    # URL of slide show endpoint of central render service kiosk downloads
+    # already rendered slide show from, e.g. http://host:8001/slide_show
+    # (empty value disables service); slide show is rendered locally while
+    # service is unavailable
+    RENDER_SERVICE_API = ''
+
+    # offset in minutes before time point specified in schedule file (used
+    # until cycles history is collected if adaptive offset is enabled)
     LAUNCH_TIME_OFFSET = 7
 
+    # predict offset of each time slot from durations of previous cycles
+    ADAPTIVE_LAUNCH_OFFSET = True
+
+    # seconds added to predicted duration of cycle
+    LAUNCH_TIME_MARGIN = 60
+
+    # keep idle player controlled via IPC to start playback without delay
+    WARM_PLAYER = False
+
+    # seconds before playback start when slide show is loaded by warm player
+    WARM_PLAYER_PRELOAD = 1.0
+
+    # number of upcoming time slots which slide shows are prepared for in
+    # background right after playback (0 disables pre-rendering)
+    PRERENDER_SLOTS = 0
+
     IMAGE_DISPLAY_DURATION = 15
 
     SLIDE_SHOW_RESOLUTION = '1920x1080'
+
+    # number of encoded slide shows kept for reuse (0 disables reusing)
+    RENDER_CACHE_SIZE = 10
+
+    # 'single' encodes whole slide show at once, 'segments' encodes and
+    # caches each image separately to re-encode changed images only,
+    # 'parallel' encodes segments concurrently
+    RENDER_MODE = 'single'
+
+    # 'dvd-slideshow' encodes slide shows by dvd-slideshow utility, 'ffmpeg'
+    # encodes them in one pass by single ffmpeg process (requires ffmpeg 4.3
+    # or newer, subtitles are not supported)
+    RENDER_BACKEND = 'dvd-slideshow'
+
+    # comma-separated encoding profiles in name:fps:preset:bitrate format
+    # (empty bitrate lets encoder choose it) ordered from the best quality to
+    # the fastest one; profiles are applied by ffmpeg render backend only
+    ENCODING_PROFILES = 'high:25:medium:, normal:25:veryfast:, ' \
+                        'fast:15:ultrafast:1M'
+
+    # name of encoding profile or 'auto' to select the best profile which
+    # is expected to be encoded before slide show should start
+    ENCODING_PROFILE = 'normal'
+
+    # number of concurrent encoders in parallel mode (0 - number of CPUs)
+    ENCODING_WORKERS = 0
+
+    # start encoding and music probing while images are still downloading
+    PIPELINED_CYCLE = False
+
+    # number of encoded segments kept for reuse
+    SEGMENT_CACHE_SIZE = 100
+
+    # number of threads used to resolve and download playlist images
+    DOWNLOAD_WORKERS = 4
+
+    # 'sync' downloads images by threads using urllib3, 'async' downloads
+    # them by coroutines of a single thread (requires aiohttp package)
+    IMAGES_RECEIVER = 'sync'
+
+    # time in seconds given to images retrieving; when it expires (or server
+    # is known to be down) images of the last received playlist are shown
+    DOWNLOAD_DEADLINE = 120
+
+    # expected time in seconds of slide show encoding, used (until encoding
+    # time is measured) to shorten download deadline when slot is close
+    EXPECTED_ENCODING_TIME = 60
+
+    # retrying of failed requests: number of attempts (0 - limited by
+    # deadline only) and bounds of exponential backoff delay in seconds
+    RETRY_MAX_ATTEMPTS = 0
+
+    RETRY_BASE_DELAY = 0.5
+
+    RETRY_MAX_DELAY = 30
+
+    # number of consecutive failed requests after which server is considered
+    # unavailable and time in seconds before it is requested again
+    CIRCUIT_FAILURE_THRESHOLD = 5
+
+    CIRCUIT_RESET_TIMEOUT = 60
+
+    # size of buffer in kilobytes used to stream images onto disk
+    DOWNLOAD_BUFFER_SIZE = 64
+
+    # limit in megabytes of total size of concurrently downloaded images
+    DOWNLOAD_MAX_IN_FLIGHT = 32
+
+    # downloaded images cache limits: size in megabytes (0 disables cache)
+    # and time in hours after which unused images are removed
+    IMAGE_CACHE_SIZE = 512
+
+    IMAGE_CACHE_MAX_AGE = 168
+
+    # orient and resize images to slide show resolution before encoding
+    PREPROCESS_IMAGES = True
+
+    # number of concurrent image converters (0 - number of CPUs)
+    PREPROCESS_WORKERS = 0
+
+    # number of normalized images kept for reuse
+    PREPROCESSED_CACHE_SIZE = 500
+
+    # port of local HTTP endpoint exposing metrics in Prometheus text format
+    # at /metrics path (0 disables endpoint)
+    METRICS_PORT = 0
+
+    # path to JSON-lines file trace events of cycles are appended to (empty
+    # value disables events)
+    METRICS_EVENTS_PATH = ''
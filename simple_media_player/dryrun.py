@@ -0,0 +1,301 @@
+"""
+Dry run of scheduler simulating cycles of time table on simulated clock.
+
+Scheduling, launch offsets prediction and playback timing code of media
+player is run as is, while images downloading, encoding, probing and
+playback are replaced by stubs which only advance simulated clock. A whole
+day of schedule is simulated in seconds without encoder and player:
+
+    python3 -m simple_media_player.dryrun --schedule schedule.cfg
+"""
+import io
+import os
+import json
+import random
+import shutil
+import logging
+import tempfile
+import subprocess
+import configparser
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from .__main__ import SimpleMediaPlayer, PreparedShow
+from .timing import SimulatedClock, StageTimer
+from .constants import SCHEDULE_PATH, PLAYER_CONFIG_PATH
+
+
+# simulated costs of cycle stages in seconds: downloading, encoding of
+# single image, probing and player start; each cost is randomly changed by
+# up to `jitter` fraction of it
+CycleCosts = namedtuple('CycleCosts', [
+    'images', 'download', 'encode_per_image', 'probe', 'player_start',
+    'jitter'])
+
+
+DEFAULT_COSTS = CycleCosts(20, 30.0, 3.0, 1.0, 0.5, 0.2)
+
+
+# outcome of simulated cycle: planned and actual launch time, drifts of
+# playback start and end, seconds of slide show which were not played back,
+# whether cycle was launched late because the previous one was still
+# running and whether playback missed its time
+SlotReport = namedtuple('SlotReport', [
+    'slot', 'planned_launch', 'launched', 'start_drift', 'end_drift',
+    'cut', 'overlap', 'missed'])
+
+
+# drifts up to this number of seconds are not considered as missed deadline
+TOLERANCE = 1.0
+
+
+class SimulatedProcess:
+    """Process-like object running for specified time on simulated clock."""
+
+    def __init__(self, clock, duration: float):
+        self.returncode = None
+        self.stdout = io.BytesIO()
+        self._clock = clock
+        self._end = clock.monotonic() + duration
+
+    def poll(self):
+        if self.returncode is None and self._clock.monotonic() >= self._end:
+            self.returncode = 0
+        return self.returncode
+
+    def wait(self, timeout: float=None):
+        if self.returncode is not None:
+            return self.returncode
+
+        left = self._end - self._clock.monotonic()
+        if timeout is not None and timeout < left:
+            self._clock.sleep(timeout)
+            raise subprocess.TimeoutExpired('simulated', timeout)
+
+        self._clock.sleep(left)
+        return self.poll()
+
+    def terminate(self):
+        if self.returncode is None:
+            self.returncode = -15
+
+    kill = terminate
+
+
+class SimulatedPlayer:
+    """Media player which playback lasts until it is stopped."""
+
+    player_bin = 'simulated-player'
+
+    def __init__(self, clock, startup: float):
+        self.started_at = None
+        self._clock = clock
+        self._startup = startup
+
+    def playback(self, slide_show_path: str):
+        self._clock.sleep(self._startup)
+        self.started_at = self._clock.now()
+        return SimulatedProcess(self._clock, float('inf'))
+
+
+class DryRunPlayer(SimpleMediaPlayer):
+    """Media player running time table on simulated clock with stubbed
+    preparation and playback.
+
+    Warm player and pre-rendering are not simulated.
+
+    Arguments:
+        config(configparser.SectionProxy): media player configuration
+        costs(CycleCosts): simulated costs of cycle stages
+        clock(SimulatedClock): clock advanced by stubs
+        seed: random generator seed of costs jitter
+    """
+
+    def __init__(self, config, costs: CycleCosts, clock, seed=None):
+        super().__init__()
+        self.cfg = config
+        self.clock = clock
+        self.costs = costs
+        self.reports = []
+        self._rng = random.Random(seed)
+
+    def read_config(self, path):
+        """Configuration is given on creation."""
+
+    def setup_metrics(self):
+        """Metrics are collected in memory only."""
+
+    def warm_up_player(self):
+        """Warm player is not simulated."""
+
+    def prerender_upcoming(self, now: datetime=None):
+        """Pre-rendering is not simulated."""
+
+    def create_player(self):
+        return SimulatedPlayer(self.clock, self.cost(self.costs.player_start))
+
+    def cost(self, seconds: float):
+        """Returns simulated cost changed by random jitter."""
+        jitter = self.costs.jitter
+        return seconds * (1 + jitter * (2 * self._rng.random() - 1))
+
+    def prepare(self, end_playback: datetime=None):
+        self.timings = StageTimer()
+        costs = self.costs
+        for stage, seconds in (
+                ('download', costs.download),
+                ('encode', costs.encode_per_image * costs.images),
+                ('probe', costs.probe)):
+            seconds = self.cost(seconds)
+            self.clock.sleep(seconds)
+            self.timings.add(stage, seconds)
+
+        duration = costs.images * int(self.cfg['image_display_duration'])
+        return PreparedShow(
+            'simulated.mp4', duration, float(duration), self.timings)
+
+    def run(self, end_playback=None, no_wait: bool=False):
+        planned = end_playback - self.launch_offset(
+            end_playback.strftime('%H:%M'))
+        launched = self.clock.now()
+
+        self.player = None
+        super().run(end_playback, no_wait)
+
+        started_at = getattr(self.player, 'started_at', None)
+        if started_at is None:
+            cut = self.actual_slide_show_duration
+        else:
+            played = (end_playback - started_at).total_seconds()
+            cut = max(0.0, self.actual_slide_show_duration - played)
+
+        start_drift, end_drift = self.start_drift, self.end_drift
+        missed = cut > TOLERANCE or \
+            start_drift is None or start_drift > TOLERANCE or \
+            end_drift is None or abs(end_drift) > TOLERANCE
+        self.reports.append(SlotReport(
+            end_playback, planned, launched, start_drift, end_drift, cut,
+            (launched - planned).total_seconds() > TOLERANCE, missed))
+
+
+def simulate(time_table: list, params: dict=None,
+             costs: CycleCosts=DEFAULT_COSTS, start: datetime=None,
+             days: int=1, seed=None):
+    """Simulates cycles of time table.
+
+    Arguments:
+        time_table(list): time table entries in HH:MM format
+        params(dict): media player configuration parameters
+        costs(CycleCosts): simulated costs of cycle stages
+        start(datetime): simulation start (today's midnight by default)
+        days(int): number of simulated days
+        seed: random generator seed of costs jitter
+
+    Returns:
+        tuple of SlotReport list and infeasible time table entries
+    """
+    if start is None:
+        start = datetime.combine(datetime.now().date(), datetime.min.time())
+
+    folder = tempfile.mkdtemp()
+    try:
+        config = configparser.ConfigParser()
+        config.read_dict({'simple_media_player': dict(params or {})})
+        section = config['simple_media_player']
+        # cycles history of simulation never mixes with real one
+        section['cache_path'] = folder
+        section.setdefault('image_display_duration', '15')
+
+        player = DryRunPlayer(section, costs, SimulatedClock(start), seed)
+        player.time_table = time_table
+        infeasible = player.check_schedule(start)
+        player.serve(until=start + timedelta(days=days))
+        return player.reports, infeasible
+
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def format_report(reports: list, infeasible: list=()):
+    """Formats simulated cycles as table followed by summary."""
+    row = '%5s %8s %8s %10s %10s %8s %7s %6s'
+    lines = [row % ('slot', 'planned', 'launched', 'start, s', 'end, s',
+                    'cut, s', 'overlap', 'missed')]
+
+    for r in reports:
+        lines.append(row % (
+            r.slot.strftime('%H:%M'),
+            r.planned_launch.strftime('%H:%M:%S'),
+            r.launched.strftime('%H:%M:%S'),
+            '-' if r.start_drift is None else '%.3f' % r.start_drift,
+            '-' if r.end_drift is None else '%.3f' % r.end_drift,
+            '%.1f' % r.cut, 'yes' if r.overlap else '',
+            'yes' if r.missed else ''))
+
+    drifts = [abs(r.start_drift) for r in reports
+              if r.start_drift is not None]
+    lines.append('')
+    lines.append('cycles: %d, overlaps: %d, missed: %d, '
+                 'max start drift: %.3f s' % (
+                     len(reports), sum(r.overlap for r in reports),
+                     sum(r.missed for r in reports),
+                     max(drifts) if drifts else 0.0))
+    if infeasible:
+        lines.append('infeasible slots: %s' % ', '.join(infeasible))
+
+    return '\n'.join(lines)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--schedule', default=SCHEDULE_PATH)
+    parser.add_argument('--config', default=PLAYER_CONFIG_PATH,
+                        help='media player parameters (defaults are used '
+                             'if file does not exist)')
+    parser.add_argument('--images', type=int, default=DEFAULT_COSTS.images)
+    parser.add_argument('--download', type=float,
+                        default=DEFAULT_COSTS.download)
+    parser.add_argument('--encode-per-image', type=float,
+                        default=DEFAULT_COSTS.encode_per_image)
+    parser.add_argument('--probe', type=float, default=DEFAULT_COSTS.probe)
+    parser.add_argument('--player-start', type=float,
+                        default=DEFAULT_COSTS.player_start)
+    parser.add_argument('--jitter', type=float, default=DEFAULT_COSTS.jitter)
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('-o', '--output',
+                        help='path to JSON file with simulated cycles')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='show media player log')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger(__package__).setLevel(logging.ERROR)
+
+    with open(args.schedule) as fp:
+        time_table = fp.read().split()
+
+    params = {}
+    if os.path.exists(args.config):
+        config = configparser.ConfigParser()
+        config.read(args.config)
+        params = dict(config['simple_media_player'])
+
+    costs = CycleCosts(args.images, args.download, args.encode_per_image,
+                       args.probe, args.player_start, args.jitter)
+    reports, infeasible = simulate(
+        time_table, params, costs, days=args.days, seed=args.seed)
+    print(format_report(reports, infeasible))
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump([dict(r._asdict(),
+                            slot=r.slot.isoformat(),
+                            planned_launch=r.planned_launch.isoformat(),
+                            launched=r.launched.isoformat())
+                       for r in reports], fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
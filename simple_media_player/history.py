@@ -0,0 +1,98 @@
+"""
+Persistent history of download-create-playback cycles used to predict how
+long preparation of upcoming slide shows takes.
+"""
+import json
+import time
+import threading
+
+from .storage import atomic_write_json
+
+
+class CycleHistory:
+    """Keeps stage durations of the last `max_entries` played cycles.
+
+    Durations of stages processing each image (normalization, building
+    and encoding) are normalized by number of images, so predictions scale
+    with playlist length. Predictions are deliberately pessimistic: the
+    slowest of the last `window` cycles is used, preferring cycles of the
+    same time slot since playlists may depend on time of day.
+
+    Arguments:
+        path(str): path to JSON file with history
+        max_entries(int): number of kept cycles
+        window(int): number of recent cycles used for predictions
+    """
+
+    # stages which duration is proportional to number of images
+    PER_IMAGE_STAGES = ('preprocess', 'build', 'encode')
+
+    # stages of preparation which do not depend on number of images
+    FIXED_STAGES = ('download', 'probe')
+
+    def __init__(self, path: str, max_entries: int=100, window: int=10):
+        self._path = path
+        self._max_entries = max_entries
+        self._window = window
+        self._lock = threading.Lock()
+        try:
+            with open(path) as fp:
+                self._entries = json.load(fp)
+        except (OSError, ValueError):
+            self._entries = []
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def record(self, slot: str, images: int, video_duration: float,
+               stages: dict):
+        """Adds finished cycle into history and saves it onto disk.
+
+        Arguments:
+            slot(str): time table entry in HH:MM format (None if cycle was
+                not scheduled)
+            images(int): number of slide show images
+            video_duration(float): slide show duration in seconds
+            stages(dict): mapping of stage names onto seconds spent
+        """
+        fixed = sum(stages.get(name, 0.0) for name in self.FIXED_STAGES)
+        per_image = sum(stages.get(name, 0.0)
+                        for name in self.PER_IMAGE_STAGES)
+        entry = {
+            'time': time.time(),
+            'slot': slot,
+            'images': images,
+            'video_duration': video_duration,
+            'fixed': fixed,
+            'per_image': per_image / max(1, images)
+        }
+
+        with self._lock:
+            self._entries.append(entry)
+            del self._entries[:-self._max_entries]
+            atomic_write_json(self._path, self._entries)
+
+    def _recent(self, slot: str=None):
+        with self._lock:
+            entries = [e for e in self._entries if e['slot'] == slot]
+            if not entries:
+                entries = self._entries
+            return entries[-self._window:]
+
+    def predict(self, slot: str=None):
+        """Predicts how long the cycle of time slot takes.
+
+        Returns:
+            tuple of preparation time and slide show duration in seconds or
+            None if there is no history yet
+        """
+        entries = self._recent(slot)
+        if not entries:
+            return None
+
+        images = max(e['images'] for e in entries)
+        preparation = max(e['fixed'] + e['per_image'] * images
+                          for e in entries)
+        duration = max(e['video_duration'] for e in entries)
+        return preparation, duration
@@ -0,0 +1,162 @@
+"""
+Structured metrics and tracing of download-create-playback cycles.
+
+Metrics are kept in memory and exposed in Prometheus text format (e.g. via
+local HTTP endpoint started by `serve_metrics`), trace events are appended
+to JSON-lines file, one JSON object per line.
+"""
+import json
+import time
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler
+
+# servers of metrics, render service and mockups handle each request by
+# separate thread (ThreadingHTTPServer is available since Python 3.7)
+try:
+    from http.server import ThreadingHTTPServer
+except ImportError:
+    from socketserver import ThreadingMixIn
+    from http.server import HTTPServer
+
+    class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+
+COUNTER, GAUGE, SUMMARY = 'counter', 'gauge', 'summary'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\')
+                     .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels)
+
+
+class Metrics:
+    """Thread-safe registry of counters, gauges and summaries.
+
+    Summaries keep count and sum of observed values only (without quantiles),
+    which is enough to compute averages of fleet-wide aggregated values.
+
+    Arguments:
+        events_path(str): path to JSON-lines file trace events are appended
+            to (None disables events writing)
+    """
+
+    def __init__(self, events_path: str=None):
+        self.events_path = events_path
+        self._types = OrderedDict()
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _update(self, kind: str, name: str, labels: dict, update):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            if self._types.setdefault(name, kind) != kind:
+                raise ValueError('metric %s is %s, not %s'
+                                 % (name, self._types[name], kind))
+            series = self._values.setdefault(name, OrderedDict())
+            series[key] = update(series.get(key))
+
+    def inc(self, name: str, value: float=1.0, **labels):
+        """Increases counter."""
+        self._update(COUNTER, name, labels, lambda v: (v or 0) + value)
+
+    def set(self, name: str, value: float, **labels):
+        """Sets gauge value."""
+        self._update(GAUGE, name, labels, lambda v: value)
+
+    def observe(self, name: str, value: float, **labels):
+        """Adds observed value to summary."""
+        self._update(SUMMARY, name, labels,
+                     lambda v: (v[0] + 1, v[1] + value) if v else (1, value))
+
+    def get(self, name: str, **labels):
+        """Returns current value of metric (count and sum for summaries) or
+        None if it has not been recorded yet.
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            return self._values.get(name, {}).get(key)
+
+    def event(self, name: str, **fields):
+        """Appends trace event to events file."""
+        if not self.events_path:
+            return
+        record = OrderedDict(
+            [('time', datetime.now().isoformat()), ('event', name)])
+        record.update(fields)
+        line = json.dumps(record, default=str) + '\n'
+        with self._lock:
+            with open(self.events_path, 'a') as fp:
+                fp.write(line)
+
+    @contextmanager
+    def span(self, name: str, **fields):
+        """Context manager writing trace event with duration of its body.
+
+        Yields dictionary of event fields, so body can add its results to the
+        event. Event of failed body has `error` field.
+        """
+        started = time.monotonic()
+        try:
+            yield fields
+        except BaseException as e:
+            fields['error'] = repr(e)
+            raise
+        finally:
+            self.event(name, duration=time.monotonic() - started, **fields)
+
+    def render(self):
+        """Returns metrics in Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, kind in self._types.items():
+                lines.append('# TYPE %s %s' % (name, kind))
+                for key, value in self._values[name].items():
+                    labels = _format_labels(key)
+                    if kind == SUMMARY:
+                        lines.append('%s_count%s %d' % (name, labels, value[0]))
+                        lines.append('%s_sum%s %r' % (name, labels,
+                                                      float(value[1])))
+                    else:
+                        lines.append('%s%s %r' % (name, labels, float(value)))
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serves metrics of server registry at /metrics path."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        content = self.server.metrics.render().encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def serve_metrics(metrics: Metrics, port: int, host: str='localhost'):
+    """Starts HTTP server exposing metrics in background thread.
+
+    Returns:
+        started server (its `shutdown` method stops serving)
+    """
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.metrics = metrics
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
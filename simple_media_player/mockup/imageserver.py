@@ -1,8 +1,11 @@
 import os
-import glob
 import json
+import time
 import random
-from http.server import SimpleHTTPRequestHandler, HTTPServer
+import threading
+from http.server import SimpleHTTPRequestHandler
+
+from ..metrics import ThreadingHTTPServer
 
 
 PORT = 8000
@@ -10,6 +13,34 @@ MIN_IMAGES = 3
 MAX_IMAGES = 15
 
 
+# sample images index shared by handlers: folder -> (folder mtime, images)
+_samples = {}
+_samples_lock = threading.Lock()
+
+
+def sample_images(folder: str):
+    """Returns index of PNG images in folder as a dictionary mapping image
+    name onto tuple of path, size, modification time and entity tag. Index is
+    rebuilt only when folder content changes.
+    """
+    mtime = os.stat(folder).st_mtime
+    with _samples_lock:
+        cached = _samples.get(folder)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        images = {}
+        for entry in os.scandir(folder):
+            if not entry.name.endswith('.png'):
+                continue
+            st = entry.stat()
+            etag = '"%x-%x"' % (int(st.st_mtime), st.st_size)
+            images[entry.name] = (entry.path, st.st_size, st.st_mtime, etag)
+
+        _samples[folder] = (mtime, images)
+        return images
+
+
 class ImagesRequestHandler(SimpleHTTPRequestHandler):
     """Mockup requests handler to be used for testing images downloading.
 
@@ -28,55 +59,214 @@ class ImagesRequestHandler(SimpleHTTPRequestHandler):
         3) retrieve specified image from local folder:
 
             http://localhost:PORT/img/image_name.png
+
+
+        4) resolve several playlist entries by single POST request with
+           {"playlist": [...]} body (unless BATCH_RESOLVE is disabled):
+
+            http://localhost:PORT/resolve
+
+
+        5) retrieve dummy playlist with already resolved image URLs:
+
+            http://localhost:PORT/playlist?resolved
+
+    Connections are kept alive (HTTP/1.1). Images support conditional (ETag,
+    Last-Modified) and range requests and are sent using sendfile. Network
+    conditions can be emulated with LATENCY (seconds added to each response),
+    BANDWIDTH (bytes per second of image transfer, 0 is unlimited) and
+    ERROR_RATE (probability of 503 response) attributes. Playlists have
+    random number of entries unless PLAYLIST_SIZE is specified.
     """
 
     SAMPLE_IMAGES_FOLDER = os.path.join(os.environ['HOME'], 'Pictures/Samples')
 
-    def do_GET(self):
-        response = None
-        content_type = None
+    # old servers resolve playlist entries one by one only
+    BATCH_RESOLVE = True
 
-        if self.path.endswith('/playlist'):
-            address = 'http://localhost:%d/random_image' % PORT
-            frames = random.randint(MIN_IMAGES, MAX_IMAGES)
-            images = [address for _ in range(frames)]
-            response = json.dumps({'playlist': images})
-            content_type = 'application/json'
-            response = response.encode('utf-8')
+    LATENCY = 0.0
+    BANDWIDTH = 0
+    ERROR_RATE = 0.0
 
-        elif self.path.endswith('/random_image'):
-            images = [p for p in glob.glob1(self.SAMPLE_IMAGES_FOLDER, "*.png")]
-            img = images[random.randint(0, len(images) - 1)]
-            url = 'http://localhost:%d/img/%s' % (PORT, img)
-            response = json.dumps({'url': url})
-            content_type = 'application/json'
-            response = response.encode('utf-8')
+    PLAYLIST_SIZE = None
 
-        elif self.path.startswith('/img'):
-            image_name = self.path.split('/')[-1]
-            image_path = os.path.join(self.SAMPLE_IMAGES_FOLDER, image_name)
-            with open(image_path, 'rb') as img:
-                response = img.read()
-            content_type = 'application/image'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def base_url(self):
+        return 'http://localhost:%d' % self.server.server_port
+
+    def random_image_url(self):
+        images = sorted(sample_images(self.SAMPLE_IMAGES_FOLDER))
+        img = images[random.randint(0, len(images) - 1)]
+        return '%s/img/%s' % (self.base_url, img)
+
+    def emulate_network(self):
+        """Delays response and randomly fails it according to network
+        conditions. Returns True if error response has been sent.
+        """
+        if self.LATENCY > 0:
+            time.sleep(self.LATENCY)
+
+        if self.ERROR_RATE > 0 and random.random() < self.ERROR_RATE:
+            self.send_empty(503)
+            return True
+
+        return False
 
-        if response is None:
-            response = ''
-            content_type = ''
+    def send_empty(self, code: int, headers: dict=None):
+        self.send_response(code)
+        self.send_header('Content-length', '0')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
 
+    def send_json(self, obj):
+        response = json.dumps(obj).encode('utf-8')
         self.send_response(200)
-        self.send_header('Content-type', content_type)
+        self.send_header('Content-type', 'application/json')
         self.send_header('Content-length', str(len(response)))
         self.end_headers()
         self.wfile.write(response)
+
+    def send_image(self, name: str):
+        images = sample_images(self.SAMPLE_IMAGES_FOLDER)
+        if name not in images:
+            self.send_empty(404)
+            return
+
+        path, size, mtime, etag = images[name]
+        last_modified = self.date_time_string(int(mtime))
+        headers = {'ETag': etag, 'Last-Modified': last_modified,
+                   'Accept-Ranges': 'bytes'}
+
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            if etag in [tag.strip() for tag in if_none_match.split(',')]:
+                self.send_empty(304, headers)
+                return
+        elif self.headers.get('If-Modified-Since') == last_modified:
+            self.send_empty(304, headers)
+            return
+
+        start, end = 0, size - 1
+        requested = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if requested and if_range not in (None, etag, last_modified):
+            requested = None
+
+        if requested:
+            try:
+                unit, _, spec = requested.partition('=')
+                first, _, last = spec.partition('-')
+                if unit != 'bytes' or ',' in spec:
+                    raise ValueError(requested)
+                if first:
+                    start = int(first)
+                    end = min(int(last), size - 1) if last else size - 1
+                else:
+                    start = max(0, size - int(last))
+                if start > end:
+                    raise ValueError(requested)
+            except ValueError:
+                self.send_empty(416, {'Content-Range': 'bytes */%d' % size})
+                return
+
+            self.send_response(206)
+            self.send_header('Content-Range',
+                             'bytes %d-%d/%d' % (start, end, size))
+        else:
+            self.send_response(200)
+
+        self.send_header('Content-type', 'image/png')
+        self.send_header('Content-length', str(end - start + 1))
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.end_headers()
         self.wfile.flush()
-        self.connection.shutdown(1)
+
+        with open(path, 'rb') as img:
+            self.send_file(img, start, end - start + 1)
+
+    def send_file(self, fp, offset: int, count: int):
+        """Sends part of file directly from page cache into socket limiting
+        transfer rate to BANDWIDTH bytes per second.
+        """
+        chunk = max(1, self.BANDWIDTH // 10) if self.BANDWIDTH else count
+        started = time.monotonic()
+        sent = 0
+        while sent < count:
+            if self.BANDWIDTH:
+                ahead = started + sent / self.BANDWIDTH - time.monotonic()
+                if ahead > 0:
+                    time.sleep(ahead)
+            n = os.sendfile(self.connection.fileno(), fp.fileno(),
+                            offset + sent, min(chunk, count - sent))
+            if n == 0:
+                break
+            sent += n
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-length', 0))
+        body = self.rfile.read(length)
+
+        if not self.BATCH_RESOLVE or self.path != '/resolve':
+            self.send_empty(404)
+            return
+
+        if self.emulate_network():
+            return
+
+        playlist = json.loads(body.decode('utf-8'))
+        urls = [self.random_image_url() if entry.endswith('/random_image')
+                else None for entry in playlist['playlist']]
+        self.send_json({'urls': urls})
+
+    def do_GET(self):
+        if self.emulate_network():
+            return
+
+        if self.path.split('?')[0].endswith('/playlist'):
+            address = self.base_url + '/random_image'
+            frames = self.PLAYLIST_SIZE or random.randint(
+                MIN_IMAGES, MAX_IMAGES)
+            if self.path.endswith('?resolved'):
+                images = [{'entry': address, 'url': self.random_image_url()}
+                          for _ in range(frames)]
+            else:
+                images = [address for _ in range(frames)]
+            playlist = {'playlist': images}
+            if self.BATCH_RESOLVE:
+                playlist['resolve'] = self.base_url + '/resolve'
+            self.send_json(playlist)
+
+        elif self.path.endswith('/random_image'):
+            self.send_json({'url': self.random_image_url()})
+
+        elif self.path.startswith('/img'):
+            self.send_image(self.path.split('/')[-1])
+
+        else:
+            self.send_empty(404)
 
 
-def run_server(host='', port=PORT):
+def run_server(host='', port=PORT, latency=0.0, bandwidth=0, error_rate=0.0):
+    handler = type('ImagesRequestHandler', (ImagesRequestHandler,), {
+        'LATENCY': latency, 'BANDWIDTH': bandwidth, 'ERROR_RATE': error_rate})
     address = (host, port)
-    images_server = HTTPServer(address, ImagesRequestHandler)
+    images_server = ThreadingHTTPServer(address, handler)
     images_server.serve_forever()
 
 
 if __name__ == '__main__':
-    run_server()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to each response')
+    parser.add_argument('--bandwidth', type=int, default=0,
+                        help='image transfer rate in bytes per second')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='probability of 503 response')
+    args = parser.parse_args()
+    run_server('', args.port, args.latency, args.bandwidth, args.error_rate)
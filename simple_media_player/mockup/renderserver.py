@@ -0,0 +1,54 @@
+import os
+
+from ..metrics import ThreadingHTTPServer
+from ..render_service import SlideShowRequestHandler
+
+
+PORT = 8001
+
+
+class VideoRequestHandler(SlideShowRequestHandler):
+    """Mockup render service to be used for testing of rendered slide shows
+    downloading.
+
+    Handler serves the most recently modified MP4 video of sample videos
+    folder as current slide show of DURATION seconds:
+
+        http://localhost:PORT/slide_show
+
+    Service is reported as unavailable (503) while folder has no videos.
+    """
+
+    VIDEOS_FOLDER = os.path.join(os.environ['HOME'], 'Videos/Samples')
+
+    DURATION = 60.0
+
+    def current_show(self):
+        try:
+            videos = [entry for entry in os.scandir(self.VIDEOS_FOLDER)
+                      if entry.name.endswith('.mp4')]
+        except OSError:
+            return None
+        if not videos:
+            return None
+        latest = max(videos, key=lambda entry: entry.stat().st_mtime)
+        return latest.path, self.DURATION
+
+
+def run_server(host='', port=PORT, folder=None, duration=60.0):
+    handler = type('VideoRequestHandler', (VideoRequestHandler,), {
+        'VIDEOS_FOLDER': folder or VideoRequestHandler.VIDEOS_FOLDER,
+        'DURATION': duration})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--folder', help='folder with sample videos')
+    parser.add_argument('--duration', type=float, default=60.0,
+                        help='reported slide show duration in seconds')
+    args = parser.parse_args()
+    run_server('', args.port, args.folder, args.duration)
@@ -0,0 +1,42 @@
+"""
+Stubs of external utilities (dvd-slideshow, ffmpeg, mpv, ...) used by tests
+and benchmarks instead of real binaries.
+"""
+import os
+import sys
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def stub_binaries(stubs: dict, **environ):
+    """Installs Python scripts as executables found first in PATH.
+
+    Environment is restored and stubs are removed on exit.
+
+    Arguments:
+        stubs(dict): mapping of binary names onto Python source of stubs
+        environ: environment variables passed to stubs
+
+    Returns:
+        context manager yielding path to folder with installed stubs
+    """
+    folder = tempfile.mkdtemp()
+    saved = dict(os.environ)
+    try:
+        for name, source in stubs.items():
+            path = os.path.join(folder, name)
+            with open(path, 'w') as fp:
+                fp.write('#!%s\n' % sys.executable)
+                fp.write(source)
+            os.chmod(path, 0o755)
+
+        os.environ['PATH'] = folder + os.pathsep + os.environ['PATH']
+        os.environ.update(environ)
+        yield folder
+
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+        shutil.rmtree(folder, ignore_errors=True)
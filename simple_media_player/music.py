@@ -0,0 +1,118 @@
+"""
+Background music library index and tracks selection.
+"""
+import os
+import json
+import random
+import threading
+
+from .storage import atomic_write_json
+from .wrapper import probe
+
+
+class MusicLibrary:
+    """Persisted index of background music folder.
+
+    Index keeps duration and format of each audio file. Folder is scanned
+    again only if its modification time has changed (i.e. files were added,
+    removed or renamed), and only new or modified files are probed.
+    """
+
+    EXTENSIONS = ('.mp3', '.mid', '.wav', '.ogg', '.aac')
+
+    def __init__(self, folder: str, index_path: str, probe_file=probe):
+        self._folder = folder
+        self._index_path = index_path
+        self._probe = probe_file
+        self._lock = threading.Lock()
+        try:
+            with open(index_path) as fp:
+                self._index = json.load(fp)
+        except (OSError, ValueError):
+            self._index = {}
+
+        if self._index.get('folder') != folder:
+            self._index = {'folder': folder, 'mtime': None, 'tracks': {}}
+
+    @property
+    def tracks(self):
+        """Returns a list of indexed tracks as dictionaries with path,
+        duration, format and mtime keys.
+        """
+        return [dict(track, path=os.path.join(self._folder, name))
+                for name, track in sorted(self._index['tracks'].items())]
+
+    def refresh(self):
+        """Updates index if music folder has changed since last refresh."""
+        with self._lock:
+            mtime = os.stat(self._folder).st_mtime
+            if mtime == self._index['mtime']:
+                return
+
+            tracks = {}
+            for entry in os.scandir(self._folder):
+                name = entry.name
+                if not name.lower().endswith(self.EXTENSIONS):
+                    continue
+
+                st = entry.stat()
+                track = self._index['tracks'].get(name)
+                if track is None or track['mtime'] != st.st_mtime:
+                    try:
+                        info = self._probe(entry.path)
+                    except Exception:
+                        continue
+                    track = {'duration': info.duration,
+                             'format': info.format,
+                             'mtime': st.st_mtime}
+                tracks[name] = track
+
+            self._index['tracks'] = tracks
+            self._index['mtime'] = mtime
+            self._save()
+
+    def _save(self):
+        """Atomically writes index onto disk."""
+        atomic_write_json(self._index_path, self._index)
+
+    def select(self, duration: float, rng: random.Random=None):
+        """Picks tracks which total duration best fits specified duration.
+
+        Selects random combination of tracks with the smallest total duration
+        not shorter than required one. If the whole library is shorter, all
+        tracks are repeated as many times as needed.
+
+        Arguments:
+            duration(float): required total duration in seconds
+            rng(random.Random): random generator used to shuffle tracks
+
+        Returns:
+            a list of tracks paths and their total duration
+        """
+        self.refresh()
+        rng = rng or random
+        tracks = [t for t in self.tracks if t['duration'] > 0]
+        if not tracks:
+            return [], 0
+        rng.shuffle(tracks)
+
+        # subset sum over whole seconds; sums reaching required duration
+        # are not extended further
+        target = max(1, int(round(duration)))
+        reachable = {0: []}
+        for track in tracks:
+            length = max(1, int(round(track['duration'])))
+            for total, subset in list(reachable.items()):
+                if total < target and total + length not in reachable:
+                    reachable[total + length] = subset + [track]
+
+        fitting = [total for total in reachable if total >= target]
+        if fitting:
+            selected = reachable[min(fitting)]
+        else:
+            selected = []
+            while sum(t['duration'] for t in selected) < duration:
+                selected.extend(tracks)
+
+        return ([t['path'] for t in selected],
+                sum(t['duration'] for t in selected))
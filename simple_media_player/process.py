@@ -0,0 +1,163 @@
+"""
+Supervision of child processes (encoders and players) output.
+"""
+import re
+import time
+import logging
+import threading
+import subprocess
+from collections import namedtuple, deque
+
+from .timing import SYSTEM_CLOCK
+
+
+log = logging.getLogger(__name__)
+
+
+# progress reported by child process: amount of work done and total amount
+# (None if unknown), e.g. number of encoded images or seconds of video
+Progress = namedtuple('Progress', ['done', 'total'])
+
+_COUNTER = re.compile(r'\b(\d+)\s*(?:/|of)\s*(\d+)\b')
+_TIMESTAMP = re.compile(r'time=(\d+):(\d+):(\d+(?:\.\d+)?)')
+
+
+def parse_progress(line: str):
+    """Parses progress from a line of dvd-slideshow or ffmpeg output.
+
+    Returns:
+        Progress or None if line does not report progress
+    """
+    match = _TIMESTAMP.search(line)
+    if match is not None:
+        h, m, s = match.groups()
+        return Progress(int(h) * 3600 + int(m) * 60 + float(s), None)
+
+    match = _COUNTER.search(line)
+    if match is not None:
+        done, total = int(match.group(1)), int(match.group(2))
+        if 0 <= done <= total:
+            return Progress(done, total)
+
+    return None
+
+
+class OutputReader:
+    """Reads output of child process in background thread.
+
+    Output is consumed as soon as it is written, so child process never
+    blocks on full pipe and its parent can wait for it with accurate
+    timeout. Progress parsed from output lines is passed to `on_progress`
+    callback. Lines are logged at most once per `log_interval` seconds
+    (with number of skipped lines), last lines are kept to report failures.
+
+    Arguments:
+        proc(subprocess.Popen): child process with piped stdout
+        name(str): name of utility used as log lines prefix
+        on_progress(callable): function called with Progress from reader
+            thread
+        log_interval(float): minimal interval between logged lines
+        tail(int): number of last output lines kept
+    """
+
+    def __init__(self, proc, name: str, on_progress=None,
+                 log_interval: float=5.0, tail: int=20):
+        self.progress = None
+        self.lines = 0
+        self._proc = proc
+        self._prefix = '[%s]' % name
+        self._on_progress = on_progress
+        self._log_interval = log_interval
+        self._tail = deque(maxlen=tail)
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    @property
+    def tail(self):
+        """Returns last lines of output."""
+        return list(self._tail)
+
+    def _read(self):
+        logged_at, skipped = None, 0
+        try:
+            for raw in self._proc.stdout:
+                line = raw.decode(errors='replace').strip()
+                line = line.replace(self._prefix, '').strip()
+                if not line:
+                    continue
+                self.lines += 1
+                self._tail.append(line)
+
+                progress = parse_progress(line)
+                if progress is not None:
+                    self.progress = progress
+                    if self._on_progress is not None:
+                        self._on_progress(progress)
+
+                now = time.monotonic()
+                if logged_at is not None and \
+                        now - logged_at < self._log_interval:
+                    skipped += 1
+                    continue
+
+                if skipped:
+                    line += ' (%d lines skipped)' % skipped
+                log.debug('%s %s' % (self._prefix, line))
+                logged_at, skipped = now, 0
+        finally:
+            self._proc.stdout.close()
+
+        if skipped:
+            log.debug('%s %s (%d lines skipped)'
+                      % (self._prefix, self._tail[-1], skipped - 1))
+
+    def join(self, timeout: float=None):
+        """Waits until output is closed."""
+        self._thread.join(timeout)
+
+
+def stop_process(proc, grace_period: float=1.0):
+    """Terminates process killing it if it does not exit in time."""
+    if proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(timeout=grace_period)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def wait_process(proc, bin_name: str, deadline: float, on_progress=None,
+                 clock=SYSTEM_CLOCK):
+    """Logs child process output and waits for its termination.
+
+    Timeout is counted from the call, not from the end of process output.
+
+    Arguments:
+        proc(subprocess.Popen): child process with piped stdout
+        bin_name(str): name of utility used as log lines prefix
+        deadline(float): monotonic time point when process should be stopped
+        on_progress(callable): function called with parsed Progress
+        clock(Clock): clock which monotonic time deadline is specified in
+
+    Returns:
+        process exit status
+
+    Raises:
+        subprocess.TimeoutExpired: process has not finished before deadline
+    """
+    reader = OutputReader(proc, bin_name, on_progress)
+    try:
+        status = proc.wait(timeout=max(0, deadline - clock.monotonic()))
+    except subprocess.TimeoutExpired:
+        stop_process(proc)
+        raise
+    finally:
+        # output of process which spawned children may stay open after exit
+        reader.join(timeout=1.0)
+
+    if status != 0:
+        log.error('[%s] exited with status %d, last output:\n%s'
+                  % (bin_name, status, '\n'.join(reader.tail)))
+    return status
@@ -0,0 +1,216 @@
+"""
+Contains slide show rendering strategies built on top of utilities wrappers.
+"""
+import os
+import time
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from .wrapper import DvdSlideShowBackend, EncodingProfile, concat_videos
+from .process import wait_process
+from .slideshow.builder import SlideShowBuilder
+from .slideshow.cache import RenderCache
+
+
+log = logging.getLogger(__name__)
+
+
+# approximate relative encoding time of x264 presets
+PRESET_COSTS = {
+    'ultrafast': 0.3, 'superfast': 0.4, 'veryfast': 0.5, 'faster': 0.7,
+    'fast': 0.8, 'medium': 1.0, 'slow': 1.5, 'slower': 2.5, 'veryslow': 5.0
+}
+
+
+def parse_profiles(value: str):
+    """Parses comma-separated encoding profiles in `name:fps:preset:bitrate`
+    format (bitrate can be empty).
+
+    Returns:
+        list of EncodingProfile in the same order
+
+    Raises:
+        ValueError: profiles cannot be parsed
+    """
+    profiles = []
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        fields = [field.strip() for field in item.split(':')]
+        if len(fields) != 4:
+            raise ValueError('invalid encoding profile: %s' % item)
+        name, fps, preset, bitrate = fields
+        profiles.append(
+            EncodingProfile(name, int(fps), preset, bitrate or None))
+
+    if not profiles:
+        raise ValueError('no encoding profiles specified')
+    return profiles
+
+
+def profile_cost(profile: EncodingProfile):
+    """Returns relative encoding time of video second using profile."""
+    return profile.fps * PRESET_COSTS.get(profile.preset, 1.0)
+
+
+def select_profile(profiles: list, time_left: float, estimate):
+    """Selects encoding profile fitting available time.
+
+    Arguments:
+        profiles(list): profiles ordered from the best quality to the fastest
+        time_left(float): seconds left for encoding
+        estimate(callable): function returning estimated encoding time of
+            profile
+
+    Returns:
+        the first profile which is expected to be encoded in time or the
+        fastest one if none of them is
+    """
+    for profile in profiles:
+        if estimate(profile) <= time_left:
+            return profile
+    return min(profiles, key=estimate)
+
+
+class SegmentRenderer:
+    """Renders slide show segment by segment.
+
+    Each segment (an image with its transitions) is encoded separately by
+    render backend (dvd-slideshow unless other one is specified) and cached
+    by fingerprint of its content, so only segments with changed images are
+    encoded again. Encoded segments are joined without re-encoding and
+    background music is muxed in the end.
+
+    Missing segments are encoded concurrently by up to `workers` encoder
+    processes, so multi-core machines encode slide show several times faster.
+    Segments can be submitted for encoding before the whole slide show is
+    known (e.g. while remaining images are still downloading).
+
+    Renderer is intended to be used for single slide show: encoding timeout
+    is counted from renderer creation.
+    """
+
+    def __init__(self, folder: str, resolution: str='1920x1080',
+                 max_entries: int=100, timeout: int=900, workers: int=1,
+                 backend=None):
+        os.makedirs(folder, exist_ok=True)
+        self._folder = folder
+        self._cache = RenderCache(folder, max_entries)
+        self._deadline = time.monotonic() + timeout
+        self._workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self._workers)
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._backend = backend or DvdSlideShowBackend(folder, resolution)
+
+    def segment_key(self, segment: SlideShowBuilder):
+        """Returns cache key of slide show segment."""
+        return self._cache.fingerprint(
+            segment.build(), segment.images, [], *self._backend.options)
+
+    def submit(self, segment: SlideShowBuilder):
+        """Schedules segment encoding unless it is already scheduled.
+
+        Returns:
+            concurrent.futures.Future resolved with path to encoded segment
+        """
+        key = self.segment_key(segment)
+        with self._lock:
+            if key not in self._futures:
+                self._futures[key] = self._executor.submit(
+                    self.render_segment, segment)
+            return self._futures[key]
+
+    @property
+    def profile(self):
+        """Returns encoding profile of segments."""
+        return self._backend.profile
+
+    def close(self):
+        """Waits for scheduled segments and releases encoding workers."""
+        self._executor.shutdown()
+
+    def render_segment(self, segment: SlideShowBuilder):
+        """Returns path to encoded segment rendering it if needed or None if
+        encoding failed.
+
+        Arguments:
+            segment(SlideShowBuilder): segment of slide show
+        """
+        key = self.segment_key(segment)
+
+        path = self._cache.lookup(key)
+        if path is not None:
+            return path
+
+        name = key + '.part'
+        encoded_path = self._backend.output_path(name)
+        try:
+            proc = self._backend.encode(name, segment)
+            status = wait_process(
+                proc, self._backend.encoder_bin, self._deadline)
+        except subprocess.TimeoutExpired:
+            if os.path.exists(encoded_path):
+                os.remove(encoded_path)
+            raise
+        finally:
+            self._backend.finish(name)
+
+        if status != 0:
+            log.error('[smp][-] Segment encoding failed with status %d'
+                      % status)
+            if os.path.exists(encoded_path):
+                os.remove(encoded_path)
+            return None
+
+        if not os.path.exists(encoded_path):
+            return None
+
+        path = self._cache.path(key)
+        os.replace(encoded_path, path)
+        return path
+
+    def render(self, builder: SlideShowBuilder, output_path: str,
+               music_path=None):
+        """Renders slide show into specified file.
+
+        Arguments:
+            builder(SlideShowBuilder): slide show to be rendered
+            output_path(str): path to created video file
+            music_path(str or list): path to background music file or
+                a list of tracks played one after another
+
+        Returns:
+            output_path if slide show was rendered successfully or None
+
+        Raises:
+            subprocess.TimeoutExpired: rendering has not finished on time
+        """
+        segments = builder.segments()
+        log.debug('[smp][.] Render %d segments using %d workers'
+                  % (len(segments), self._workers))
+
+        # identical and previously submitted segments are rendered once
+        futures = [self.submit(segment) for segment in segments]
+        paths = [future.result() for future in futures]
+
+        if None in paths:
+            log.error('[smp][-] Cannot render segment %d' %
+                      (paths.index(None) + 1))
+            return None
+
+        proc = concat_videos(paths, output_path, music_path)
+        status = wait_process(proc, 'ffmpeg', self._deadline)
+        self._cache.evict()
+
+        if status != 0:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return None
+
+        if not os.path.exists(output_path):
+            return None
+
+        return output_path
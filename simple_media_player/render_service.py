@@ -0,0 +1,245 @@
+"""
+Central render service preparing slide show once for all kiosks.
+
+Service downloads images and encodes slide show the same way media player
+does (using its parameters, render backend and render cache) and serves the
+video to kiosks which download it instead of rendering it themselves:
+
+    python3 -m simple_media_player.render_service --port 8001
+
+Kiosks use service if `render_service_api` parameter is set to URL of its
+`/slide_show` endpoint, e.g. http://render-node:8001/slide_show.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from http.server import SimpleHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import ThreadingHTTPServer
+from .constants import PLAYER_CONFIG_PATH
+
+
+log = logging.getLogger(__package__)
+
+
+PORT = 8001
+
+# seconds after which playlist is checked for changes and slide show is
+# prepared again (unchanged playlist is taken from render cache)
+MAX_AGE = 300
+
+
+class SlideShowRequestHandler(SimpleHTTPRequestHandler):
+    """Serves slide show to kiosks:
+
+        1) description of current slide show:
+
+            http://localhost:PORT/slide_show
+
+           returns {"version": ..., "url": "/videos/<version>.mp4",
+           "duration": ...} or 503 if there is no slide show yet
+
+
+        2) slide show video (supports conditional requests by ETag):
+
+            http://localhost:PORT/videos/<version>.mp4
+
+    Subclasses provide current slide show by `current_show` method (there
+    is no slide show by default) and folder videos are served from by
+    VIDEOS_FOLDER attribute.
+    """
+
+    VIDEOS_FOLDER = None
+
+    protocol_version = 'HTTP/1.1'
+
+    def current_show(self):
+        """Returns tuple of path and duration of current slide show or None
+        if it is not available.
+        """
+        return None
+
+    def send_empty(self, code: int, headers: dict=None):
+        self.send_response(code)
+        self.send_header('Content-length', '0')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def send_json(self, obj):
+        response = json.dumps(obj).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def send_video(self, name: str):
+        path = os.path.join(self.VIDEOS_FOLDER or '', name)
+        if not name.endswith('.mp4') or not os.path.isfile(path):
+            self.send_empty(404)
+            return
+
+        # video name is rendering fingerprint, so it never changes content
+        etag = '"%s"' % name[:-len('.mp4')]
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None and \
+                etag in [tag.strip() for tag in if_none_match.split(',')]:
+            self.send_empty(304, {'ETag': etag})
+            return
+
+        with open(path, 'rb') as fp:
+            self.send_response(200)
+            self.send_header('Content-type', 'video/mp4')
+            self.send_header('Content-length',
+                             str(os.fstat(fp.fileno()).st_size))
+            self.send_header('ETag', etag)
+            self.end_headers()
+            self.copyfile(fp, self.wfile)
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+
+        if path.endswith('/slide_show'):
+            show = self.current_show()
+            if show is None:
+                self.send_empty(503)
+                return
+            video_path, duration = show
+            name = os.path.basename(video_path)
+            self.send_json({'version': os.path.splitext(name)[0],
+                            'url': '/videos/%s' % name,
+                            'duration': duration})
+
+        elif path.startswith('/videos/'):
+            self.send_video(os.path.basename(path))
+
+        else:
+            self.send_empty(404)
+
+
+class RenderService:
+    """Prepares slide show by media player and shares it between kiosks.
+
+    Slide show is prepared in background, so requests never wait for
+    downloading and encoding: the previous slide show is served until the
+    next one is ready and requests made before the first one is ready are
+    answered as unavailable. Preparation is started by the first request
+    made `max_age` seconds after previous one and runs once however many
+    kiosks ask for slide show. If preparation fails, the previous slide show
+    is served until it gets stale again.
+
+    Arguments:
+        player(SimpleMediaPlayer): configured media player
+        max_age(float): seconds slide show is served without preparing it
+    """
+
+    def __init__(self, player, max_age: float=MAX_AGE):
+        self._player = player
+        self._max_age = max_age
+        self._show = None
+        self._prepared_at = None
+        self._preparing = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._lock = threading.Lock()
+
+    @property
+    def videos_folder(self):
+        return os.path.expandvars(
+            self._player.cfg['created_slide_shows_path'])
+
+    def _is_available(self):
+        return self._show is not None and os.path.exists(self._show.path)
+
+    def _is_stale(self):
+        return (not self._is_available() or
+                time.monotonic() - self._prepared_at >= self._max_age)
+
+    def _prepare(self):
+        try:
+            show = self._player.prepare()
+        except Exception as e:
+            log.error('[smp][-] Slide show preparation failed: %s' % e)
+            show = None
+
+        with self._lock:
+            self._preparing = None
+            if show is not None:
+                self._show = show
+                self._prepared_at = time.monotonic()
+                log.debug('[smp][+] Slide show is prepared: %s' % show.path)
+            elif self._is_available():
+                # previous slide show is served until it gets stale again
+                self._prepared_at = time.monotonic()
+                log.warning('[smp][!] Cannot prepare slide show, serve '
+                            'previous one: %s' % self._show.path)
+        return show
+
+    def refresh(self):
+        """Starts background preparation of slide show unless it is already
+        running.
+
+        Returns:
+            concurrent.futures.Future of running preparation
+        """
+        with self._lock:
+            if self._preparing is None:
+                self._preparing = self._executor.submit(self._prepare)
+            return self._preparing
+
+    def current(self):
+        """Returns tuple of path and duration of current slide show or None
+        if there is no slide show yet. Stale slide show is returned while
+        the next one is prepared.
+        """
+        if self._is_stale():
+            self.refresh()
+
+        with self._lock:
+            if not self._is_available():
+                return None
+            return self._show.path, self._show.actual_duration
+
+    def close(self):
+        """Waits for running preparation and stops background worker."""
+        self._executor.shutdown()
+
+
+def create_handler(service: RenderService):
+    """Returns requests handler class serving slide shows of service."""
+    return type('SlideShowRequestHandler', (SlideShowRequestHandler,), {
+        'VIDEOS_FOLDER': service.videos_folder,
+        'current_show': lambda self: service.current()})
+
+
+def run_server(service: RenderService, host='', port=PORT):
+    # the first slide show is prepared before any kiosk asks for it
+    service.refresh()
+    server = ThreadingHTTPServer((host, port), create_handler(service))
+    server.serve_forever()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--config', default=PLAYER_CONFIG_PATH)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--max-age', type=float, default=MAX_AGE,
+                        help='seconds after which slide show is prepared '
+                             'again')
+    args = parser.parse_args()
+
+    from .__main__ import SimpleMediaPlayer
+    player = SimpleMediaPlayer()
+    player.read_config(args.config)
+    # service renders slide show itself instead of asking another service
+    player.cfg['render_service_api'] = ''
+    player.setup_metrics()
+    run_server(RenderService(player, args.max_age), '', args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -43,23 +43,62 @@ class SlideShowBuilder:
         """Concatenates all specified effects and images into single string."""
         return '\n'.join([str(e) for e in self.entries]) + '\n'
 
-    @staticmethod
-    def create_slide_show(images: list, image_duration: int):
-        """Creates slide show from provided images.
+    @property
+    def images(self):
+        """Returns paths of images used in slide show."""
+        return [e.path for e in self.entries if isinstance(e, ImageEntry)]
+
+    def segments(self):
+        """Splits slide show into independently renderable segments.
+
+        Each segment contains single image followed by its transitions. Fade
+        in transitions preceding an image belong to segment of that image, and
+        crossfade or wipe transitions are ended with next image shown for zero
+        seconds, so concatenation of rendered segments gives the same video as
+        the whole slide show.
+        """
+        blending = (TransitionName.CrossFade, TransitionName.Wipe)
+        segments, current, pending = [], None, []
+
+        for i, e in enumerate(self.entries):
+            if isinstance(e, ImageEntry):
+                current = SlideShowBuilder()
+                current.entries.extend(pending)
+                current.entries.append(e)
+                segments.append(current)
+                pending = []
+
+            elif current is None or e.name == TransitionName.FadeIn:
+                pending.append(e)
+
+            else:
+                current.entries.append(e)
+                if e.name not in blending:
+                    continue
+                following = [x for x in self.entries[i + 1:]
+                             if isinstance(x, ImageEntry)]
+                if following:
+                    current.entries.append(ImageEntry(following[0].path, 0))
+
+        if segments:
+            segments[-1].entries.extend(pending)
+
+        return segments
 
-        Transitions between images are selected in a random manner.
+    @staticmethod
+    def from_images(images: list, image_duration: int, seed=None):
+        """Creates builder filled with provided images and random transitions.
 
-        Arguments:
-            images(list): a list of images paths to be used in slide show
-            image_duration(int): duration of each image showing
+        See create_slide_show method for arguments description.
         """
         import random
+        rng = random.Random(seed)
         builder = SlideShowBuilder()
         transition_duration = 2
 
         for image in images[:-1]:
             builder.image(image, image_duration)
-            choice = random.randint(0, 2)
+            choice = rng.randint(0, 2)
             make_transition = {
                 0: lambda d, s: builder.fade_out(d//2, s).fade_in(d//2, s),
                 1: lambda d, s: builder.cross_fade(d, s),
@@ -71,4 +110,19 @@ class SlideShowBuilder:
         builder.image(images[-1], image_duration)
         builder.fade_out(transition_duration)
 
-        return builder.build()
+        return builder
+
+    @staticmethod
+    def create_slide_show(images: list, image_duration: int, seed=None):
+        """Creates slide show from provided images.
+
+        Transitions between images are selected in a random manner.
+
+        Arguments:
+            images(list): a list of images paths to be used in slide show
+            image_duration(int): duration of each image showing
+            seed: random generator seed; the same seed and images always
+                give the same slide show
+        """
+        return SlideShowBuilder.from_images(
+            images, image_duration, seed).build()
@@ -0,0 +1,91 @@
+"""
+Cache of encoded slide shows keyed by fingerprint of their inputs.
+"""
+import os
+import time
+import hashlib
+
+from ..api.cache import file_digest
+
+
+class RenderCache:
+    """Keeps encoded slide shows to reuse them when content has not changed.
+
+    Cache key is a fingerprint of dvd-slideshow config (with image paths
+    replaced by digests of their content), audio tracks and encoding options,
+    so cycles receiving the same playlist reuse previously encoded video
+    instead of running encoder again. Only `max_entries` most recently used
+    videos are kept in output folder.
+    """
+
+    EXTENSION = '.mp4'
+
+    def __init__(self, folder: str, max_entries: int=10):
+        self._folder = folder
+        self._max_entries = max_entries
+        self._digests = {}
+
+    def _digest(self, path: str):
+        """Returns digest of file content reusing previously computed values
+        for unchanged files.
+        """
+        st = os.stat(path)
+        key = (path, st.st_size, st.st_mtime)
+        if key not in self._digests:
+            self._digests[key] = file_digest(path)
+        return self._digests[key]
+
+    def fingerprint(self, config: str, image_paths: list,
+                    audio_paths: list=(), *options):
+        """Computes cache key of slide show.
+
+        Arguments:
+            config(str): dvd-slideshow configuration file content
+            image_paths(list): paths of images referenced by configuration
+            audio_paths(list): paths of background audio tracks
+            options: any other parameters affecting encoding result
+        """
+        for path in sorted(set(image_paths), key=len, reverse=True):
+            config = config.replace(path, self._digest(path))
+
+        sha = hashlib.sha1(config.encode('utf8'))
+        for path in audio_paths:
+            st = os.stat(path)
+            sha.update(('%s:%d:%d' % (path, st.st_size, st.st_mtime))
+                       .encode('utf8'))
+        for option in options:
+            sha.update(str(option).encode('utf8'))
+
+        return sha.hexdigest()
+
+    def path(self, key: str):
+        """Returns path of encoded video with specified key."""
+        return os.path.join(self._folder, key + self.EXTENSION)
+
+    def lookup(self, key: str):
+        """Returns path to previously encoded video or None if it is missing.
+        """
+        path = self.path(key)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return None
+        # access time marks usage keeping modification time intact, so
+        # probing results cached by modification time stay valid
+        os.utime(path, (time.time(), os.path.getmtime(path)))
+        return path
+
+    def evict(self):
+        """Removes least recently used videos exceeding cache capacity."""
+        entries = []
+        for name in os.listdir(self._folder):
+            key, ext = os.path.splitext(name)
+            if ext != self.EXTENSION or len(key) != 40:
+                continue
+            path = os.path.join(self._folder, name)
+            entries.append((os.path.getatime(path), path))
+
+        entries.sort(reverse=True)
+        for _, path in entries[self._max_entries:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,119 @@
+"""
+Normalization of slide show images before encoding.
+"""
+import os
+import hashlib
+import logging
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .cache import RenderCache
+from ..api.cache import file_digest
+
+
+log = logging.getLogger(__name__)
+
+
+class PreprocessedImagesCache(RenderCache):
+    """Keeps normalized images keyed by digest of source and resolution."""
+
+    EXTENSION = '.jpg'
+
+
+class ImagePreprocessor:
+    """Orients and resizes images to slide show resolution.
+
+    Each image is decoded and scaled by ImageMagick (which is required by
+    dvd-slideshow anyway) once instead of being scaled by encoder on every
+    frame. Up to `workers` convert processes are run concurrently. Results
+    are cached by digest of source image content and target resolution.
+
+    Images which cannot be converted are passed to encoder unchanged.
+    """
+
+    CONVERT_BIN = 'convert'
+
+    def __init__(self, folder: str, resolution: str='1920x1080',
+                 max_entries: int=500, workers: int=1, timeout: int=60):
+        os.makedirs(folder, exist_ok=True)
+        self._folder = folder
+        self._resolution = resolution
+        self._timeout = timeout
+        self._cache = PreprocessedImagesCache(folder, max_entries)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def key(self, path: str):
+        """Returns cache key of normalized image."""
+        sha = hashlib.sha1(file_digest(path).encode('utf8'))
+        sha.update(self._resolution.encode('utf8'))
+        return sha.hexdigest()
+
+    def submit(self, path: str):
+        """Schedules image normalization unless it is already scheduled.
+
+        Returns:
+            concurrent.futures.Future resolved with path to normalized image
+        """
+        if os.path.dirname(os.path.abspath(path)) == \
+                os.path.abspath(self._folder):
+            # image is already normalized
+            future = Future()
+            future.set_result(path)
+            return future
+
+        key = self.key(path)
+        with self._lock:
+            if key not in self._futures:
+                future = self._executor.submit(self.process, path, key)
+                future.add_done_callback(lambda _: self._forget(key))
+                self._futures[key] = future
+            return self._futures[key]
+
+    def _forget(self, key: str):
+        with self._lock:
+            self._futures.pop(key, None)
+
+    def process_all(self, paths: list):
+        """Normalizes images concurrently keeping their order."""
+        futures = [self.submit(path) for path in paths]
+        processed = [future.result() for future in futures]
+        self._cache.evict()
+        return processed
+
+    def process(self, path: str, key: str=None):
+        """Returns path to normalized image converting it if needed.
+
+        Arguments:
+            path(str): path to source image
+            key(str): cache key of normalized image if already known
+        """
+        key = key or self.key(path)
+        cached = self._cache.lookup(key)
+        if cached is not None:
+            return cached
+
+        # only the first frame of animated images is used
+        output_path = self._cache.path(key)
+        part_path = output_path + '.part.jpg'
+        args = [self.CONVERT_BIN, path + '[0]',
+                '-auto-orient',
+                '-resize', self._resolution + '>',
+                '-background', 'black', '-flatten',
+                '-strip', '-quality', '92',
+                part_path]
+
+        try:
+            subprocess.run(
+                args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                timeout=self._timeout, check=True)
+            os.replace(part_path, output_path)
+            return output_path
+
+        except (OSError, subprocess.SubprocessError) as e:
+            log.warning('[smp][!] Cannot normalize image %s: %s' % (path, e))
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            return path
@@ -0,0 +1,33 @@
+"""
+Helpers for persisting state files which survive crashes and power loss.
+"""
+import os
+import json
+import tempfile
+
+
+def atomic_write_json(path: str, obj):
+    """Writes object as JSON so file contains either its previous or new
+    content, even if process is killed while writing.
+
+    Content is written into temporary file in the same folder, flushed onto
+    disk and renamed over target file.
+
+    Arguments:
+        path(str): path to written file (missing folders are created)
+        obj: JSON serializable object
+    """
+    folder = os.path.dirname(path) or '.'
+    os.makedirs(folder, exist_ok=True)
+
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(obj, fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
@@ -0,0 +1,128 @@
+"""
+Helpers for accurate waiting and measuring based on monotonic clock.
+"""
+import time
+import threading
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from collections import OrderedDict
+
+
+# wall clock is re-synchronized at least that often while waiting, so
+# system time corrections (e.g. by NTP) do not accumulate into error
+RESYNC_INTERVAL = 60.0
+
+
+def sleep_for(seconds: float):
+    """Sleeps specified number of seconds measured by monotonic clock."""
+    deadline = time.monotonic() + seconds
+    while True:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            break
+        time.sleep(left)
+
+
+class Clock:
+    """Source of wall clock and monotonic time used by scheduling code.
+
+    System clock is used unless another clock is injected, e.g. simulated
+    clock making dry runs independent of real time.
+    """
+
+    def now(self):
+        """Returns current wall clock time."""
+        return datetime.now()
+
+    def monotonic(self):
+        """Returns current monotonic time in seconds."""
+        return time.monotonic()
+
+    def sleep(self, seconds: float):
+        """Sleeps specified number of seconds."""
+        sleep_for(seconds)
+
+
+class SimulatedClock(Clock):
+    """Clock which time is advanced by sleeping instantly.
+
+    Arguments:
+        start(datetime): initial wall clock time
+    """
+
+    def __init__(self, start: datetime):
+        self._start = start
+        self._elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def now(self):
+        with self._lock:
+            return self._start + timedelta(seconds=self._elapsed)
+
+    def monotonic(self):
+        with self._lock:
+            return self._elapsed
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            with self._lock:
+                self._elapsed += seconds
+
+
+SYSTEM_CLOCK = Clock()
+
+
+def sleep_until(tp: datetime, clock: Clock=SYSTEM_CLOCK):
+    """Sleeps until specified wall clock time point.
+
+    Waiting is done by sleeping on monotonic clock instead of polling wall
+    clock, so wake up happens within a few milliseconds after time point.
+
+    Arguments:
+        tp(datetime): time point to wake up at
+        clock(Clock): clock used for waiting
+
+    Returns:
+        drift(float): difference in seconds between actual wake up time and
+            requested time point (positive if woken up later)
+    """
+    while True:
+        left = (tp - clock.now()).total_seconds()
+        if left <= 0:
+            break
+        clock.sleep(min(left, RESYNC_INTERVAL))
+
+    return (clock.now() - tp).total_seconds()
+
+
+class StageTimer:
+    """Accumulates durations of named stages of download-create-playback
+    cycle.
+
+    Durations of a stage entered several times (or by several threads) are
+    summed up. Stages are kept in order they were first entered.
+    """
+
+    def __init__(self):
+        self._durations = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def durations(self):
+        """Returns dictionary mapping stage names onto seconds spent."""
+        with self._lock:
+            return OrderedDict(self._durations)
+
+    def add(self, name: str, seconds: float):
+        """Adds time spent in stage."""
+        with self._lock:
+            self._durations[name] = self._durations.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str):
+        """Context manager measuring time spent in its body."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, time.monotonic() - started)
@@ -2,28 +2,171 @@
 Contains thin wrappers for different Linux utilities. Uses subprocess.Popen
 function to spawn child processes.
 """
+import os
+import abc
+import json
 import math
+import time
+import shutil
+import socket
+import tempfile
+import threading
 import subprocess
-from datetime import datetime
+from collections import namedtuple
+
+from .storage import atomic_write_json
+from .slideshow.config import ImageEntry, TransitionName, TransitionDirection
+
+
+# structured result of media file probing
+MediaInfo = namedtuple('MediaInfo', [
+    'duration', 'format', 'bitrate',
+    'video_codec', 'width', 'height', 'audio_codec'])
+
+
+# speed and quality trade-off of slide show encoding: frame rate, x264
+# preset and video bitrate (e.g. '2M', None lets encoder choose it)
+EncodingProfile = namedtuple('EncodingProfile', [
+    'name', 'fps', 'preset', 'bitrate'])
+
+
+DEFAULT_PROFILE = EncodingProfile('normal', 25, 'veryfast', None)
+
+
+PROBE_BINS = ('ffprobe', 'avprobe')
+
+
+def probe(path: str):
+    """Simple wrapper over ffprobe (or avprobe) utility. Returns media file
+    description parsed from utility JSON output.
+
+    Raises:
+        RuntimeError: there is no probing utility or file cannot be probed
+    """
+    bins = [b for b in PROBE_BINS if shutil.which(b)]
+    if not bins:
+        raise RuntimeError('neither of %s found' % ', '.join(PROBE_BINS))
+
+    args = [bins[0], '-v', 'quiet', '-of', 'json',
+            '-show_format', '-show_streams', path]
+    p = subprocess.Popen(args, stdout=subprocess.PIPE)
+    data, _ = p.communicate()
+
+    try:
+        info = json.loads(data.decode())
+        fmt = info['format']
+    except (ValueError, KeyError):
+        raise RuntimeError('cannot probe file: %s' % path)
+
+    streams = info.get('streams', [])
+    video = [st for st in streams if st.get('codec_type') == 'video']
+    audio = [st for st in streams if st.get('codec_type') == 'audio']
+    video = video[0] if video else {}
+    audio = audio[0] if audio else {}
+
+    return MediaInfo(
+        duration=float(fmt.get('duration', 0)),
+        format=fmt.get('format_name'),
+        bitrate=int(float(fmt.get('bit_rate', 0))),
+        video_codec=video.get('codec_name'),
+        width=video.get('width'),
+        height=video.get('height'),
+        audio_codec=audio.get('codec_name'))
 
 
 def avprobe(path: str):
-    """Simple wrapper over avprobe utility. Returns actual duration of
-    created slide show.
+    """Returns actual duration of media file (e.g. created slide show)."""
+    return probe(path).duration
+
+
+class ProbeCache:
+    """Persistent cache of media files probing results.
+
+    Entries are keyed by file path, modification time and size, so repeated
+    probes of unchanged files (e.g. background music library) do not spawn
+    probing utility at all.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as fp:
+                self._entries = json.load(fp)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def probe(self, path: str):
+        """Returns MediaInfo of file probing it only if file has changed."""
+        st = os.stat(path)
+        stamp = [st.st_mtime, st.st_size]
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry['stamp'] == stamp:
+                return MediaInfo(**entry['info'])
+
+        info = probe(path)
+
+        with self._lock:
+            self._entries[path] = {'stamp': stamp, 'info': info._asdict()}
+            self._save()
+
+        return info
+
+    def _save(self):
+        """Atomically writes cache onto disk dropping removed files."""
+        self._entries = {path: entry for path, entry in self._entries.items()
+                         if os.path.exists(path)}
+
+        atomic_write_json(self._path, self._entries)
+
+
+def concat_videos(paths: list, output_path: str, music_path=None):
+    """Simple wrapper over ffmpeg concat demuxer. Joins videos encoded with
+    the same parameters without re-encoding them.
+
+    Arguments:
+        paths(list): paths to video files to be joined
+        output_path(str): path to created video file
+        music_path(str or list): path to background music file (or a list
+            of tracks played one after another) replacing audio of joined
+            videos; single track is looped up to the end of video
     """
-    p = subprocess.Popen(['avprobe', path], stderr=subprocess.PIPE)
-    p.wait()
-    data = p.stderr.read()
-    p.stderr.close()
-    d = data.decode().split('Duration:')[-1].split(',')[0].strip()
-    d = datetime.strptime(d, '%H:%M:%S.%f')
+    if isinstance(music_path, str):
+        music_path = [music_path]
 
-    to_seconds = lambda t: t / 1e6
+    fd, list_path = tempfile.mkstemp(suffix='.txt')
+    with os.fdopen(fd, 'w') as fp:
+        for path in paths:
+            fp.write("file '%s'\n" % path.replace("'", "'\\''"))
 
-    total_seconds = d.hour*3600 + d.minute*60 \
-                    + d.second + to_seconds(d.microsecond)
+    args = ['ffmpeg', '-y', '-v', 'error',
+            '-f', 'concat', '-safe', '0', '-i', list_path]
 
-    return total_seconds
+    if not music_path:
+        args += ['-c', 'copy']
+
+    elif len(music_path) == 1:
+        args += ['-stream_loop', '-1', '-i', music_path[0],
+                 '-map', '0:v', '-map', '1:a',
+                 '-c:v', 'copy', '-c:a', 'aac', '-shortest']
+
+    else:
+        for path in music_path:
+            args += ['-i', path]
+        inputs = ''.join('[%d:a]' % (i + 1) for i in range(len(music_path)))
+        args += ['-filter_complex',
+                 '%sconcat=n=%d:v=0:a=1[music]' % (inputs, len(music_path)),
+                 '-map', '0:v', '-map', '[music]',
+                 '-c:v', 'copy', '-c:a', 'aac', '-shortest']
+
+    args += ['-f', 'mp4', output_path]
+
+    proc = subprocess.Popen(
+        args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+    return proc
 
 
 class SlideShowPlayer:
@@ -53,14 +196,19 @@ class SlideShowPlayer:
         """Returns name of selected player."""
         return self._player_launch[0]
 
-    def create_slide_show(self, name: str, config: str, music_path: str=None,
-                          estimated_video_duration: int=None):
+    def create_slide_show(self, name: str, config: str, music_path=None,
+                          estimated_video_duration: int=None,
+                          music_duration: float=None):
         """Creates slide show using dvd-sliedeshow utility.
 
         Arguments:
             name(str): created video file name
             config(str): path to dvd-slideshow configuration file
-            music_path(str): path to background music file
+            music_path(str or list): path to background music file or
+                a list of tracks already fitting video duration
+            estimated_video_duration(int): video duration used to compute
+                how many times single music file should be repeated
+            music_duration(float): known duration of background music
         """
         args = [
             self.DVD_SLIDE_SHOW_BIN,
@@ -70,13 +218,18 @@ class SlideShowPlayer:
             '-s', self.resolution
         ]
 
-        if music_path is not None:
+        if isinstance(music_path, list):
+            for path in music_path:
+                args += ['-a', path]
+
+        elif music_path is not None:
 
             if estimated_video_duration is None:
-                args.append('-a', music_path)
+                args += ['-a', music_path]
 
             else:
-                music_duration = avprobe(music_path)
+                if music_duration is None:
+                    music_duration = avprobe(music_path)
                 repeats = math.ceil(estimated_video_duration / music_duration)
 
                 for i in range(repeats):
@@ -116,3 +269,451 @@ class SlideShowPlayer:
             args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
 
         return proc
+
+    def controller(self, socket_path: str=None):
+        """Creates controller of long-running instance of selected player.
+
+        Arguments:
+            socket_path(str): path to player control socket
+        """
+        controller_class = {
+            'mpv': MpvController,
+            'cvlc': VlcController
+        }[self.player_bin]
+
+        return controller_class(self._player_launch, socket_path)
+
+
+class RenderBackend(metaclass=abc.ABCMeta):
+    """Encoder turning slide show described by SlideShowBuilder into MP4
+    video file.
+
+    Encoding is started by `encode` method returning running encoder process
+    which writes video into `output_path(name)`. When process has exited
+    `finish` should be called to remove intermediate files.
+
+    Arguments:
+        output_folder(str): folder where encoded videos are written
+        resolution(str): video resolution in WIDTHxHEIGHT format
+        profile(EncodingProfile): encoding speed and quality options
+    """
+
+    NAME = None
+
+    def __init__(self, output_folder: str, resolution: str='1920x1080',
+                 profile: EncodingProfile=None):
+        self.resolution = resolution
+        self.profile = profile or DEFAULT_PROFILE
+        self._output = output_folder
+
+    @property
+    def options(self):
+        """Returns encoding options affecting encoded video (e.g. to be used
+        in cache keys).
+        """
+        return [self.NAME, self.resolution]
+
+    @property
+    @abc.abstractmethod
+    def encoder_bin(self):
+        """Returns name of encoding utility."""
+
+    def output_path(self, name: str):
+        """Returns path of video encoded under specified name."""
+        return os.path.join(self._output, name + '.mp4')
+
+    @abc.abstractmethod
+    def encode(self, name: str, builder, music_path=None,
+               estimated_video_duration: int=None,
+               music_duration: float=None):
+        """Starts slide show encoding.
+
+        Arguments:
+            name(str): created video file name (without extension)
+            builder(SlideShowBuilder): slide show entries
+            music_path(str or list): path to background music file or
+                a list of tracks already fitting video duration
+            estimated_video_duration(int): video duration used to compute
+                how many times single music file should be repeated
+            music_duration(float): known duration of background music
+
+        Returns:
+            subprocess.Popen of encoder with piped output
+        """
+
+    def finish(self, name: str):
+        """Removes intermediate files of finished (or failed) encoding."""
+
+
+class DvdSlideShowBackend(RenderBackend):
+    """Encodes slide show by dvd-slideshow utility.
+
+    Utility renders frames of transitions into intermediate files and makes
+    several passes, but supports all its config features (e.g. subtitles).
+    Encoding profile is ignored since utility has no such options.
+    """
+
+    NAME = 'dvd-slideshow'
+
+    def __init__(self, output_folder: str, resolution: str='1920x1080',
+                 profile: EncodingProfile=None):
+        super().__init__(output_folder, resolution, profile)
+        self._player = SlideShowPlayer(output_folder)
+        self._player.mp4()
+
+    @property
+    def encoder_bin(self):
+        return SlideShowPlayer.DVD_SLIDE_SHOW_BIN
+
+    def _config_path(self, name: str):
+        return os.path.join(self._output, name + '.cfg')
+
+    def encode(self, name: str, builder, music_path=None,
+               estimated_video_duration: int=None,
+               music_duration: float=None):
+        config_path = self._config_path(name)
+        with open(config_path, 'w') as fp:
+            fp.write(builder.build())
+
+        self._player.resolution = self.resolution
+        return self._player.create_slide_show(
+            name, config_path, music_path,
+            estimated_video_duration, music_duration)
+
+    def finish(self, name: str):
+        config_path = self._config_path(name)
+        if os.path.exists(config_path):
+            os.remove(config_path)
+
+
+class FfmpegBackend(RenderBackend):
+    """Encodes slide show by single ffmpeg process in one pass.
+
+    Slide show entries are turned into a filter graph: each image is looped
+    for the time it is shown (including transitions it takes part in),
+    scaled and padded to slide show resolution. Fade in and fade out
+    transitions fade image from and to black, crossfade and wipe transitions
+    blend adjacent images using xfade filter (requires ffmpeg 4.3 or newer).
+    Frames are encoded as soon as they are produced and streamed into output
+    file, so no intermediate files are written. Subtitles are not supported.
+
+    Frame rate, encoder preset and bitrate are taken from encoding profile.
+    """
+
+    NAME = 'ffmpeg'
+
+    FFMPEG_BIN = 'ffmpeg'
+
+    WIPES = {
+        None: 'wipeleft',
+        TransitionDirection.Left: 'wipeleft',
+        TransitionDirection.Right: 'wiperight',
+        TransitionDirection.Up: 'wipeup',
+        TransitionDirection.Down: 'wipedown'
+    }
+
+    @property
+    def encoder_bin(self):
+        return self.FFMPEG_BIN
+
+    @property
+    def options(self):
+        return super().options + list(self.profile[1:])
+
+    @staticmethod
+    def clips(entries: list):
+        """Splits slide show entries into clips of single image.
+
+        Returns:
+            list of dictionaries with image path, clip length, durations of
+            fade in and fade out and transition blending clip with previous
+            one (None if clips are just joined)
+        """
+        clips, fade_in, blend = [], 0, None
+
+        for e in entries:
+            if isinstance(e, ImageEntry):
+                length = e.duration + fade_in
+                if blend is not None:
+                    length += blend.duration
+                if length > 0:
+                    clips.append({'path': e.path, 'length': length,
+                                  'fade_in': fade_in, 'fade_out': 0,
+                                  'blend': blend})
+                fade_in, blend = 0, None
+
+            elif e.name == TransitionName.FadeIn:
+                fade_in += e.duration
+
+            elif not clips:
+                # there is no image to fade out or blend with
+                continue
+
+            elif e.name == TransitionName.FadeOut:
+                clips[-1]['fade_out'] += e.duration
+                clips[-1]['length'] += e.duration
+
+            else:
+                # blending transition overlaps both adjacent clips
+                clips[-1]['length'] += e.duration
+                blend = e
+
+        return clips
+
+    def filter_graph(self, clips: list):
+        """Builds filter graph joining clips into a single video stream.
+
+        Arguments:
+            clips(list): clips returned by `clips` method; clip with index N
+                is expected to be N-th input of ffmpeg
+
+        Returns:
+            tuple of filter graph description, label of its output and
+            duration of video in seconds
+        """
+        width, height = self.resolution.split('x')
+        filters = []
+
+        for i, clip in enumerate(clips):
+            chain = ('[{i}:v]scale={w}:{h}:force_original_aspect_ratio='
+                     'decrease,pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,setsar=1,'
+                     'fps={fps},format=yuv420p').format(
+                i=i, w=width, h=height, fps=self.profile.fps)
+            if clip['fade_in']:
+                chain += ',fade=t=in:st=0:d=%g' % clip['fade_in']
+            if clip['fade_out']:
+                chain += ',fade=t=out:st=%g:d=%g' % (
+                    clip['length'] - clip['fade_out'], clip['fade_out'])
+            filters.append(chain + '[c%d]' % i)
+
+        label, duration = 'c0', clips[0]['length']
+        for i, clip in enumerate(clips[1:], 1):
+            output = 'v%d' % i
+            blend = clip['blend']
+
+            if blend is None:
+                filters.append('[%s][c%d]concat=n=2:v=1:a=0[%s]'
+                               % (label, i, output))
+                duration += clip['length']
+
+            else:
+                if blend.name == TransitionName.Wipe:
+                    transition = self.WIPES[blend.direction]
+                else:
+                    transition = 'fade'
+                filters.append(
+                    '[%s][c%d]xfade=transition=%s:duration=%g:offset=%g[%s]'
+                    % (label, i, transition, blend.duration,
+                       duration - blend.duration, output))
+                duration += clip['length'] - blend.duration
+
+            label = output
+
+        return ';'.join(filters), label, duration
+
+    def encode(self, name: str, builder, music_path=None,
+               estimated_video_duration: int=None,
+               music_duration: float=None):
+        clips = self.clips(builder.entries)
+        if not clips:
+            raise ValueError('slide show has no images')
+
+        graph, label, duration = self.filter_graph(clips)
+
+        args = [self.FFMPEG_BIN, '-y', '-v', 'error',
+                '-nostats', '-progress', 'pipe:1']
+        for clip in clips:
+            args += ['-loop', '1', '-framerate', str(self.profile.fps),
+                     '-t', '%g' % clip['length'], '-i', clip['path']]
+
+        maps = ['-map', '[%s]' % label]
+
+        if isinstance(music_path, str):
+            args += ['-stream_loop', '-1', '-i', music_path]
+            maps += ['-map', '%d:a' % len(clips), '-c:a', 'aac']
+
+        elif music_path:
+            for path in music_path:
+                args += ['-i', path]
+            graph += ';%sconcat=n=%d:v=0:a=1[music]' % (
+                ''.join('[%d:a]' % (len(clips) + i)
+                        for i in range(len(music_path))),
+                len(music_path))
+            maps += ['-map', '[music]', '-c:a', 'aac']
+
+        args += ['-filter_complex', graph] + maps
+        args += ['-c:v', 'libx264', '-preset', self.profile.preset,
+                 '-pix_fmt', 'yuv420p', '-r', str(self.profile.fps)]
+        if self.profile.bitrate:
+            args += ['-b:v', self.profile.bitrate]
+        args += ['-t', '%g' % duration, '-f', 'mp4', self.output_path(name)]
+
+        proc = subprocess.Popen(
+            args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+        return proc
+
+
+# render backends selectable by name in configuration
+RENDER_BACKENDS = {
+    backend.NAME: backend for backend in (DvdSlideShowBackend, FfmpegBackend)
+}
+
+
+class PlayerController(metaclass=abc.ABCMeta):
+    """Controls idle media player process via its control socket.
+
+    Player is started ahead of time without any file, so process start and
+    initialization do not delay playback start. Slide show is loaded paused
+    shortly before playback and is started and stopped by commands sent to
+    the player at exact time points.
+    """
+
+    def __init__(self, launch_args: list, socket_path: str=None):
+        if socket_path is None:
+            socket_path = os.path.join(
+                tempfile.gettempdir(),
+                'smp-%s-%d.sock' % (launch_args[0], os.getpid()))
+
+        self._launch_args = list(launch_args)
+        self._socket_path = socket_path
+        self._proc = None
+        self._sock = None
+
+    @property
+    def running(self):
+        """Checks if player process is alive."""
+        return self._proc is not None and self._proc.poll() is None
+
+    @abc.abstractmethod
+    def _idle_args(self):
+        """Returns command line arguments to start idle player."""
+
+    def start(self, timeout: float=10.0):
+        """Starts idle player and connects to its control socket."""
+        if self.running:
+            return
+
+        if os.path.exists(self._socket_path):
+            os.remove(self._socket_path)
+
+        self._proc = subprocess.Popen(
+            self._launch_args + self._idle_args(),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self._sock = socket.socket(socket.AF_UNIX)
+                self._sock.connect(self._socket_path)
+                break
+            except OSError:
+                self._sock.close()
+                if time.monotonic() > deadline or not self.running:
+                    self.close()
+                    raise
+                time.sleep(0.05)
+
+    @abc.abstractmethod
+    def load(self, path: str):
+        """Loads file paused to start it later without delay."""
+
+    @abc.abstractmethod
+    def play(self):
+        """Starts playback of loaded file."""
+
+    @abc.abstractmethod
+    def stop(self):
+        """Stops playback keeping player process idle."""
+
+    def close(self):
+        """Terminates player process."""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+        if self._proc is not None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+            self._proc = None
+
+
+class MpvController(PlayerController):
+    """Controls mpv player using its JSON IPC protocol."""
+
+    def __init__(self, launch_args: list, socket_path: str=None):
+        super().__init__(launch_args, socket_path)
+        self._request_id = 0
+        self._buffer = b''
+
+    def _idle_args(self):
+        return ['--idle=yes', '--keep-open=no',
+                '--input-ipc-server=%s' % self._socket_path]
+
+    def command(self, *args):
+        """Sends command to player and returns its response data.
+
+        Raises:
+            RuntimeError: player has not executed command
+        """
+        self._request_id += 1
+        request = {'command': list(args), 'request_id': self._request_id}
+        self._sock.sendall(json.dumps(request).encode('utf8') + b'\n')
+
+        while True:
+            while b'\n' not in self._buffer:
+                data = self._sock.recv(4096)
+                if not data:
+                    raise RuntimeError('mpv control socket closed')
+                self._buffer += data
+
+            line, self._buffer = self._buffer.split(b'\n', 1)
+            response = json.loads(line.decode('utf8'))
+
+            # skip asynchronous events and responses to other requests
+            if response.get('request_id') != self._request_id:
+                continue
+
+            if response.get('error') != 'success':
+                raise RuntimeError('mpv command %s failed: %s'
+                                   % (args, response.get('error')))
+
+            return response.get('data')
+
+    def load(self, path: str):
+        self.command('set_property', 'pause', True)
+        self.command('loadfile', path, 'replace')
+
+    def play(self):
+        self.command('set_property', 'pause', False)
+
+    def stop(self):
+        self.command('stop')
+
+
+class VlcController(PlayerController):
+    """Controls VLC player using its remote control interface.
+
+    Remote control interface does not report commands results, so commands
+    are sent without waiting for response.
+    """
+
+    def _idle_args(self):
+        return ['-I', 'rc', '--rc-fake-tty', '--rc-unix', self._socket_path]
+
+    def command(self, *args):
+        """Sends command to player."""
+        self._sock.sendall((' '.join(args) + '\n').encode('utf8'))
+
+    def load(self, path: str):
+        self.command('clear')
+        self.command('enqueue', path)
+
+    def play(self):
+        self.command('play')
+
+    def stop(self):
+        self.command('stop')
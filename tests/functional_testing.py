@@ -1,14 +1,14 @@
 import unittest
 import threading
-from http.server import HTTPServer
 from simple_media_player.__main__ import SimpleMediaPlayer
-from simple_media_player.mockup.imageserver import ImagesRequestHandler, PORT
+from simple_media_player.mockup.imageserver import \
+    ImagesRequestHandler, ThreadingHTTPServer
 
 
 class TestDownloadCreatePlayback(unittest.TestCase):
 
     def setUp(self):
-        self.server = HTTPServer(('', PORT), ImagesRequestHandler)
+        self.server = ThreadingHTTPServer(('localhost', 0), ImagesRequestHandler)
         threading.Thread(target=self.serve).start()
 
     def serve(self):
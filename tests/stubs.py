@@ -0,0 +1,24 @@
+"""
+Installation of external utilities stubs for the duration of test.
+"""
+from simple_media_player.mockup.stubs import stub_binaries
+
+
+def install_stubs(test_case, stubs: dict, **environ):
+    """Installs Python scripts as executables found first in PATH for the
+    duration of test.
+
+    Environment is restored and stubs are removed on test cleanup.
+
+    Arguments:
+        test_case(unittest.TestCase): running test
+        stubs(dict): mapping of binary names onto Python source of stubs
+        environ: environment variables passed to stubs
+
+    Returns:
+        path to folder with installed stubs
+    """
+    installed = stub_binaries(stubs, **environ)
+    folder = installed.__enter__()
+    test_case.addCleanup(installed.__exit__, None, None, None)
+    return folder
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+import threading
+import configparser
+from unittest import mock
+
+from simple_media_player.api import async_images
+from simple_media_player.api.async_images import AsyncRemoteImagesReceiver
+from simple_media_player.api.cache import ImageCache
+from simple_media_player.api.retry import RetryPolicy
+from simple_media_player.__main__ import SimpleMediaPlayer
+from simple_media_player.mockup.imageserver import \
+    ImagesRequestHandler, ThreadingHTTPServer
+
+
+class ImagesServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        samples = os.path.join(self.folder, 'samples')
+        os.makedirs(samples)
+        for i in range(2):
+            with open(os.path.join(samples, '%d.png' % i), 'wb') as fp:
+                fp.write(bytes([i]) * 1024)
+
+        handler = type('Handler', (ImagesRequestHandler,),
+                       {'SAMPLE_IMAGES_FOLDER': samples})
+        self.server = ThreadingHTTPServer(('localhost', 0), handler)
+        threading.Thread(target=self.server.serve_forever).start()
+        self.api = "http://localhost:%d/playlist" % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+
+@unittest.skipIf(async_images.aiohttp is None,
+                 'aiohttp is not installed (see requirements-async.txt)')
+class TestAsyncImagesReceiver(ImagesServerTestCase):
+
+    def test_image_receiver(self):
+        received = {}
+        receiver = AsyncRemoteImagesReceiver(
+            self.api, self.folder, workers=4,
+            retry=RetryPolicy(max_attempts=3, base_delay=0.01))
+
+        image_paths = receiver.receive_images(
+            on_image=lambda index, path: received.update({index: path}))
+
+        self.assertGreater(len(image_paths), 0)
+        self.assertEqual(image_paths, [received[i] for i in sorted(received)])
+        for path in image_paths:
+            self.assertTrue(os.path.exists(path))
+        self.assertEqual(receiver.last_playlist(), image_paths)
+
+    def test_repeated_images_are_cached(self):
+        cache = ImageCache(os.path.join(self.folder, 'cache'))
+        receiver = AsyncRemoteImagesReceiver(
+            self.api, self.folder, workers=4, cache=cache,
+            retry=RetryPolicy(max_attempts=3, base_delay=0.01))
+
+        first = receiver.receive_images()
+        second = receiver.receive_images()
+
+        for path in first + second:
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(os.path.dirname(path), cache.path)
+
+
+class TestMissingAiohttp(ImagesServerTestCase):
+
+    def test_synchronous_receiver_is_used(self):
+        config = configparser.ConfigParser()
+        config.read_dict({'simple_media_player': {
+            'images_api': self.api,
+            'downloaded_images_path': self.folder,
+            'image_cache_size': '0',
+            'images_receiver': 'async'}})
+        player = SimpleMediaPlayer()
+        player.cfg = config['simple_media_player']
+
+        with mock.patch.object(async_images, 'aiohttp', None):
+            with self.assertRaises(ImportError):
+                AsyncRemoteImagesReceiver(self.api, self.folder)
+            image_paths = player.download_images()
+
+        self.assertGreater(len(image_paths), 0)
+        for path in image_paths:
+            self.assertTrue(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+import threading
+
+from simple_media_player.api.images import RemoteImagesReceiver
+from simple_media_player.api.retry import RetryPolicy
+from simple_media_player.mockup.imageserver import \
+    ImagesRequestHandler, ThreadingHTTPServer
+
+
+class TestBatchResolve(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        samples = os.path.join(self.folder, 'samples')
+        os.makedirs(samples)
+        for i in range(2):
+            with open(os.path.join(samples, '%d.png' % i), 'wb') as fp:
+                fp.write(bytes([i]) * 1024)
+        self.samples = samples
+        self.requests = []
+        self.server = None
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def serve(self, batch_resolve):
+        requests = self.requests
+
+        class Handler(ImagesRequestHandler):
+            SAMPLE_IMAGES_FOLDER = self.samples
+            BATCH_RESOLVE = batch_resolve
+
+            def log_request(self, code='-', size='-'):
+                requests.append((self.command, self.path.split('/')[1]))
+
+        self.server = ThreadingHTTPServer(('localhost', 0), Handler)
+        threading.Thread(target=self.server.serve_forever).start()
+
+    def receive(self, query=''):
+        receiver = RemoteImagesReceiver(
+            "http://localhost:%d/playlist%s" % (self.server.server_port, query), self.folder,
+            retry=RetryPolicy(max_attempts=3, base_delay=0.01))
+        image_paths = receiver.receive_images()
+        for path in image_paths:
+            self.assertTrue(os.path.exists(path))
+        return image_paths
+
+    def count(self, command, path):
+        return self.requests.count((command, path))
+
+    def test_batch_resolve_endpoint(self):
+        self.serve(batch_resolve=True)
+        image_paths = self.receive()
+
+        self.assertEqual(self.count('POST', 'resolve'), 1)
+        self.assertEqual(self.count('GET', 'random_image'), 0)
+        self.assertEqual(self.count('GET', 'img'), len(image_paths))
+
+    def test_resolved_playlist(self):
+        self.serve(batch_resolve=True)
+        image_paths = self.receive('?resolved')
+
+        self.assertEqual(self.count('POST', 'resolve'), 0)
+        self.assertEqual(self.count('GET', 'random_image'), 0)
+        self.assertEqual(self.count('GET', 'img'), len(image_paths))
+
+    def test_fallback_for_old_servers(self):
+        self.serve(batch_resolve=False)
+        image_paths = self.receive()
+
+        self.assertEqual(self.count('POST', 'resolve'), 0)
+        self.assertEqual(self.count('GET', 'random_image'), len(image_paths))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import json
+import unittest
+
+from benchmarks import cycle
+
+
+class TestCycleBenchmark(unittest.TestCase):
+
+    def test_stages_are_measured(self):
+        results = cycle.run_benchmark([2], [1024], repeats=1)
+        json.dumps(results)
+
+        case, = results['cases']
+        self.assertEqual(case['playlist_size'], 2)
+        self.assertEqual(case['image_size'], 1024)
+        self.assertEqual(len(case['runs']), 1)
+        for stage in cycle.STAGES:
+            self.assertGreaterEqual(case['median'][stage], 0)
+        self.assertGreaterEqual(
+            case['median']['total'], case['median']['encode'])
+
+    def test_compare(self):
+        def results(encode):
+            return {'cases': [{'playlist_size': 5, 'image_size': 100,
+                               'median': {'encode': encode, 'probe': 0.001}}]}
+
+        self.assertEqual(cycle.compare(results(1.0), results(1.1)), [])
+        self.assertEqual(cycle.compare(results(1.0), results(2.0)),
+                         [(5, 100, 'encode', 1.0, 2.0)])
+        # stages faster than 10 ms are too noisy to be compared
+        self.assertEqual(cycle.compare(
+            results(0.001), results(0.005)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
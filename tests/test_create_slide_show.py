@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+import configparser
+
+from simple_media_player.__main__ import SimpleMediaPlayer
+from stubs import install_stubs
+
+
+# dvd-slideshow stub leaving partially written video and exit status
+DVD_SLIDE_SHOW_STUB = """
+import os, sys
+args = sys.argv[1:]
+name, folder = args[args.index('-n') + 1], args[args.index('-o') + 1]
+with open(os.path.join(folder, name + '.mp4'), 'w') as fp:
+    fp.write('partial')
+sys.exit(int(os.environ['STUB_EXIT_CODE']))
+"""
+
+
+class TestCreateSlideShow(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        install_stubs(self, {'dvd-slideshow': DVD_SLIDE_SHOW_STUB})
+
+        self.output = os.path.join(self.folder, 'videos')
+        os.makedirs(self.output)
+        config = configparser.ConfigParser()
+        config.read_dict({'simple_media_player': {
+            'created_slide_shows_path': self.output,
+            'cache_path': os.path.join(self.folder, 'cache'),
+            'image_display_duration': '5',
+            'slide_show_resolution': '640x480',
+            'preprocess_images': 'no'}})
+        self.player = SimpleMediaPlayer()
+        self.player.cfg = config['simple_media_player']
+
+        self.images = []
+        for i in range(2):
+            path = os.path.join(self.folder, '%d.png' % i)
+            with open(path, 'wb') as fp:
+                fp.write(bytes([i]) * 16)
+            self.images.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def create(self, exit_code):
+        os.environ['STUB_EXIT_CODE'] = str(exit_code)
+        return self.player.create_slide_show(self.images, (None, None))
+
+    def test_failed_encoding_is_not_cached(self):
+        self.assertIsNone(self.create(1))
+        self.assertEqual(
+            [name for name in os.listdir(self.output)
+             if name.endswith('.mp4')], [])
+
+        duration, path = self.create(0)
+        self.assertEqual(duration, 10)
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(path.endswith('.part.mp4'))
+
+    def test_successful_encoding_is_reused(self):
+        _, path = self.create(0)
+        self.assertEqual(self.create(1), (10, path))
+
+
+if __name__ == '__main__':
+    unittest.main()
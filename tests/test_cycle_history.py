@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from simple_media_player.history import CycleHistory
+
+
+def stages(download, encode, probe=1.0):
+    return {'download': download, 'playlist': download / 2,
+            'encode': encode, 'probe': probe, 'player_start': 0.5}
+
+
+class TestCycleHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'history.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_empty_history(self):
+        self.assertIsNone(CycleHistory(self.path).predict('12:00'))
+
+    def test_prediction_scales_with_images(self):
+        history = CycleHistory(self.path)
+        history.record('12:00', 10, 150.0, stages(10, 20))
+        history.record('12:00', 20, 300.0, stages(5, 20))
+
+        # 2 s per image of the first cycle applied to 20 images
+        self.assertEqual(history.predict('12:00'), (51.0, 300.0))
+
+    def test_slot_history_is_preferred(self):
+        history = CycleHistory(self.path)
+        history.record('09:00', 10, 150.0, stages(10, 10))
+        history.record('18:00', 40, 600.0, stages(10, 80))
+
+        self.assertEqual(history.predict('09:00'), (21.0, 150.0))
+        # unknown slot is predicted from all cycles
+        self.assertEqual(history.predict('12:00'), (91.0, 600.0))
+
+    def test_history_is_persisted(self):
+        history = CycleHistory(self.path, max_entries=2)
+        for download in (100, 10, 20):
+            history.record('12:00', 10, 150.0, stages(download, 10))
+
+        reloaded = CycleHistory(self.path)
+        self.assertEqual(len(reloaded), 2)
+        self.assertEqual(reloaded.predict('12:00'), (31.0, 150.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
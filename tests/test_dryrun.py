@@ -0,0 +1,72 @@
+import unittest
+import subprocess
+from datetime import datetime, timedelta
+
+from simple_media_player.dryrun import \
+    SimulatedProcess, CycleCosts, simulate, format_report
+from simple_media_player.process import wait_process
+from simple_media_player.timing import SimulatedClock
+
+
+START = datetime(2020, 1, 1)
+
+# 60 s of preparation and 300 s of playback without randomness
+COSTS = CycleCosts(20, 20.0, 2.0, 0.0, 0.0, 0.0)
+
+
+class TestSimulatedProcess(unittest.TestCase):
+
+    def test_wait_process_on_simulated_clock(self):
+        clock = SimulatedClock(START)
+        proc = SimulatedProcess(clock, 10)
+        self.assertEqual(wait_process(proc, 'stub', 20, clock=clock), 0)
+        self.assertEqual(clock.monotonic(), 10)
+
+        proc = SimulatedProcess(clock, float('inf'))
+        with self.assertRaises(subprocess.TimeoutExpired):
+            wait_process(proc, 'stub', 15, clock=clock)
+        self.assertEqual(clock.monotonic(), 15)
+        self.assertIsNotNone(proc.poll())
+
+
+class TestDryRun(unittest.TestCase):
+
+    def test_sparse_schedule(self):
+        reports, infeasible = simulate(
+            ['09:00', '12:00', '18:00'], costs=COSTS, start=START)
+
+        self.assertEqual(infeasible, [])
+        self.assertEqual([r.slot for r in reports], [
+            datetime(2020, 1, 1, 9), datetime(2020, 1, 1, 12),
+            datetime(2020, 1, 1, 18)])
+        # static offset is used before history is collected
+        self.assertEqual(reports[0].launched, datetime(2020, 1, 1, 8, 53))
+        self.assertEqual(reports[1].launched,
+                         datetime(2020, 1, 1, 12) - timedelta(seconds=420))
+        for r in reports:
+            self.assertFalse(r.missed)
+            self.assertFalse(r.overlap)
+            self.assertEqual(r.start_drift, 0)
+            self.assertEqual(r.end_drift, 0)
+
+    def test_dense_schedule(self):
+        reports, infeasible = simulate(
+            ['09:00', '09:05', '09:10'], costs=COSTS, start=START)
+
+        # the first cycle still runs when the second should be started
+        self.assertEqual(infeasible, ['09:05', '09:10'])
+        self.assertEqual([r.overlap for r in reports], [False, True, True])
+        self.assertEqual([r.missed for r in reports], [False, True, True])
+        self.assertEqual(reports[1].cut, 60)
+
+        report = format_report(reports, infeasible)
+        self.assertIn('overlaps: 2, missed: 2', report)
+        self.assertIn('infeasible slots: 09:05, 09:10', report)
+
+    def test_several_days(self):
+        reports, _ = simulate(['12:00'], costs=COSTS, start=START, days=3)
+        self.assertEqual([r.slot.day for r in reports], [1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import configparser
+from datetime import datetime, timedelta
+
+from simple_media_player.__main__ import SimpleMediaPlayer
+from simple_media_player.render import parse_profiles, select_profile
+from simple_media_player.wrapper import EncodingProfile
+
+
+PROFILES = 'high:25:medium:4M, normal:25:veryfast:, fast:15:ultrafast:1M'
+
+
+class TestEncodingProfiles(unittest.TestCase):
+
+    def setUp(self):
+        self.player = self.create_player('auto')
+
+    def create_player(self, profile):
+        config = configparser.ConfigParser()
+        config.read_dict({'simple_media_player': {
+            'encoding_profiles': PROFILES,
+            'encoding_profile': profile,
+            'expected_encoding_time': '60'}})
+        player = SimpleMediaPlayer()
+        player.cfg = config['simple_media_player']
+        return player
+
+    def select(self, seconds_left, video_duration=60):
+        end_playback = datetime.now() + timedelta(
+            seconds=seconds_left + video_duration)
+        return self.player.encoding_profile(video_duration, end_playback).name
+
+    def test_parse_profiles(self):
+        high, normal, fast = parse_profiles(PROFILES)
+        self.assertEqual(high, EncodingProfile('high', 25, 'medium', '4M'))
+        self.assertIsNone(normal.bitrate)
+        self.assertEqual(fast.fps, 15)
+
+        with self.assertRaises(ValueError):
+            parse_profiles('high:25:medium')
+        with self.assertRaises(ValueError):
+            parse_profiles('')
+
+    def test_select_profile(self):
+        profiles = parse_profiles(PROFILES)
+        estimates = {'high': 100, 'normal': 50, 'fast': 20}
+
+        def estimate(profile):
+            return estimates[profile.name]
+
+        self.assertEqual(select_profile(profiles, 200, estimate).name, 'high')
+        self.assertEqual(select_profile(profiles, 60, estimate).name,
+                         'normal')
+        self.assertEqual(select_profile(profiles, 10, estimate).name, 'fast')
+
+    def test_configured_profile(self):
+        player = self.create_player('normal')
+        self.assertEqual(player.encoding_profile(60, datetime.now()).name,
+                         'normal')
+
+        with self.assertRaises(ValueError):
+            self.create_player('unknown').encoding_profile(60)
+
+    def test_automatic_profile_before_measurement(self):
+        # the first profile is expected to take expected_encoding_time
+        self.assertEqual(self.select(61), 'high')
+        self.assertEqual(self.select(31), 'normal')
+        self.assertEqual(self.select(5), 'fast')
+        self.assertEqual(self.player.encoding_profile(60).name, 'high')
+
+    def test_automatic_profile_uses_measured_throughput(self):
+        # one second of encoding per video second using 'normal' profile
+        self.player.encoding_rate = 1 / 12.5
+        self.assertEqual(self.select(150), 'high')
+        self.assertEqual(self.select(100), 'normal')
+        self.assertEqual(self.select(59), 'fast')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+
+from simple_media_player.api.cache import ImageCache, file_digest
+from simple_media_player.api.images import RemoteImagesReceiver
+from simple_media_player.mockup.imageserver import \
+    ImagesRequestHandler, ThreadingHTTPServer
+
+
+class TestImageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache = ImageCache(os.path.join(self.folder, 'cache'),
+                                max_size=100)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def download(self, url, content):
+        path = self.cache.temp_file(url)
+        with open(path, 'wb') as fp:
+            fp.write(content)
+        return path
+
+    def test_content_addressing(self):
+        url1, url2 = 'http://host/a.png', 'http://host/b.png'
+        path1 = self.cache.store(url1, self.download(url1, b'1' * 10))
+        path2 = self.cache.store(url2, self.download(url2, b'1' * 10))
+
+        self.assertEqual(path1, path2)
+        self.assertEqual(os.path.basename(path1),
+                         file_digest(path1) + '.png')
+
+    def test_conditional_headers(self):
+        url = 'http://host/a.png'
+        headers = {'ETag': '"abc"', 'Last-Modified': 'yesterday'}
+        self.cache.store(url, self.download(url, b'data'), headers)
+
+        self.assertEqual(self.cache.conditional_headers(url),
+                         {'If-None-Match': '"abc"',
+                          'If-Modified-Since': 'yesterday'})
+
+    def test_freshness(self):
+        url = 'http://host/a.png'
+        started = time.time()
+        self.cache.store(url, self.download(url, b'data'),
+                         {'Cache-Control': 'max-age=60'})
+
+        entry = self.cache.lookup(url)
+        self.assertTrue(self.cache.is_fresh(entry))
+
+        self.cache.touch(url, {})
+        entry = self.cache.lookup(url)
+        self.assertFalse(self.cache.is_fresh(entry))
+        self.assertTrue(self.cache.is_fresh(entry, since=started))
+
+    def test_lru_eviction(self):
+        paths = []
+        for i in range(3):
+            url = 'http://host/%d.png' % i
+            paths.append(self.cache.store(url, self.download(url, bytes([i]) * 40)))
+        self.cache.touch('http://host/0.png')
+
+        self.cache.evict(keep=[paths[2]])
+
+        self.assertIsNotNone(self.cache.lookup('http://host/0.png'))
+        self.assertIsNone(self.cache.lookup('http://host/1.png'))
+        self.assertIsNotNone(self.cache.lookup('http://host/2.png'))
+        self.assertFalse(os.path.exists(paths[1]))
+
+    def test_index_persistence(self):
+        url = 'http://host/a.png'
+        path = self.cache.store(url, self.download(url, b'data'))
+        self.cache.save()
+
+        cache = ImageCache(self.cache.path)
+        self.assertEqual(cache.touch(url), path)
+
+
+class TestCachedImageReceiver(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        samples = os.path.join(self.folder, 'samples')
+        os.makedirs(samples)
+        for i in range(2):
+            with open(os.path.join(samples, '%d.png' % i), 'wb') as fp:
+                fp.write(bytes([i]) * 1024)
+
+        handler = type('Handler', (ImagesRequestHandler,),
+                       {'SAMPLE_IMAGES_FOLDER': samples})
+        self.server = ThreadingHTTPServer(('localhost', 0), handler)
+        threading.Thread(target=self.server.serve_forever).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_repeated_images_are_cached(self):
+        cache = ImageCache(os.path.join(self.folder, 'cache'))
+        receiver = RemoteImagesReceiver(
+            "http://localhost:%d/playlist" % self.server.server_port, self.folder,
+            infinite_retry=False, workers=4, cache=cache)
+
+        first = receiver.receive_images()
+        second = receiver.receive_images()
+
+        stored = [name for name in os.listdir(cache.path)
+                  if name.endswith('.png')]
+        self.assertLessEqual(len(stored), 2)
+        for path in first + second:
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(os.path.dirname(path), cache.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,17 +4,18 @@ import urllib3
 import tempfile
 import unittest
 import threading
-from http.server import HTTPServer
 
 from simple_media_player.api.images import RemoteImagesReceiver
-from simple_media_player.mockup.imageserver import ImagesRequestHandler, PORT
+from simple_media_player.api.retry import RetryPolicy
+from simple_media_player.mockup.imageserver import \
+    ImagesRequestHandler, ThreadingHTTPServer
 
 
 class TestImageServer(unittest.TestCase):
 
     def setUp(self):
-        self.playlist_url = "http://localhost:%d/playlist" % PORT
-        self.server = HTTPServer(('', PORT), ImagesRequestHandler)
+        self.server = ThreadingHTTPServer(('localhost', 0), ImagesRequestHandler)
+        self.playlist_url = "http://localhost:%d/playlist" % self.server.server_port
         threading.Thread(target=self.serve).start()
 
     def serve(self):
@@ -53,7 +54,8 @@ class TestImageServer(unittest.TestCase):
     def test_wrong_playlist_url_request(self):
         receiver = RemoteImagesReceiver(
             "http://wrong_url/playlist",
-            tempfile.gettempdir(), infinite_retry=False)
+            tempfile.gettempdir(), infinite_retry=False,
+            retry=RetryPolicy(max_attempts=10, base_delay=0.01))
         self.assertRaises(urllib3.exceptions.HTTPError, receiver.receive_images)
 
 
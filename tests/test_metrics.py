@@ -0,0 +1,138 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import threading
+import configparser
+
+import urllib3
+
+from simple_media_player.__main__ import SimpleMediaPlayer, PreparedShow
+from simple_media_player.metrics import Metrics, serve_metrics
+from simple_media_player.timing import StageTimer
+from simple_media_player.mockup.imageserver import \
+    ImagesRequestHandler, ThreadingHTTPServer
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.events = os.path.join(self.folder, 'events.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def read_events(self):
+        with open(self.events) as fp:
+            return [json.loads(line) for line in fp]
+
+    def test_render(self):
+        metrics = Metrics()
+        metrics.inc('smp_cycles_total', result='played')
+        metrics.inc('smp_cycles_total', 2, result='played')
+        metrics.set('smp_last_start_drift_seconds', 0.25)
+        metrics.observe('smp_stage_duration_seconds', 1.5, stage='encode')
+        metrics.observe('smp_stage_duration_seconds', 0.5, stage='encode')
+
+        self.assertEqual(metrics.get('smp_cycles_total', result='played'), 3)
+        self.assertEqual(metrics.render().splitlines(), [
+            '# TYPE smp_cycles_total counter',
+            'smp_cycles_total{result="played"} 3.0',
+            '# TYPE smp_last_start_drift_seconds gauge',
+            'smp_last_start_drift_seconds 0.25',
+            '# TYPE smp_stage_duration_seconds summary',
+            'smp_stage_duration_seconds_count{stage="encode"} 2',
+            'smp_stage_duration_seconds_sum{stage="encode"} 2.0'])
+
+        with self.assertRaises(ValueError):
+            metrics.set('smp_cycles_total', 1)
+
+    def test_span(self):
+        metrics = Metrics(self.events)
+        with metrics.span('download', receiver='sync') as trace:
+            trace['images'] = 3
+        with self.assertRaises(RuntimeError):
+            with metrics.span('encode'):
+                raise RuntimeError('failed')
+
+        download, encode = self.read_events()
+        self.assertEqual(download['event'], 'download')
+        self.assertEqual(download['receiver'], 'sync')
+        self.assertEqual(download['images'], 3)
+        self.assertGreaterEqual(download['duration'], 0)
+        self.assertNotIn('error', download)
+        self.assertIn('failed', encode['error'])
+
+    def test_endpoint(self):
+        metrics = Metrics()
+        metrics.inc('smp_cycles_total', result='played')
+        server = serve_metrics(metrics, 0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        http = urllib3.PoolManager()
+        base = 'http://localhost:%d' % server.server_port
+        r = http.request('GET', base + '/metrics')
+        self.assertEqual(r.status, 200)
+        self.assertIn(b'smp_cycles_total{result="played"} 1.0', r.data)
+        self.assertEqual(http.request('GET', base + '/other').status, 404)
+
+    def test_download_metrics(self):
+        samples = os.path.join(self.folder, 'samples')
+        os.makedirs(samples)
+        with open(os.path.join(samples, 'image.png'), 'wb') as fp:
+            fp.write(b'0' * 1000)
+
+        handler = type('Handler', (ImagesRequestHandler,), {
+            'SAMPLE_IMAGES_FOLDER': samples, 'PLAYLIST_SIZE': 3})
+        server = ThreadingHTTPServer(('localhost', 0), handler)
+        threading.Thread(target=server.serve_forever).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        config = configparser.ConfigParser()
+        config.read_dict({'simple_media_player': {
+            'images_api': 'http://localhost:%d/playlist' % server.server_port,
+            'downloaded_images_path': self.folder,
+            'image_cache_size': '0',
+            'metrics_events_path': self.events}})
+        player = SimpleMediaPlayer()
+        player.cfg = config['simple_media_player']
+        player.setup_metrics()
+
+        self.assertEqual(len(player.download_images()), 3)
+        self.assertEqual(
+            player.metrics.get('smp_downloaded_bytes_total'), 3000)
+        self.assertEqual(player.metrics.get('smp_downloaded_images_total'), 3)
+        self.assertEqual(player.metrics.get('smp_download_retries_total'), 0)
+
+        event, = self.read_events()
+        self.assertEqual(event['event'], 'download')
+        self.assertEqual(event['bytes'], 3000)
+        self.assertFalse(event['failed'])
+
+    def test_cycle_metrics(self):
+        player = SimpleMediaPlayer()
+        player.metrics.events_path = self.events
+        timings = StageTimer()
+        timings.add('encode', 2.0)
+        player.start_drift, player.end_drift = 0.01, -0.02
+        player.record_cycle(
+            PreparedShow('video.mp4', 10, 10.0, timings), 10.0)
+
+        self.assertEqual(player.metrics.get(
+            'smp_stage_duration_seconds', stage='encode'), (1, 2.0))
+        self.assertEqual(player.metrics.get('smp_start_drift_seconds'),
+                         (1, 0.01))
+        self.assertEqual(player.metrics.get('smp_last_end_drift_seconds'),
+                         -0.02)
+
+        event, = self.read_events()
+        self.assertEqual(event['event'], 'playback')
+        self.assertEqual(event['stages'], {'encode': 2.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+
+import urllib3
+
+from simple_media_player.mockup.imageserver import \
+    ImagesRequestHandler, ThreadingHTTPServer
+
+
+class TestMockupServer(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        with open(os.path.join(self.folder, 'image.png'), 'wb') as fp:
+            fp.write(bytes(range(256)) * 4)
+        self.servers = []
+        self.http = urllib3.PoolManager(retries=False)
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def serve(self, **attributes):
+        attributes['SAMPLE_IMAGES_FOLDER'] = self.folder
+        handler = type('Handler', (ImagesRequestHandler,), attributes)
+        server = ThreadingHTTPServer(('localhost', 0), handler)
+        threading.Thread(target=server.serve_forever).start()
+        self.servers.append(server)
+        return 'http://localhost:%d' % server.server_port
+
+    def get(self, url, **headers):
+        return self.http.request('GET', url, headers=headers)
+
+    def test_conditional_requests(self):
+        url = self.serve() + '/img/image.png'
+        r = self.get(url)
+        self.assertEqual(r.status, 200)
+        self.assertEqual(len(r.data), 1024)
+        etag = r.headers['ETag']
+        last_modified = r.headers['Last-Modified']
+
+        self.assertEqual(self.get(url, **{'If-None-Match': etag}).status, 304)
+        self.assertEqual(self.get(
+            url, **{'If-Modified-Since': last_modified}).status, 304)
+        self.assertEqual(self.get(
+            url, **{'If-None-Match': '"other"'}).status, 200)
+
+    def test_range_requests(self):
+        url = self.serve() + '/img/image.png'
+        r = self.get(url, Range='bytes=1000-')
+        self.assertEqual(r.status, 206)
+        self.assertEqual(r.headers['Content-Range'], 'bytes 1000-1023/1024')
+        self.assertEqual(r.data, (bytes(range(256)) * 4)[1000:])
+
+        r = self.get(url, Range='bytes=-4')
+        self.assertEqual(r.status, 206)
+        self.assertEqual(len(r.data), 4)
+
+        r = self.get(url, Range='bytes=2000-')
+        self.assertEqual(r.status, 416)
+        self.assertEqual(r.headers['Content-Range'], 'bytes */1024')
+
+    def test_if_range(self):
+        url = self.serve() + '/img/image.png'
+        etag = self.get(url).headers['ETag']
+
+        r = self.get(url, **{'Range': 'bytes=10-', 'If-Range': etag})
+        self.assertEqual(r.status, 206)
+        r = self.get(url, **{'Range': 'bytes=10-', 'If-Range': '"stale"'})
+        self.assertEqual(r.status, 200)
+        self.assertEqual(len(r.data), 1024)
+
+    def test_playlist(self):
+        base = self.serve(BATCH_RESOLVE=False)
+        playlist = json.loads(self.get(base + '/playlist').data.decode())
+        self.assertNotIn('resolve', playlist)
+        self.assertTrue(all(entry == base + '/random_image'
+                            for entry in playlist['playlist']))
+        url = json.loads(self.get(base + '/random_image').data.decode())['url']
+        self.assertEqual(url, base + '/img/image.png')
+        self.assertEqual(self.get(base + '/unknown').status, 404)
+
+    def test_error_rate(self):
+        base = self.serve(ERROR_RATE=1.0)
+        self.assertEqual(self.get(base + '/playlist').status, 503)
+        base = self.serve(ERROR_RATE=0.0)
+        self.assertEqual(self.get(base + '/playlist').status, 200)
+
+    def test_latency_and_bandwidth(self):
+        base = self.serve(LATENCY=0.2, BANDWIDTH=2048)
+        started = time.monotonic()
+        r = self.get(base + '/img/image.png')
+        elapsed = time.monotonic() - started
+        self.assertEqual(r.status, 200)
+        self.assertEqual(len(r.data), 1024)
+        self.assertGreaterEqual(elapsed, 0.2 + 0.4)
+
+
+if __name__ == '__main__':
+    unittest.main()
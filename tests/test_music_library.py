@@ -0,0 +1,97 @@
+import os
+import shutil
+import random
+import tempfile
+import unittest
+
+from simple_media_player.music import MusicLibrary
+from simple_media_player.wrapper import MediaInfo
+
+
+class TestMusicLibrary(unittest.TestCase):
+
+    DURATIONS = {'a.mp3': 100, 'b.mp3': 70, 'c.ogg': 40, 'd.wav': 200}
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.music = os.path.join(self.folder, 'music')
+        os.makedirs(self.music)
+        for name in self.DURATIONS:
+            with open(os.path.join(self.music, name), 'wb') as fp:
+                fp.write(b'music')
+        with open(os.path.join(self.music, 'cover.jpg'), 'wb') as fp:
+            fp.write(b'image')
+
+        self.index_path = os.path.join(self.folder, 'music.json')
+        self.probed = []
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def probe(self, path):
+        self.probed.append(os.path.basename(path))
+        duration = self.DURATIONS[os.path.basename(path)]
+        return MediaInfo(duration, 'mp3', None, None, None, None, 'mp3')
+
+    def create_library(self):
+        return MusicLibrary(self.music, self.index_path, self.probe)
+
+    def test_index_is_persisted(self):
+        library = self.create_library()
+        library.refresh()
+
+        self.assertEqual(sorted(self.probed), sorted(self.DURATIONS))
+        self.assertEqual([t['duration'] for t in library.tracks],
+                         [100, 70, 40, 200])
+
+        self.probed.clear()
+        library = self.create_library()
+        library.refresh()
+        self.assertEqual(self.probed, [])
+        self.assertEqual(len(library.tracks), 4)
+
+    def test_only_new_files_are_probed(self):
+        self.create_library().refresh()
+        self.probed.clear()
+
+        os.remove(os.path.join(self.music, 'd.wav'))
+        with open(os.path.join(self.music, 'e.mp3'), 'wb') as fp:
+            fp.write(b'music')
+        os.utime(self.music, (0, 0))
+        self.DURATIONS = dict(self.DURATIONS, **{'e.mp3': 30})
+
+        library = self.create_library()
+        library.refresh()
+
+        self.assertEqual(self.probed, ['e.mp3'])
+        self.assertEqual([os.path.basename(t['path']) for t in library.tracks],
+                         ['a.mp3', 'b.mp3', 'c.ogg', 'e.mp3'])
+
+    def test_select_single_track(self):
+        tracks, total = self.create_library().select(190, random.Random(1))
+
+        self.assertEqual([os.path.basename(t) for t in tracks], ['d.wav'])
+        self.assertEqual(total, 200)
+
+    def test_select_several_tracks(self):
+        tracks, total = self.create_library().select(105, random.Random(1))
+
+        self.assertEqual(total, 110)
+        self.assertEqual(sorted(os.path.basename(t) for t in tracks),
+                         ['b.mp3', 'c.ogg'])
+
+    def test_select_repeats_short_library(self):
+        tracks, total = self.create_library().select(1000, random.Random(1))
+
+        self.assertGreaterEqual(total, 1000)
+        self.assertEqual(len(tracks), 12)
+
+    def test_empty_library(self):
+        for name in self.DURATIONS:
+            os.remove(os.path.join(self.music, name))
+
+        self.assertEqual(self.create_library().select(100), ([], 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import unittest
+import threading
+import configparser
+
+from simple_media_player.__main__ import SimpleMediaPlayer
+
+
+class FakeRenderer:
+    """Segment renderer stub recording submitted segments."""
+
+    def __init__(self):
+        self.submitted = []
+        self.event = threading.Event()
+        self.closed = False
+
+    def submit(self, segment):
+        self.submitted.append(segment)
+        self.event.set()
+
+    def close(self):
+        self.closed = True
+
+
+class TestPipelinedCycle(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.images = []
+        for i in range(4):
+            path = os.path.join(self.folder, '%d.png' % i)
+            with open(path, 'wb') as fp:
+                fp.write(bytes([i]) * 16)
+            self.images.append(path)
+
+        config = configparser.ConfigParser()
+        config.read_dict({'simple_media_player': {
+            'image_display_duration': '5',
+            'preprocess_images': 'no'}})
+        self.player = SimpleMediaPlayer()
+        self.player.cfg = config['simple_media_player']
+
+        self.renderer = FakeRenderer()
+        self.created = []
+        self.player.create_renderer = lambda profile=None: self.renderer
+        self.player.load_music_library = lambda: None
+        self.player.create_slide_show = self.create_slide_show
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def create_slide_show(self, image_paths, music=None, renderer=None,
+                          end_playback=None):
+        self.created.append((image_paths, renderer))
+        return len(image_paths) * 5, 'video.mp4'
+
+    def test_segments_are_submitted_while_downloading(self):
+        overlapped = []
+
+        def download_images(on_image=None, end_playback=None):
+            on_image(0, self.images[0])
+            on_image(1, self.images[1])
+            overlapped.append(self.renderer.event.wait(5))
+            on_image(2, self.images[2])
+            on_image(3, self.images[3])
+            return self.images
+
+        self.player.download_images = download_images
+        result = self.player.download_and_create_slide_show()
+
+        self.assertEqual(overlapped, [True])
+        self.assertEqual(result, (20, 'video.mp4'))
+        self.assertEqual(self.created, [(self.images, self.renderer)])
+        self.assertEqual(self.renderer.submitted[0].images[0], self.images[0])
+        self.assertTrue(self.renderer.closed)
+
+    def test_missing_image_does_not_block_cycle(self):
+        received = [self.images[0], self.images[1], self.images[3]]
+
+        def download_images(on_image=None, end_playback=None):
+            on_image(0, self.images[0])
+            on_image(1, self.images[1])
+            # image 2 cannot be retrieved
+            on_image(3, self.images[3])
+            return received
+
+        self.player.download_images = download_images
+        result = self.player.download_and_create_slide_show()
+
+        self.assertEqual(result, (15, 'video.mp4'))
+        self.assertEqual(self.created, [(received, self.renderer)])
+        self.assertTrue(self.renderer.closed)
+
+    def test_failed_download(self):
+        self.player.download_images = \
+            lambda on_image=None, end_playback=None: None
+        self.assertIsNone(self.player.download_and_create_slide_show())
+        self.assertEqual(self.created, [])
+        self.assertTrue(self.renderer.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from simple_media_player.wrapper import SlideShowPlayer
+from stubs import install_stubs
+
+
+# stub of mpv serving JSON IPC protocol and recording received commands
+MPV_STUB = """
+import os, sys, json, socket
+path = [a for a in sys.argv if a.startswith('--input-ipc-server=')][0]
+server = socket.socket(socket.AF_UNIX)
+server.bind(path.split('=', 1)[1])
+server.listen(1)
+conn, _ = server.accept()
+for line in conn.makefile('rb'):
+    request = json.loads(line.decode())
+    with open(os.environ['STUB_COMMANDS'], 'a') as fp:
+        fp.write(json.dumps(request['command']) + '\\n')
+    event = {'event': 'idle'}
+    response = {'request_id': request['request_id'], 'error': 'success'}
+    conn.sendall((json.dumps(event) + '\\n' + json.dumps(response) + '\\n').encode())
+"""
+
+
+class TestMpvController(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.commands = os.path.join(self.folder, 'commands')
+        install_stubs(self, {'mpv': MPV_STUB}, STUB_COMMANDS=self.commands)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_playback_commands(self):
+        player = SlideShowPlayer(self.folder)
+        player.fullscreen()
+        player.mpv()
+
+        controller = player.controller(os.path.join(self.folder, 'mpv.sock'))
+        controller.start()
+        self.addCleanup(controller.close)
+        self.assertTrue(controller.running)
+
+        controller.load('video.mp4')
+        controller.play()
+        controller.stop()
+
+        with open(self.commands) as fp:
+            commands = [json.loads(line) for line in fp]
+
+        self.assertEqual(commands, [
+            ['set_property', 'pause', True],
+            ['loadfile', 'video.mp4', 'replace'],
+            ['set_property', 'pause', False],
+            ['stop']
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from simple_media_player.slideshow.preprocess import ImagePreprocessor
+from stubs import install_stubs
+
+
+# stub of ImageMagick convert copying source image and recording calls
+CONVERT_STUB = """
+import os, sys, shutil
+with open(os.environ['STUB_CALLS'], 'a') as fp:
+    fp.write(' '.join(sys.argv[1:]) + '\\n')
+source = sys.argv[1]
+if source.endswith('[0]'):
+    source = source[:-3]
+if 'broken' in source:
+    sys.exit(1)
+shutil.copy(source, sys.argv[-1])
+"""
+
+
+class TestImagePreprocessor(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.calls = os.path.join(self.folder, 'calls')
+        install_stubs(self, {'convert': CONVERT_STUB}, STUB_CALLS=self.calls)
+
+        self.images = []
+        for name in ('a.jpg', 'b.png', 'broken.jpg'):
+            path = os.path.join(self.folder, name)
+            with open(path, 'wb') as fp:
+                fp.write(name.encode())
+            self.images.append(path)
+
+        self.output = os.path.join(self.folder, 'preprocessed')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def convert_calls(self):
+        if not os.path.exists(self.calls):
+            return []
+        with open(self.calls) as fp:
+            return fp.read().splitlines()
+
+    def test_images_are_normalized_and_cached(self):
+        preprocessor = ImagePreprocessor(self.output, '1280x720', workers=2)
+        processed = preprocessor.process_all(self.images)
+
+        self.assertEqual(len(self.convert_calls()), 3)
+        self.assertIn('-resize 1280x720>', self.convert_calls()[0])
+
+        for source, path in zip(self.images[:2], processed[:2]):
+            self.assertEqual(os.path.dirname(path), self.output)
+            with open(source, 'rb') as a, open(path, 'rb') as b:
+                self.assertEqual(a.read(), b.read())
+
+        # image which cannot be converted is used as is
+        self.assertEqual(processed[2], self.images[2])
+
+        again = ImagePreprocessor(self.output, '1280x720')
+        self.assertEqual(again.process_all(self.images[:2]), processed[:2])
+        self.assertEqual(again.process_all(processed[:2]), processed[:2])
+        self.assertEqual(len(self.convert_calls()), 3)
+
+    def test_resolution_is_part_of_key(self):
+        ImagePreprocessor(self.output, '1280x720').process_all(self.images[:1])
+        ImagePreprocessor(self.output, '1920x1080').process_all(self.images[:1])
+
+        self.assertEqual(len(self.convert_calls()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
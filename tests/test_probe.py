@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from simple_media_player.wrapper import ProbeCache, probe
+from stubs import install_stubs
+
+
+# stub of ffprobe counting its calls
+FFPROBE_STUB = """
+import os, json
+with open(os.environ['STUB_CALLS'], 'a') as fp:
+    fp.write('ffprobe\\n')
+print(json.dumps({
+    'format': {'duration': '12.500000', 'format_name': 'mp3',
+               'bit_rate': '128000'},
+    'streams': [{'codec_type': 'audio', 'codec_name': 'mp3'}]
+}))
+"""
+
+
+class TestProbe(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.calls = os.path.join(self.folder, 'calls')
+        install_stubs(self, {'ffprobe': FFPROBE_STUB}, STUB_CALLS=self.calls)
+
+        self.music = os.path.join(self.folder, 'music.mp3')
+        with open(self.music, 'wb') as fp:
+            fp.write(b'music')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def probe_calls(self):
+        with open(self.calls) as fp:
+            return len(fp.readlines())
+
+    def test_probe(self):
+        info = probe(self.music)
+
+        self.assertEqual(info.duration, 12.5)
+        self.assertEqual(info.bitrate, 128000)
+        self.assertEqual(info.audio_codec, 'mp3')
+        self.assertIsNone(info.video_codec)
+
+    def test_probe_cache(self):
+        cache_path = os.path.join(self.folder, 'probe.json')
+        cache = ProbeCache(cache_path)
+
+        self.assertEqual(cache.probe(self.music).duration, 12.5)
+        self.assertEqual(ProbeCache(cache_path).probe(self.music).duration,
+                         12.5)
+        self.assertEqual(self.probe_calls(), 1)
+
+        with open(self.music, 'ab') as fp:
+            fp.write(b'changed')
+        cache.probe(self.music)
+        self.assertEqual(self.probe_calls(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import sys
+import time
+import unittest
+import subprocess
+
+from simple_media_player import process
+from simple_media_player.process import Progress, parse_progress, wait_process
+
+
+def spawn(source):
+    return subprocess.Popen([sys.executable, '-c', source],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+
+class TestParseProgress(unittest.TestCase):
+
+    def test_parse_progress(self):
+        self.assertEqual(parse_progress('[dvd-slideshow] Image 3 of 10'),
+                         Progress(3, 10))
+        self.assertEqual(parse_progress('frame 4/8'), Progress(4, 8))
+        self.assertEqual(parse_progress(
+            'frame=  250 fps=50 size=1024kB time=00:01:02.50 bitrate=1kbit/s'),
+            Progress(62.5, None))
+        self.assertIsNone(parse_progress('Encoding audio'))
+        self.assertIsNone(parse_progress('resolution 1920/1080'))
+
+
+class TestWaitProcess(unittest.TestCase):
+
+    def test_progress_and_status(self):
+        proc = spawn('import sys\n'
+                     'for i in range(1, 4): print("image %d of 3" % i)\n'
+                     'sys.exit(2)')
+        reported = []
+        status = wait_process(proc, 'stub', time.monotonic() + 10,
+                              reported.append)
+        self.assertEqual(status, 2)
+        self.assertEqual(reported, [Progress(i, 3) for i in range(1, 4)])
+
+    def test_timeout_is_counted_from_start(self):
+        # process keeps writing output, so timeout cannot wait for its end
+        proc = spawn('import time\n'
+                     'while True:\n'
+                     '    print("working", flush=True)\n'
+                     '    time.sleep(0.01)')
+        started = time.monotonic()
+        with self.assertRaises(subprocess.TimeoutExpired):
+            wait_process(proc, 'stub', started + 0.5)
+        self.assertLess(time.monotonic() - started, 3)
+        self.assertIsNotNone(proc.poll())
+
+    def test_logging_is_rate_limited(self):
+        proc = spawn('for i in range(1000): print("line", i)')
+        with self.assertLogs(process.log, 'DEBUG') as logs:
+            status = wait_process(proc, 'stub', time.monotonic() + 10)
+        self.assertEqual(status, 0)
+        self.assertLessEqual(len(logs.output), 3)
+        self.assertIn('line 999', logs.output[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import configparser
+
+from simple_media_player.__main__ import SimpleMediaPlayer
+from simple_media_player.render import SegmentRenderer
+from simple_media_player.slideshow.builder import SlideShowBuilder
+from simple_media_player.slideshow.config import TransitionDirection
+from simple_media_player.wrapper import FfmpegBackend, EncodingProfile
+from stubs import install_stubs
+
+
+# ffmpeg stub recording its arguments and writing them into output file
+FFMPEG_STUB = """
+import os, sys, json
+args = sys.argv[1:]
+with open(os.environ['STUB_CALLS'], 'a') as fp:
+    fp.write(json.dumps(args) + '\\n')
+with open(args[-1], 'w') as fp:
+    fp.write(json.dumps(args))
+"""
+
+
+class TestFilterGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = FfmpegBackend('/tmp', '640x480')
+        self.builder = SlideShowBuilder()
+        self.builder.image('a.png', 5).cross_fade(2)
+        self.builder.image('b.png', 5).fade_out(1).fade_in(1)
+        self.builder.image('c.png', 5).wipe(2, d=TransitionDirection.Up)
+        self.builder.image('d.png', 0).fade_out(2)
+
+    def test_clips(self):
+        clips = self.backend.clips(self.builder.entries)
+
+        self.assertEqual([c['path'] for c in clips],
+                         ['a.png', 'b.png', 'c.png', 'd.png'])
+        self.assertEqual([c['length'] for c in clips], [7, 8, 8, 4])
+        self.assertEqual([c['fade_in'] for c in clips], [0, 0, 1, 0])
+        self.assertEqual([c['fade_out'] for c in clips], [0, 1, 0, 2])
+        self.assertIsNone(clips[0]['blend'])
+        self.assertIsNotNone(clips[1]['blend'])
+        self.assertIsNone(clips[2]['blend'])
+
+    def test_filter_graph(self):
+        clips = self.backend.clips(self.builder.entries)
+        graph, label, duration = self.backend.filter_graph(clips)
+
+        # video is as long as all entries of slide show together
+        self.assertEqual(duration, sum(
+            e.duration for e in self.builder.entries))
+        self.assertEqual(label, 'v3')
+        self.assertIn('[c0][c1]xfade=transition=fade:duration=2:offset=5[v1]',
+                      graph)
+        self.assertIn('[v1][c2]concat=n=2:v=1:a=0[v2]', graph)
+        self.assertIn(
+            '[v2][c3]xfade=transition=wipeup:duration=2:offset=19[v3]', graph)
+        self.assertIn('fade=t=out:st=7:d=1[c1]', graph)
+        self.assertIn('fade=t=in:st=0:d=1[c2]', graph)
+        self.assertIn('scale=640:480', graph)
+
+    def test_single_image(self):
+        clips = self.backend.clips(
+            SlideShowBuilder().fade_in(1).image('a.png', 5).entries)
+        graph, label, duration = self.backend.filter_graph(clips)
+
+        self.assertEqual(label, 'c0')
+        self.assertEqual(duration, 6)
+
+
+class TestFfmpegBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.calls = os.path.join(self.folder, 'calls')
+        install_stubs(self, {'ffmpeg': FFMPEG_STUB}, STUB_CALLS=self.calls)
+
+        self.images = []
+        for i in range(3):
+            path = os.path.join(self.folder, '%d.png' % i)
+            with open(path, 'wb') as fp:
+                fp.write(bytes([i]) * 16)
+            self.images.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def encoder_calls(self):
+        if not os.path.exists(self.calls):
+            return []
+        with open(self.calls) as fp:
+            return [json.loads(line) for line in fp]
+
+    def test_slide_show_is_encoded_in_one_pass(self):
+        output = os.path.join(self.folder, 'videos')
+        os.makedirs(output)
+        config = configparser.ConfigParser()
+        config.read_dict({'simple_media_player': {
+            'created_slide_shows_path': output,
+            'cache_path': os.path.join(self.folder, 'cache'),
+            'image_display_duration': '5',
+            'slide_show_resolution': '640x480',
+            'preprocess_images': 'no',
+            'render_backend': 'ffmpeg'}})
+        player = SimpleMediaPlayer()
+        player.cfg = config['simple_media_player']
+
+        music = os.path.join(self.folder, 'music.mp3')
+        open(music, 'wb').close()
+
+        duration, path = player.create_slide_show(self.images, ([music], 60))
+
+        calls = self.encoder_calls()
+        self.assertEqual(len(calls), 1)
+        args = calls[0]
+        self.assertEqual(args[-1], os.path.join(
+            output, os.path.basename(path).replace('.mp4', '.part.mp4')))
+        for image in self.images:
+            self.assertIn(image, args)
+        self.assertIn('-filter_complex', args)
+        self.assertEqual(args[args.index(music) - 1], '-i')
+        self.assertIn('[music]', args)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(sorted(os.listdir(output)),
+                         [os.path.basename(path)])
+
+    def test_segments_are_encoded_by_backend(self):
+        folder = os.path.join(self.folder, 'segments')
+        renderer = SegmentRenderer(
+            folder, '640x480',
+            backend=FfmpegBackend(folder, '640x480'))
+        self.addCleanup(renderer.close)
+        builder = SlideShowBuilder().image(self.images[0], 5).cross_fade(2)
+        builder.image(self.images[1], 5)
+
+        segments = [renderer.render_segment(segment)
+                    for segment in builder.segments()]
+
+        self.assertEqual(len(self.encoder_calls()), 2)
+        for path in segments:
+            self.assertTrue(os.path.exists(path))
+
+    def test_encoding_profile(self):
+        backend = FfmpegBackend(self.folder, '640x480', EncodingProfile(
+            'fast', 15, 'ultrafast', '1M'))
+        proc = backend.encode(
+            'video', SlideShowBuilder().image(self.images[0], 5))
+        proc.communicate()
+
+        args = self.encoder_calls()[0]
+        self.assertEqual(args[args.index('-preset') + 1], 'ultrafast')
+        self.assertEqual(args[args.index('-b:v') + 1], '1M')
+        self.assertEqual(args[args.index('-r') + 1], '15')
+        self.assertIn('fps=15', args[args.index('-filter_complex') + 1])
+
+    def test_empty_slide_show(self):
+        backend = FfmpegBackend(self.folder)
+        with self.assertRaises(ValueError):
+            backend.encode('empty', SlideShowBuilder().fade_out(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
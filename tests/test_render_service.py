@@ -0,0 +1,257 @@
+import os
+import json
+import socket
+import shutil
+import tempfile
+import unittest
+import threading
+import configparser
+
+import urllib3
+from urllib3.exceptions import HTTPError
+
+from simple_media_player.__main__ import SimpleMediaPlayer, PreparedShow
+from simple_media_player.api.video import RemoteVideoReceiver
+from simple_media_player.api.retry import RetryPolicy
+from simple_media_player.metrics import ThreadingHTTPServer
+from simple_media_player.mockup.renderserver import VideoRequestHandler
+from simple_media_player.render_service import \
+    RenderService, SlideShowRequestHandler, create_handler
+from simple_media_player.timing import StageTimer
+
+
+VIDEO = bytes(range(256)) * 512
+
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+class QuietVideoHandler(VideoRequestHandler):
+
+    DURATION = 42.0
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestRenderService(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.videos = os.path.join(self.folder, 'rendered')
+        os.makedirs(self.videos)
+        handler = type('Handler', (QuietVideoHandler,), {
+            'VIDEOS_FOLDER': self.videos})
+        self.server = ThreadingHTTPServer(('localhost', 0), handler)
+        threading.Thread(target=self.server.serve_forever).start()
+        self.api = 'http://localhost:%d/slide_show' % self.server.server_port
+        self.downloads = os.path.join(self.folder, 'downloads')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def render(self, version, content=VIDEO):
+        path = os.path.join(self.videos, version + '.mp4')
+        with open(path, 'wb') as fp:
+            fp.write(content)
+        mtime = len(os.listdir(self.videos))
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def create_receiver(self, api=None):
+        return RemoteVideoReceiver(
+            api or self.api, self.downloads,
+            retry=RetryPolicy(max_attempts=2, base_delay=0.01))
+
+    def test_rendered_video_is_downloaded_once(self):
+        self.render('abc')
+        receiver = self.create_receiver()
+
+        path, duration = receiver.receive_video()
+        self.assertEqual(duration, 42.0)
+        self.assertEqual(os.path.basename(path), 'abc.mp4')
+        with open(path, 'rb') as fp:
+            self.assertEqual(fp.read(), VIDEO)
+        self.assertEqual(receiver.stats['bytes'], len(VIDEO))
+
+        self.assertEqual(receiver.receive_video()[0], path)
+        self.assertEqual(receiver.stats['bytes'], 0)
+
+    def test_old_versions_are_removed(self):
+        receiver = self.create_receiver()
+        for version in ('v1', 'v2', 'v3'):
+            self.render(version)
+            receiver.receive_video()
+
+        self.assertEqual(sorted(os.listdir(self.downloads)),
+                         ['v2.mp4', 'v3.mp4'])
+
+    def test_unavailable_service(self):
+        # there are no rendered videos yet
+        with self.assertRaises(HTTPError):
+            self.create_receiver().receive_video()
+
+        api = 'http://localhost:%d/slide_show' % closed_port()
+        with self.assertRaises(HTTPError):
+            self.create_receiver(api).receive_video()
+
+    def create_player(self, api):
+        config = configparser.ConfigParser()
+        config.read_dict({'simple_media_player': {
+            'images_api': 'http://localhost:1/playlist',
+            'render_service_api': api,
+            'cache_path': os.path.join(self.folder, 'cache'),
+            'retry_base_delay': '0.01'}})
+        player = SimpleMediaPlayer()
+        player.cfg = config['simple_media_player']
+        player.probe = lambda path: type('Info', (), {'duration': 60.0})
+        return player
+
+    def test_player_uses_rendered_slide_show(self):
+        path = self.render('abc')
+        player = self.create_player(self.api)
+        player.download_images = lambda **kwargs: self.fail('rendered')
+
+        show = player.prepare()
+
+        self.assertEqual(show.estimated_duration, 42.0)
+        with open(show.path, 'rb') as fp, open(path, 'rb') as expected:
+            self.assertEqual(fp.read(), expected.read())
+        self.assertIn('download', player.timings.durations)
+
+    def test_player_renders_locally_if_service_is_down(self):
+        player = self.create_player(
+            'http://localhost:%d/slide_show' % closed_port())
+        local = os.path.join(self.folder, 'local.mp4')
+        player.download_images = lambda **kwargs: ['image.png']
+        player.create_slide_show = \
+            lambda images, end_playback=None: (15, local)
+
+        show = player.prepare()
+
+        self.assertEqual(show.path, local)
+        self.assertEqual(show.estimated_duration, 15)
+        self.assertEqual(player.metrics.get(
+            'smp_render_service_failures_total'), 1)
+
+
+class TestRenderOnce(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.prepared = 0
+        self.fail_preparation = False
+        self.ready = threading.Event()
+        self.ready.set()
+        self.player = SimpleMediaPlayer()
+        self.player.prepare = self.prepare
+        self.player.cfg = {'created_slide_shows_path': self.folder}
+
+    def tearDown(self):
+        self.ready.set()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def create_service(self, max_age):
+        service = RenderService(self.player, max_age)
+        self.addCleanup(service.close)
+        return service
+
+    def prepare(self, end_playback=None):
+        # encoding lasts until test lets it finish
+        self.ready.wait()
+        if self.fail_preparation:
+            return None
+        self.prepared += 1
+        path = os.path.join(self.folder, '%d.mp4' % self.prepared)
+        open(path, 'wb').close()
+        return PreparedShow(path, 60, 61.0, StageTimer())
+
+    def path(self, index):
+        return os.path.join(self.folder, '%d.mp4' % index)
+
+    def test_requests_do_not_wait_for_preparation(self):
+        service = self.create_service(max_age=60)
+        self.ready.clear()
+
+        # there is no slide show until the first one is prepared
+        for _ in range(8):
+            self.assertIsNone(service.current())
+        preparation = service.refresh()
+        self.ready.set()
+        preparation.result()
+
+        self.assertEqual(self.prepared, 1)
+        self.assertEqual(service.current(), (self.path(1), 61.0))
+        self.assertEqual(self.prepared, 1)
+
+    def test_stale_slide_show_is_served_while_next_one_is_prepared(self):
+        service = self.create_service(max_age=0)
+        service.refresh().result()
+
+        self.ready.clear()
+        for _ in range(8):
+            self.assertEqual(service.current(), (self.path(1), 61.0))
+        preparation = service.refresh()
+        self.ready.set()
+        preparation.result()
+
+        self.assertEqual(self.prepared, 2)
+        self.assertEqual(service.current()[0], self.path(2))
+
+    def test_previous_slide_show_is_served_if_preparation_fails(self):
+        service = self.create_service(max_age=0)
+        service.refresh().result()
+
+        self.fail_preparation = True
+        service.refresh().result()
+        self.assertEqual(service.current()[0], self.path(1))
+
+        os.remove(self.path(1))
+        self.assertIsNone(service.current())
+
+    def test_default_handler_has_no_slide_show(self):
+        server = ThreadingHTTPServer(('localhost', 0), type(
+            'Handler', (SlideShowRequestHandler,), {
+                'log_message': lambda self, format, *args: None}))
+        threading.Thread(target=server.serve_forever).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        r = urllib3.PoolManager(retries=False).request(
+            'GET', 'http://localhost:%d/slide_show' % server.server_port,
+            timeout=5)
+        self.assertEqual(r.status, 503)
+
+    def test_service_is_unavailable_until_slide_show_is_prepared(self):
+        service = self.create_service(max_age=60)
+        self.ready.clear()
+        handler = type('Handler', (create_handler(service),), {
+            'log_message': lambda self, format, *args: None})
+        server = ThreadingHTTPServer(('localhost', 0), handler)
+        threading.Thread(target=server.serve_forever).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = 'http://localhost:%d/slide_show' % server.server_port
+        http = urllib3.PoolManager(retries=False)
+
+        r = http.request('GET', url, timeout=5)
+        self.assertEqual(r.status, 503)
+
+        self.ready.set()
+        service.refresh().result()
+        r = http.request('GET', url, timeout=5)
+        self.assertEqual(r.status, 200)
+        self.assertEqual(json.loads(r.data.decode('utf8')), {
+            'version': '1', 'url': '/videos/1.mp4', 'duration': 61.0})
+        r = http.request('GET', 'http://localhost:%d/videos/1.mp4'
+                         % server.server_port, timeout=5)
+        self.assertEqual(r.status, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
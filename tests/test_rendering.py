@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from simple_media_player.render import SegmentRenderer
+from simple_media_player.slideshow.builder import SlideShowBuilder
+from stubs import install_stubs
+
+
+# stubs of external utilities writing their arguments into output files
+DVD_SLIDE_SHOW_STUB = """
+import os, sys
+args = sys.argv[1:]
+name, folder = args[args.index('-n') + 1], args[args.index('-o') + 1]
+config = open(args[args.index('-f') + 1]).read()
+with open(os.path.join(folder, name + '.mp4'), 'w') as fp:
+    fp.write(config)
+with open(os.environ['STUB_CALLS'], 'a') as fp:
+    fp.write('dvd-slideshow\\n')
+sys.exit(int(os.environ.get('STUB_EXIT_CODE', 0)))
+"""
+
+FFMPEG_STUB = """
+import sys
+args = sys.argv[1:]
+paths = [line.split("'")[1] for line in open(args[args.index('-i') + 1])]
+with open(args[-1], 'w') as fp:
+    fp.write(''.join(open(p).read() for p in paths))
+"""
+
+
+class TestSegmentRenderer(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.calls = os.path.join(self.folder, 'calls')
+        install_stubs(self, {'dvd-slideshow': DVD_SLIDE_SHOW_STUB,
+                             'ffmpeg': FFMPEG_STUB}, STUB_CALLS=self.calls)
+
+        self.images = []
+        for i in range(3):
+            path = os.path.join(self.folder, '%d.png' % i)
+            with open(path, 'wb') as fp:
+                fp.write(bytes([i]) * 16)
+            self.images.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def encoder_calls(self):
+        if not os.path.exists(self.calls):
+            return 0
+        with open(self.calls) as fp:
+            return len(fp.readlines())
+
+    def test_only_changed_segments_are_rendered(self):
+        renderer = SegmentRenderer(os.path.join(self.folder, 'segments'))
+        self.addCleanup(renderer.close)
+        builder = SlideShowBuilder().image(self.images[0], 5).cross_fade(2)
+        builder.image(self.images[1], 5).fade_out(2)
+
+        output = os.path.join(self.folder, 'first.mp4')
+        self.assertEqual(renderer.render(builder, output), output)
+        self.assertEqual(self.encoder_calls(), 2)
+
+        with open(output) as fp:
+            self.assertEqual(fp.read(), ''.join(
+                segment.build() for segment in builder.segments()))
+
+        builder.fade_in(2).image(self.images[2], 5)
+        output = os.path.join(self.folder, 'second.mp4')
+        self.assertEqual(renderer.render(builder, output), output)
+        self.assertEqual(self.encoder_calls(), 3)
+
+    def test_parallel_rendering(self):
+        renderer = SegmentRenderer(
+            os.path.join(self.folder, 'segments'), workers=3)
+        self.addCleanup(renderer.close)
+        builder = SlideShowBuilder()
+        for path in self.images + self.images[:1]:
+            builder.image(path, 5).cross_fade(2)
+
+        output = os.path.join(self.folder, 'video.mp4')
+        self.assertEqual(renderer.render(builder, output), output)
+        self.assertEqual(self.encoder_calls(), 4)
+
+        with open(output) as fp:
+            self.assertEqual(fp.read(), ''.join(
+                segment.build() for segment in builder.segments()))
+
+    def test_failed_segment_is_not_cached(self):
+        folder = os.path.join(self.folder, 'segments')
+        renderer = SegmentRenderer(folder)
+        self.addCleanup(renderer.close)
+        builder = SlideShowBuilder().image(self.images[0], 5)
+        output = os.path.join(self.folder, 'video.mp4')
+
+        os.environ['STUB_EXIT_CODE'] = '1'
+        self.assertIsNone(renderer.render(builder, output))
+        self.assertFalse(os.path.exists(output))
+        self.assertEqual([name for name in os.listdir(folder)
+                          if name.endswith('.mp4')], [])
+
+        # failed segment is encoded again by the next slide show
+        os.environ['STUB_EXIT_CODE'] = '0'
+        renderer = SegmentRenderer(folder)
+        self.addCleanup(renderer.close)
+        self.assertEqual(renderer.render(builder, output), output)
+        self.assertEqual(self.encoder_calls(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
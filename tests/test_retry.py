@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from simple_media_player.api import retry
+from simple_media_player.api.retry import \
+    RetryPolicy, CircuitBreaker, CircuitOpenError
+from simple_media_player.api.images import RemoteImagesReceiver
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_max_attempts(self):
+        policy = RetryPolicy(max_attempts=4, base_delay=0.001)
+        self.assertEqual(list(policy.attempts()), [0, 1, 2, 3])
+
+    def test_exponential_backoff(self):
+        policy = RetryPolicy(max_attempts=6, base_delay=1, max_delay=10)
+        with mock.patch.object(retry, 'sleep_for') as sleep_for:
+            list(policy.attempts())
+
+        delays = [call[0][0] for call in sleep_for.call_args_list]
+        self.assertEqual(len(delays), 5)
+        for delay, expected in zip(delays, [1, 2, 4, 8, 10]):
+            self.assertLessEqual(delay, expected)
+            self.assertGreaterEqual(delay, expected * (1 - policy.jitter))
+
+    def test_deadline(self):
+        policy = RetryPolicy(base_delay=0.05, max_delay=0.05,
+                             total_timeout=0.3)
+        started = time.monotonic()
+        attempts = list(policy.attempts(policy.deadline()))
+
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertGreater(len(attempts), 1)
+        self.assertLessEqual(policy.timeout(time.monotonic() + 1, 20), 1)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_states(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.15)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        time.sleep(0.15)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class TestReceiverFailures(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_circuit_is_opened(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        receiver = RemoteImagesReceiver(
+            'http://localhost:1/playlist', self.folder,
+            retry=RetryPolicy(max_attempts=10, base_delay=0.001),
+            breaker=breaker)
+
+        with self.assertRaises(CircuitOpenError):
+            receiver.receive_images(timeout=1.0)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    def test_last_playlist(self):
+        image = os.path.join(self.folder, 'image.jpg')
+        with open(image, 'wb') as fp:
+            fp.write(b'image')
+        path = os.path.join(self.folder,
+                            RemoteImagesReceiver.LAST_PLAYLIST_FILE)
+        with open(path, 'w') as fp:
+            json.dump([image, os.path.join(self.folder, 'missing.jpg')], fp)
+
+        receiver = RemoteImagesReceiver('http://localhost:1/', self.folder)
+        self.assertEqual(receiver.last_playlist(), [image])
+
+
+if __name__ == '__main__':
+    unittest.main()
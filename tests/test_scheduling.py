@@ -0,0 +1,281 @@
+import os
+import shutil
+import tempfile
+import unittest
+import threading
+import configparser
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+from simple_media_player.timing import StageTimer
+from simple_media_player.__main__ import \
+    SimpleMediaPlayer, PreparedShow, MIN_DOWNLOAD_TIME, next_slot
+
+
+def create_player(**params):
+    config = configparser.ConfigParser()
+    config.read_dict({'simple_media_player': params})
+    player = SimpleMediaPlayer()
+    player.cfg = config['simple_media_player']
+    return player
+
+
+class TestDownloadTime(unittest.TestCase):
+
+    def test_configured_deadline(self):
+        player = create_player(download_deadline='30')
+        self.assertEqual(player.download_time(), 30)
+        end_playback = datetime.now() + timedelta(hours=1)
+        self.assertEqual(player.download_time(end_playback), 30)
+
+    def test_deadline_is_capped_by_slot(self):
+        player = create_player(download_deadline='120',
+                               expected_encoding_time='60')
+        player.estimated_slide_show_duration = 200
+        end_playback = datetime.now() + timedelta(seconds=300)
+        self.assertAlmostEqual(
+            player.download_time(end_playback), 40, delta=1)
+
+        player.encoding_time = 10
+        self.assertAlmostEqual(
+            player.download_time(end_playback), 90, delta=1)
+
+    def test_late_slot(self):
+        player = create_player()
+        self.assertEqual(player.download_time(datetime.now()),
+                         MIN_DOWNLOAD_TIME)
+
+
+class TestSlots(unittest.TestCase):
+
+    def test_next_slot(self):
+        now = datetime(2020, 1, 1, 12, 0)
+        self.assertEqual(next_slot('12:30', now), datetime(2020, 1, 1, 12, 30))
+        self.assertEqual(next_slot('12:00', now), datetime(2020, 1, 2, 12, 0))
+        self.assertEqual(next_slot('11:59', now), datetime(2020, 1, 2, 11, 59))
+
+    def test_next_slot_across_midnight(self):
+        now = datetime(2020, 12, 31, 23, 55)
+        self.assertEqual(next_slot('00:05', now), datetime(2021, 1, 1, 0, 5))
+        self.assertEqual(next_slot('23:58', now),
+                         datetime(2020, 12, 31, 23, 58))
+
+
+class TestLaunchOffset(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.player = create_player(
+            cache_path=self.folder, launch_time_offset='7',
+            launch_time_margin='60', image_display_duration='15')
+        self.player.time_table = ['12:00', '12:05', '18:00']
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def record(self, slot, encode):
+        timings = StageTimer()
+        timings.add('download', 10)
+        timings.add('encode', encode)
+        self.player.record_history(
+            slot, PreparedShow('video.mp4', 150, 150.0, timings))
+
+    def test_static_offset_without_history(self):
+        self.assertEqual(self.player.launch_offset('12:00'),
+                         timedelta(minutes=7))
+
+    def test_offset_is_predicted_from_history(self):
+        self.record('12:00', 20)
+        self.assertEqual(self.player.launch_offset('12:00'),
+                         timedelta(seconds=10 + 20 + 150 + 60))
+
+        self.player.cfg['adaptive_launch_offset'] = 'no'
+        self.assertEqual(self.player.launch_offset('12:00'),
+                         timedelta(minutes=7))
+
+    def test_next_launch(self):
+        self.record('12:00', 20)
+        slot, start = self.player.next_launch(datetime(2020, 1, 1, 11, 0))
+        self.assertEqual(slot, datetime(2020, 1, 1, 12, 0))
+        self.assertEqual(start, datetime(2020, 1, 1, 11, 56))
+
+        # late cycle is started immediately
+        now = datetime(2020, 1, 1, 11, 58)
+        self.assertEqual(self.player.next_launch(now), (slot, now))
+
+    def test_infeasible_schedule(self):
+        now = datetime(2020, 1, 1, 10, 0)
+        # slots 5 minutes apart fit cycles taking 4 minutes
+        self.record('12:05', 20)
+        self.assertEqual(self.player.check_schedule(now), [])
+
+        self.record('12:05', 90)
+        self.assertEqual(self.player.check_schedule(now), ['12:05'])
+
+
+class TestPrerendering(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.player = create_player(prerender_slots='2')
+        self.player.time_table = ['00:05', '12:00', '23:59']
+        self.prepared = []
+        self.player.prepare = self.prepare
+        self.failure = None
+
+    def tearDown(self):
+        if self.player._prerender_executor is not None:
+            self.player._prerender_executor.shutdown()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def prepare(self, end_playback=None):
+        self.prepared.append(end_playback)
+        if self.failure is not None:
+            raise self.failure
+        path = os.path.join(self.folder, '%d.mp4' % len(self.prepared))
+        with open(path, 'w'):
+            pass
+        return PreparedShow(path, 10, 10.0, StageTimer())
+
+    def test_upcoming_slots_are_prerendered(self):
+        now = datetime(2020, 1, 1, 23, 0)
+        self.player.prerender_upcoming(now)
+        self.player._prerender_executor.shutdown()
+
+        slots = [datetime(2020, 1, 1, 23, 59), datetime(2020, 1, 2, 0, 5)]
+        self.assertEqual(sorted(self.player._prerendered), slots)
+        self.assertEqual(sorted(self.prepared), slots)
+
+        show = self.player.take_prerendered(slots[1])
+        self.assertTrue(os.path.exists(show.path))
+        self.assertIsNone(self.player.take_prerendered(slots[1]))
+
+    def test_past_slots_are_pruned(self):
+        self.player.prerender_upcoming(datetime(2020, 1, 1, 23, 0))
+        self.player.prerender_upcoming(datetime(2020, 1, 2, 1, 0))
+        self.player._prerender_executor.shutdown()
+
+        self.assertEqual(sorted(self.player._prerendered), [
+            datetime(2020, 1, 2, 12, 0), datetime(2020, 1, 2, 23, 59)])
+
+    def test_slots_are_prerendered_once(self):
+        now = datetime(2020, 1, 1, 23, 0)
+        self.player.prerender_upcoming(now)
+        self.player.prerender_upcoming(now)
+        self.player._prerender_executor.shutdown()
+        self.assertEqual(len(self.prepared), 2)
+
+    def test_failed_prerendering(self):
+        self.failure = RuntimeError('encoding failed')
+        slot = datetime(2020, 1, 1, 23, 59)
+        self.player.prerender(slot)
+        self.assertIsNone(self.player.take_prerendered(slot))
+
+    def test_removed_prerendered_file(self):
+        slot = datetime(2020, 1, 1, 23, 59)
+        self.player.prerender(slot)
+        self.player._prerender_executor.shutdown()
+        os.remove(self.player._prerendered[slot].result().path)
+        self.assertIsNone(self.player.take_prerendered(slot))
+
+    def test_unknown_slot(self):
+        self.assertIsNone(self.player.take_prerendered(None))
+        self.assertIsNone(self.player.take_prerendered(datetime.now()))
+
+
+class TestOnDemandFallback(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.player = SimpleMediaPlayer()
+        self.player.read_config = lambda path: None
+        self.player.setup_metrics = lambda: None
+        self.player.warm_up_player = lambda: None
+        self.player.prerender_upcoming = lambda now=None: None
+        self.player.create_player = lambda: None
+        self.prepared = []
+
+        def prepare(end_playback=None):
+            self.prepared.append(end_playback)
+            return None
+
+        self.player.prepare = prepare
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def prerendered(self, result=None, error=None):
+        slot = datetime.now() + timedelta(minutes=5)
+        future = Future()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        self.player._prerendered[slot] = future
+        return slot
+
+    def test_failed_prerendering_falls_back_to_preparation(self):
+        slot = self.prerendered(error=RuntimeError('encoding failed'))
+        self.player.run(slot)
+        self.assertEqual(self.prepared, [slot])
+        self.assertEqual(self.player._prerendered, {})
+
+    def test_missing_file_falls_back_to_preparation(self):
+        path = os.path.join(self.folder, 'missing.mp4')
+        slot = self.prerendered(PreparedShow(path, 10, 10.0, StageTimer()))
+        self.player.run(slot)
+        self.assertEqual(self.prepared, [slot])
+
+
+class TestCycleTimings(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.player = create_player(
+            cache_path=self.folder, image_display_duration='5')
+        self.player.read_config = lambda path: None
+        self.player.setup_metrics = lambda: None
+        self.player.warm_up_player = lambda: None
+        self.player.prerender_upcoming = lambda now=None: None
+        self.player.create_player = lambda: None
+        self.player.playback_with_delay = self.playback
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def prepare_next(self):
+        self.player.timings = StageTimer()
+        self.player.timings.add('encode', 99)
+
+    def playback(self, path, duration, end_playback):
+        # the next slot is pre-rendered while slide show is played back
+        thread = threading.Thread(target=self.prepare_next)
+        thread.start()
+        thread.join()
+        self.player.timings.add('player_start', 1)
+
+    def test_cycle_records_timings_of_played_show(self):
+        slot = datetime.now() + timedelta(minutes=5)
+        timings = StageTimer()
+        timings.add('download', 10)
+        timings.add('encode', 30)
+        path = os.path.join(self.folder, 'video.mp4')
+        open(path, 'w').close()
+        future = Future()
+        future.set_result(PreparedShow(path, 10, 10.0, timings))
+        self.player._prerendered[slot] = future
+
+        self.player.run(slot)
+
+        self.assertEqual(dict(timings.durations), {
+            'download': 10, 'encode': 30, 'player_start': 1})
+        self.assertEqual(self.player.metrics.get(
+            'smp_stage_duration_seconds', stage='encode'), (1, 30.0))
+        # two images taking 15 seconds each and download
+        self.assertEqual(
+            self.player.load_cycle_history().predict(
+                slot.strftime('%H:%M')), (40.0, 10.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
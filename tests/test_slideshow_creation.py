@@ -1,5 +1,9 @@
+import os
+import shutil
+import tempfile
 import unittest
 from simple_media_player.slideshow.builder import SlideShowBuilder
+from simple_media_player.slideshow.cache import RenderCache
 from simple_media_player.slideshow.config import TransitionDirection
 
 
@@ -28,6 +32,71 @@ class TestSlideShowBuilder(unittest.TestCase):
 
         self.assertEqual(result, expected_result, 'unexpected config result')
 
+    def test_segments(self):
+        self.builder.fade_in(1)
+        self.builder.image('img1.png', 5)
+        self.builder.cross_fade(2)
+        self.builder.image('img2.png', 5)
+        self.builder.fade_out(1).fade_in(1)
+        self.builder.image('img3.png', 5)
+        self.builder.wipe(2, d=TransitionDirection.Up)
+
+        segments = [s.build() for s in self.builder.segments()]
+
+        self.assertEqual(segments, [
+            "fadein:1\nimg1.png:5\ncrossfade:2\nimg2.png:0\n",
+            "img2.png:5\nfadeout:1\n",
+            "fadein:1\nimg3.png:5\nwipe:2:up\n"
+        ])
+
+    def test_seeded_slide_show(self):
+        images = ['img%d.png' % i for i in range(10)]
+
+        first = SlideShowBuilder.create_slide_show(images, 5, seed='abc')
+        second = SlideShowBuilder.create_slide_show(images, 5, seed='abc')
+
+        self.assertEqual(first, second)
+
+
+class TestRenderCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache = RenderCache(self.folder, max_entries=2)
+        self.images = []
+        for i in range(2):
+            path = os.path.join(self.folder, 'run%d' % i, 'img.png')
+            os.makedirs(os.path.dirname(path))
+            with open(path, 'wb') as fp:
+                fp.write(b'same content')
+            self.images.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_fingerprint_ignores_image_location(self):
+        keys = [self.cache.fingerprint('%s:5' % path, [path], [], '640x480')
+                for path in self.images]
+
+        self.assertEqual(keys[0], keys[1])
+        self.assertNotEqual(
+            keys[0], self.cache.fingerprint(
+                '%s:5' % self.images[0], self.images[:1], [], '800x600'))
+
+    def test_lookup_and_eviction(self):
+        keys = ['%040x' % i for i in range(3)]
+        self.assertIsNone(self.cache.lookup(keys[0]))
+
+        for i, key in enumerate(keys):
+            with open(self.cache.path(key), 'wb') as fp:
+                fp.write(b'video')
+            os.utime(self.cache.path(key), (i, 0))
+
+        self.cache.evict()
+
+        self.assertIsNone(self.cache.lookup(keys[0]))
+        self.assertEqual(self.cache.lookup(keys[2]), self.cache.path(keys[2]))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,37 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from simple_media_player.storage import atomic_write_json
+
+
+class TestAtomicWriteJson(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_write(self):
+        path = os.path.join(self.folder, 'state', 'index.json')
+        atomic_write_json(path, {'a': 1})
+        atomic_write_json(path, {'b': [2]})
+        with open(path) as fp:
+            self.assertEqual(json.load(fp), {'b': [2]})
+        self.assertEqual(os.listdir(os.path.dirname(path)), ['index.json'])
+
+    def test_failed_write_keeps_previous_content(self):
+        path = os.path.join(self.folder, 'index.json')
+        atomic_write_json(path, [1, 2])
+        with self.assertRaises(TypeError):
+            atomic_write_json(path, [1, object()])
+        with open(path) as fp:
+            self.assertEqual(json.load(fp), [1, 2])
+        self.assertEqual(os.listdir(self.folder), ['index.json'])
+
+
+if __name__ == '__main__':
+    unittest.main()
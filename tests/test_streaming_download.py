@@ -0,0 +1,175 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from urllib3.exceptions import HTTPError
+
+from simple_media_player.api.images import RemoteImagesReceiver, InFlightLimit
+from simple_media_player.api.cache import ImageCache
+from simple_media_player.api.retry import RetryPolicy
+
+
+IMAGE = bytes(range(256)) * 1024
+
+
+class FlakyImageHandler(BaseHTTPRequestHandler):
+    """Serves single image breaking the first transfer in the middle."""
+
+    ranges = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, obj):
+        content = json.dumps(obj).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        base = 'http://localhost:%d' % self.server.server_port
+        if self.path == '/playlist':
+            return self.send_json({'playlist': [base + '/item']})
+        if self.path == '/item':
+            return self.send_json({'url': base + '/image.jpg'})
+
+        requested = self.headers.get('Range')
+        self.ranges.append(requested)
+
+        if requested and self.headers.get('If-Range') == '"v1"':
+            offset = int(requested[len('bytes='):-1])
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (
+                offset, len(IMAGE) - 1, len(IMAGE)))
+            self.send_header('Content-Length', str(len(IMAGE) - offset))
+            self.send_header('ETag', '"v1"')
+            self.end_headers()
+            self.wfile.write(IMAGE[offset:])
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(IMAGE)))
+        self.send_header('ETag', '"v1"')
+        self.end_headers()
+        self.wfile.write(IMAGE[:len(IMAGE) // 2])
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class TestStreamingDownload(unittest.TestCase):
+
+    def setUp(self):
+        FlakyImageHandler.ranges = []
+        self.server = HTTPServer(('localhost', 0), FlakyImageHandler)
+        threading.Thread(target=self.server.serve_forever).start()
+        self.api = 'http://localhost:%d/playlist' % self.server.server_port
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def check_downloaded(self, paths):
+        self.assertEqual(len(paths), 1)
+        with open(paths[0], 'rb') as fp:
+            self.assertEqual(fp.read(), IMAGE)
+        self.assertEqual(FlakyImageHandler.ranges,
+                         [None, 'bytes=%d-' % (len(IMAGE) // 2)])
+        self.assertFalse([name for name in os.listdir(
+            os.path.dirname(paths[0])) if name.endswith('.part')])
+
+    def test_interrupted_transfer_is_resumed(self):
+        receiver = RemoteImagesReceiver(
+            self.api, self.folder, download_attempts=3, infinite_retry=False,
+            buffer_size=4096)
+
+        self.check_downloaded(receiver.receive_images(timeout=5.0))
+
+    def test_interrupted_transfer_is_resumed_into_cache(self):
+        cache = ImageCache(os.path.join(self.folder, 'cache'))
+        receiver = RemoteImagesReceiver(
+            self.api, self.folder, download_attempts=3, infinite_retry=False,
+            cache=cache)
+
+        self.check_downloaded(receiver.receive_images(timeout=5.0))
+
+
+class MissingImageHandler(FlakyImageHandler):
+    """Answers image requests with configured client error."""
+
+    status = 404
+
+    def do_GET(self):
+        if not self.path.endswith('.jpg'):
+            return super().do_GET()
+        self.ranges.append(self.headers.get('Range'))
+        self.send_response(self.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class TestClientErrors(unittest.TestCase):
+
+    def setUp(self):
+        MissingImageHandler.ranges = []
+        self.server = HTTPServer(('localhost', 0), MissingImageHandler)
+        threading.Thread(target=self.server.serve_forever).start()
+        self.api = 'http://localhost:%d/playlist' % self.server.server_port
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        MissingImageHandler.status = 404
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def receive(self, cache=None):
+        receiver = RemoteImagesReceiver(
+            self.api, self.folder, cache=cache,
+            retry=RetryPolicy(max_attempts=3, base_delay=0.01))
+        with self.assertRaises(HTTPError):
+            receiver.receive_images(timeout=5.0)
+
+    def test_client_error_is_not_retried(self):
+        self.receive()
+        self.assertEqual(MissingImageHandler.ranges, [None])
+
+    def test_client_error_is_not_retried_by_cache(self):
+        self.receive(ImageCache(os.path.join(self.folder, 'cache')))
+        self.assertEqual(MissingImageHandler.ranges, [None])
+
+    def test_rate_limited_request_is_retried(self):
+        MissingImageHandler.status = 429
+        self.receive()
+        self.assertEqual(MissingImageHandler.ranges, [None] * 3)
+
+
+class TestInFlightLimit(unittest.TestCase):
+
+    def test_limit(self):
+        limit = InFlightLimit(100)
+        first = limit.acquire(60)
+
+        acquired = threading.Event()
+
+        def acquire():
+            limit.release(limit.acquire(50))
+            acquired.set()
+
+        threading.Thread(target=acquire).start()
+        self.assertFalse(acquired.wait(0.2))
+
+        limit.release(first)
+        self.assertTrue(acquired.wait(5))
+        self.assertEqual(limit.acquire(1000), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+from datetime import datetime, timedelta
+
+from simple_media_player.timing import sleep_until, SimulatedClock
+
+
+class TestTiming(unittest.TestCase):
+
+    def test_sleep_until(self):
+        tp = datetime.now() + timedelta(milliseconds=300)
+        drift = sleep_until(tp)
+
+        self.assertGreaterEqual(drift, 0)
+        self.assertLess(drift, 0.1)
+
+    def test_sleep_until_past_time_point(self):
+        drift = sleep_until(datetime.now() - timedelta(seconds=2))
+        self.assertGreaterEqual(drift, 2)
+
+    def test_simulated_clock(self):
+        start = datetime(2020, 1, 1, 12, 0)
+        clock = SimulatedClock(start)
+
+        drift = sleep_until(start + timedelta(hours=2), clock)
+
+        self.assertEqual(drift, 0)
+        self.assertEqual(clock.now(), start + timedelta(hours=2))
+        self.assertEqual(clock.monotonic(), 7200)
+
+
+if __name__ == '__main__':
+    unittest.main()